@@ -0,0 +1,35 @@
+import argparse
+import sys
+from datetime import date
+from db import ARCHIVE_KEEP_YEARS, ARCHIVE_TABLESPACE, archive_partitions, ensure_partitions, list_partitions
+
+# Partition maintenance for weight_entries and challenge_log (run e.g. yearly from cron).
+# Creates the upcoming yearly partitions and archives the years older than the last
+# ARCHIVE_KEEP_YEARS: they are detached into the archive schema and stay readable
+# through the weight_entries_history / challenge_log_history views.
+# Usage: python app/archive_partitions.py [--before YEAR | --keep-years N] [--tablespace NAME] [--list]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create upcoming partitions and archive old years.")
+    parser.add_argument("--before", type=int, help="archive the years before this one")
+    parser.add_argument("--keep-years", type=int, default=ARCHIVE_KEEP_YEARS,
+                        help=f"years kept live, including the current one (default: {ARCHIVE_KEEP_YEARS})")
+    parser.add_argument("--tablespace", default=ARCHIVE_TABLESPACE, help="move archived partitions to this tablespace")
+    parser.add_argument("--list", action="store_true", help="only list the partitions")
+    args = parser.parse_args(argv)
+
+    if not args.list:
+        for name in ensure_partitions():
+            print(f"created {name}")
+        before = args.before if args.before is not None else date.today().year - args.keep_years + 1
+        for name in archive_partitions(before, args.tablespace):
+            print(f"archived {name}")
+
+    for table, name, location, rows, size in list_partitions():
+        print(f"{name:<28} {location:<8} {rows:>10} rows {size / 1024:>10.0f} kB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import os
+import random
+import numpy as np
+import pandas as pd
+import altair as alt
+from profiling import section
+
+# Point budget for the progress chart (see point_budget())
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))  # whole chart, split across users
+CHART_MAX_POINTS_PER_USER = int(os.getenv("CHART_MAX_POINTS_PER_USER", "400"))
+CHART_MIN_POINTS_PER_USER = int(os.getenv("CHART_MIN_POINTS_PER_USER", "60"))
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape of (x, y).
+    # First and last point are always kept; every bucket in between contributes the point that
+    # spans the largest triangle with the previously kept point and the next bucket's average.
+    # Missing values (NaN) are left out of the averages and only kept for a bucket without any
+    # real point, so gaps in a series stay gaps.
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 1)]
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    real = ~np.isnan(y)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out - 2 buckets over x[1:n-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        counts = np.add.reduceat(real[1:n - 1], edges[:-1] - 1)
+        avg_x = np.add.reduceat(np.where(real, x, 0)[1:n - 1], edges[:-1] - 1) / counts
+        avg_y = np.add.reduceat(np.where(real, y, 0)[1:n - 1], edges[:-1] - 1) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        # Undefined areas (a NaN involved) rank below every real one; a real point whose
+        # triangle is undefined still beats a missing one
+        area = np.where(np.isnan(area), np.where(real[lo:hi], -1.0, -2.0), area)
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(df, budget, x="Date", y="Weight", by="User"):
+    # Apply LTTB per user; users with fewer points than the budget are passed through unchanged
+    parts = []
+    for _, group in df.groupby(by, sort=False):
+        if len(group) > budget:
+            xs = group[x].to_numpy(dtype="datetime64[ns]").astype("int64")
+            group = group.iloc[lttb_indices(xs, group[y].to_numpy(), budget)]
+        parts.append(group)
+    return pd.concat(parts) if parts else df
+
+
+def point_budget(start, end, n_users):
+    # Points per user: every day while the range fits the budget (zoomed in = exact),
+    # otherwise the chart-wide budget split across the selected users
+    days = (end - start).days + 1
+    per_user = min(CHART_MAX_POINTS_PER_USER, CHART_MAX_POINTS // max(n_users, 1))
+    return max(CHART_MIN_POINTS_PER_USER, min(days, per_user))
+
+
+def get_random_color():
+    return "#{:06x}".format(random.randint(0, 0xFFFFFF))
+
+
+def progress_chart(daily_df, user_colors, trend_df=None):
+    # daily_df: columns User, Date (datetime), Weight, Real as returned by db.get_daily_weights()
+    # The daily series is already interpolated in the database (weight_daily);
+    # only the edges outside a user's first/last entry are filled flat here.
+    # trend_df (optional): columns User, Date, Trend from trends.trend_frame(), drawn dashed
+    with section("transform"):
+        all_dates = pd.date_range(daily_df["Date"].min(), daily_df["Date"].max())
+        interpolated = daily_df.pivot(index="Date", columns="User", values="Weight")
+        interpolated = interpolated.reindex(all_dates).ffill().bfill()
+
+        # --- Colors for users ---
+        user_list = list(interpolated.columns)
+        color_map = {user: user_colors.get(user) or get_random_color() for user in user_list}
+        domain = user_list
+        color_range = [color_map[user] for user in user_list]
+        # ------------------------
+
+        budget = point_budget(all_dates[0], all_dates[-1], len(user_list))
+        line_points = interpolated.reset_index().melt(id_vars="index", var_name="User", value_name="Weight")
+        line_points = downsample(line_points, budget, x="index")
+        real_points = downsample(daily_df[daily_df["Real"]][["Date", "User", "Weight"]], budget)
+        if trend_df is not None:
+            trend_df = downsample(trend_df[trend_df["User"].isin(user_list)], budget, y="Trend")
+
+    with section("chart construction"):
+        chart = (
+            alt.Chart(line_points)
+            .mark_line()
+            .encode(
+                x="index:T",
+                y=alt.Y("Weight:Q", scale=alt.Scale(domain=[70, 130])),
+                color=alt.Color("User:N", scale=alt.Scale(domain=domain, range=color_range))
+            )
+            +
+            alt.Chart(real_points)
+            .mark_point(filled=True, size=60)
+            .encode(
+                x="Date:T",
+                y=alt.Y("Weight:Q", scale=alt.Scale(domain=[70, 130])),
+                color=alt.Color("User:N", scale=alt.Scale(domain=domain, range=color_range))
+            )
+        )
+        if trend_df is not None and not trend_df.empty:
+            chart += (
+                alt.Chart(trend_df)
+                .mark_line(strokeDash=[6, 4], opacity=0.8)
+                .encode(
+                    x="Date:T",
+                    y=alt.Y("Trend:Q", scale=alt.Scale(domain=[70, 130])),
+                    color=alt.Color("User:N", scale=alt.Scale(domain=domain, range=color_range))
+                )
+            )
+        return chart
+
+
+WEEKDAYS = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+
+
+def challenge_heatmap(calendar_df):
+    # calendar_df: columns Date (datetime), Share (0..1 of the shown users who completed the challenge)
+    # Calendar layout: one column per week, one row per weekday
+    with section("transform"):
+        cells = calendar_df.assign(
+            Week=calendar_df["Date"] - pd.to_timedelta(calendar_df["Date"].dt.weekday, unit="D"),
+            Weekday=calendar_df["Date"].dt.weekday.map(dict(enumerate(WEEKDAYS))),
+        )
+
+    with section("chart construction"):
+        return (
+            alt.Chart(cells)
+            .mark_rect(cornerRadius=2)
+            .encode(
+                x=alt.X("yearmonthdate(Week):O", title=None, axis=alt.Axis(format="%d.%m.", labelAngle=-90)),
+                y=alt.Y("Weekday:O", sort=WEEKDAYS, title=None),
+                color=alt.Color("Share:Q", scale=alt.Scale(domain=[0, 1], scheme="greens"), legend=None),
+                tooltip=[alt.Tooltip("Date:T", format="%d.%m.%Y", title="Tag"),
+                         alt.Tooltip("Share:Q", format=".0%", title="Erledigt")],
+            )
+        )
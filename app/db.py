@@ -1,45 +1,695 @@
 import os
+import atexit
+import copy
+import csv
+import functools
+import io
+import re
+import hmac
+import secrets
+import threading
+import time
 import psycopg2
+import psycopg2.extensions
 import hashlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from datetime import date
 
 load_dotenv()
 
+import queries
+import metrics  # reads its settings from the environment, so after load_dotenv
+
+# Connection pool settings (see README for the env variables)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # recycle connections after n seconds
+POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))  # close surplus idle connections after n seconds
+POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))  # ping connections idle longer than n seconds
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class ArchivedYearError(ValueError):
+    # A write into a year whose partition is archived (read-only since migration 0008)
+    def __init__(self, year):
+        super().__init__(f"Das Jahr {year} ist archiviert, Einträge dafür sind nicht mehr möglich.")
+        self.year = year
+
+
+# Cursor of every pooled connection: records latency, rows and errors per query in metrics.py
+class InstrumentedCursor(psycopg2.extensions.cursor):
+
+    def execute(self, query, vars=None):
+        self._query_name = name = metrics.current_query_name()
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            metrics.registry.observe_query(name, time.perf_counter() - start, 0, failed=True)
+            raise
+        seconds = time.perf_counter() - start
+        rows = max(self.rowcount, 0)
+        metrics.registry.observe_query(name, seconds, rows)
+        metrics.log_slow_query(name, seconds, rows, self.query or query)
+        return result
+
+    def copy_expert(self, sql, file, size=8192):
+        name = metrics.current_query_name()
+        start = time.perf_counter()
+        try:
+            result = super().copy_expert(sql, file, size)
+        except Exception:
+            metrics.registry.observe_query(name, time.perf_counter() - start, 0, failed=True)
+            raise
+        seconds = time.perf_counter() - start
+        rows = max(self.rowcount, 0)
+        metrics.registry.observe_query(name, seconds, rows)
+        metrics.log_slow_query(name, seconds, rows, sql)
+        return result
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        if self.name:  # server-side cursor: rows arrive batch by batch
+            metrics.registry.add_rows(getattr(self, "_query_name", "unknown"), len(rows))
+        return rows
+
+
+# A getconn() call queued for a connection; putconn() hands one over directly
+class _Waiter:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.conn = None  # None with granted: a free slot to open a new connection in
+        self.returned_at = 0.0
+
+
+# Thread-safe psycopg2 pool shared by all Streamlit sessions (script threads) of the process.
+# Waiters are served first come, first served: a returned connection goes straight to the
+# oldest waiter, so a thread that borrows again right away can't overtake the queue.
+class ConnectionPool:
+
+    def __init__(self, min_size, max_size, timeout, max_lifetime, max_idle, healthcheck_idle):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.healthcheck_idle = healthcheck_idle
+        self._lock = threading.Lock()
+        self._idle = []  # (conn, returned_at), most recently returned last
+        self._waiters = deque()  # _Waiter, oldest first
+        self._created_at = {}  # id(conn) -> monotonic creation time
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._borrows = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._created = 0
+        self._recycled = 0
+
+    def _connect(self):
+        conn = psycopg2.connect(
+            dbname=os.getenv("POSTGRES_DB"),
+            user=os.getenv("POSTGRES_USER"),
+            password=os.getenv("POSTGRES_PASSWORD"),
+            host=os.getenv("POSTGRES_HOST"),
+            port=os.getenv("POSTGRES_PORT"),
+            cursor_factory=InstrumentedCursor if metrics.METRICS_ENABLED else None
+        )
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, now):
+        created = self._created_at.get(id(conn), now)
+        return self.max_lifetime > 0 and now - created > self.max_lifetime
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _grant(self, conn, returned_at):
+        # Hand a connection (or, with None, a free slot) to the oldest waiter; under the lock
+        waiter = self._waiters.popleft()
+        waiter.granted = True
+        waiter.conn = conn
+        waiter.returned_at = returned_at
+        self._in_use += 1
+        waiter.event.set()
+
+    def _release_slot(self):
+        # A connection was closed: its slot goes to the oldest waiter, if any; under the lock
+        if self._waiters and not self._closed:
+            self._grant(None, 0.0)
+        else:
+            self._size -= 1
+
+    def getconn(self):
+        start = time.monotonic()
+        conn = None
+        returned_at = 0.0
+        waiter = None
+        with self._lock:
+            if self._closed:
+                raise psycopg2.InterfaceError("connection pool is closed")
+            if self._idle:
+                conn, returned_at = self._idle.pop()
+                self._in_use += 1
+            elif self._size < self.max_size:
+                self._size += 1
+                self._in_use += 1
+            else:
+                # Idle connections and free slots always go to queued waiters first, so
+                # with waiters ahead there is nothing to take and this call queues up too
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            waiter.event.wait(self.timeout)
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    if self._closed:
+                        raise psycopg2.InterfaceError("connection pool is closed")
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"no database connection available after {self.timeout:.1f}s "
+                        f"({self._in_use}/{self.max_size} in use)"
+                    )
+                conn, returned_at = waiter.conn, waiter.returned_at
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._borrows += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        # Connecting and health checks happen outside the lock
+        try:
+            now = time.monotonic()
+            if conn is not None and (self._expired(conn, now) or not self._is_healthy(conn, now - returned_at)):
+                self._discard(conn)
+                conn = None
+                with self._lock:
+                    self._recycled += 1
+            if conn is None:
+                conn = self._connect()
+                with self._lock:
+                    self._created += 1
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._release_slot()
+            raise
+        return conn
+
+    def putconn(self, conn):
+        now = time.monotonic()
+        keep = not conn.closed and not self._closed and not self._expired(conn, now)
+        if keep and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                keep = False
+        with self._lock:
+            self._in_use -= 1
+            if keep and self._waiters:
+                self._grant(conn, now)
+            elif keep:
+                self._idle.append((conn, now))
+                # Close connections that sat idle too long, but keep min_size around
+                while len(self._idle) > 1 and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+                    stale, _ = self._idle.pop(0)
+                    self._size -= 1
+                    self._discard(stale)
+            else:
+                self._discard(conn)
+                self._recycled += 1
+                self._release_slot()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            for waiter in self._waiters:
+                waiter.event.set()  # wakes up ungranted: the pool is closed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": len(self._waiters),
+                "borrows": self._borrows,
+                "timeouts": self._timeouts,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_avg": round(self._wait_total / self._borrows, 6) if self._borrows else 0.0,
+                "wait_seconds_max": round(self._wait_max, 6),
+                "connections_created": self._created,
+                "connections_recycled": self._recycled,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_TIMEOUT,
+                    POOL_MAX_LIFETIME, POOL_MAX_IDLE, POOL_HEALTHCHECK_IDLE
+                )
+                atexit.register(_pool.close)
+    return _pool
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
+@contextmanager
 def get_conn():
-    return psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-        host=os.getenv("POSTGRES_HOST"),
-        port=os.getenv("POSTGRES_PORT")
-    )
+    # Borrow a pooled connection; commits on success and rolls back on error
+    # (same semantics as "with psycopg2.connect() as conn"), then returns it.
+    pool = get_pool()
+    start = time.perf_counter()
+    conn = pool.getconn()
+    metrics.registry.observe_acquire(time.perf_counter() - start)
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.putconn(conn)
+
+def _pool_gauges():
+    stats = _pool.stats() if _pool is not None else {}
+    return {f"db_pool_{key}": value for key, value in stats.items()}
+
+
+metrics.registry.add_gauges(_pool_gauges)
+
+# Shared read cache settings
+CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "60"))  # seconds a cached read stays valid
+CACHE_MAX_ENTRIES = int(os.getenv("DB_CACHE_MAX_ENTRIES", "256"))
+
+
+# Process-wide TTL/LRU cache for read queries. Entries carry tags ("weights", "users")
+# and the write functions below invalidate exactly the tags they touch.
+class QueryCache:
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, tags, value)
+        self._loading = {}  # key -> threading.Event of the session currently running the query
+        self._generations = {}  # tag -> counter, bumped on every invalidation
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_or_load(self, key, tags, loader, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[0] > time.monotonic():
+                        self._entries.move_to_end(key)
+                        self._hits += 1
+                        return entry[2]
+                    del self._entries[key]
+                loading = self._loading.get(key)
+                if loading is None:
+                    # This session runs the query, concurrent viewers wait for its result
+                    loading = self._loading[key] = threading.Event()
+                    generations = tuple(self._generations.get(tag, 0) for tag in tags)
+                    self._misses += 1
+                    break
+            loading.wait()
+
+        try:
+            value = loader()
+            with self._lock:
+                # Don't store a result that was read before a concurrent write invalidated it
+                if generations == tuple(self._generations.get(tag, 0) for tag in tags):
+                    self._entries[key] = (time.monotonic() + ttl, tags, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self._evictions += 1
+            return value
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key, entry in self._entries.items() if set(entry[1]) & set(tags)]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += 1
+
+    def generation(self, *tags):
+        # Changes whenever one of the tags is invalidated
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+_cache = QueryCache(CACHE_TTL, CACHE_MAX_ENTRIES)
+
+
+def _freeze(value):
+    # Make list/set arguments (e.g. selected usernames) usable as cache keys
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+def cached_query(*tags, ttl=None):
+    # Cache a read function process-wide; callers get a shallow copy so they can't mutate the shared result
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, _freeze(args), _freeze(tuple(sorted(kwargs.items()))))
+            return copy.copy(_cache.get_or_load(key, tags, lambda: func(*args, **kwargs), ttl))
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def invalidate_cache(*tags):
+    _cache.invalidate(*tags)
+
+
+def cache_generation(*tags):
+    return _cache.generation(*tags)
+
+
+def get_cache_stats():
+    return _cache.stats()
+
+
+def _cache_gauges():
+    return {f"db_cache_{key}": value for key, value in _cache.stats().items()}
+
+
+metrics.registry.add_gauges(_cache_gauges)
+
+
+# Admins (ADMIN_USERS, comma separated user names) may export all data and profile pages
+ADMIN_USERS = {name.strip().lower() for name in os.getenv("ADMIN_USERS", "").split(",") if name.strip()}
+
+
+def is_admin(username):
+    return bool(username) and username.lower() in ADMIN_USERS
+
+
+# Group new users join on registration (see migration 0006); empty = none
+DEFAULT_GROUP = os.getenv("DEFAULT_GROUP", "Project42").strip()
+JOIN_CODE_ATTEMPTS = 5  # join codes tried by create_group() before giving up
+
+# Password hashing settings
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "scrypt")  # scrypt, argon2 (needs argon2-cffi) or sha256 (legacy)
+SCRYPT_N = int(os.getenv("SCRYPT_N", "16384"))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "2"))  # password hashes computed at the same time
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "32"))  # hash jobs running or queued
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "30"))  # seconds a login waits for a worker
+
+
+# Unsalted single-round SHA-256 hex digest, the original format. Only verified, then rehashed.
+class Sha256Hasher:
+    name = "sha256"
+
+    def identifies(self, encoded):
+        return len(encoded) == 64 and all(c in "0123456789abcdef" for c in encoded)
+
+    def hash(self, password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def verify(self, password, encoded):
+        return hmac.compare_digest(self.hash(password), encoded)
+
+    def needs_rehash(self, encoded):
+        return False
+
+
+# scrypt with the parameters stored in the hash: scrypt$<n>$<r>$<p>$<salt hex>$<key hex>
+class ScryptHasher:
+    name = "scrypt"
+
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def identifies(self, encoded):
+        return encoded.startswith("scrypt$")
+
+    def _derive(self, password, salt, n, r, p):
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p,
+            maxmem=256 * n * r * p, dklen=32
+        )
+
+    def hash(self, password):
+        salt = os.urandom(16)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${salt.hex()}${key.hex()}"
+
+    def verify(self, password, encoded):
+        _, n, r, p, salt, key = encoded.split("$")
+        derived = self._derive(password, bytes.fromhex(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(derived.hex(), key)
+
+    def needs_rehash(self, encoded):
+        return encoded.split("$")[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+
+# argon2id via argon2-cffi (optional dependency), parameters are part of the PHC string
+class Argon2Hasher:
+    name = "argon2"
+
+    def __init__(self, time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM):
+        try:
+            import argon2
+        except ImportError:
+            raise RuntimeError("PASSWORD_HASHER=argon2 requires the argon2-cffi package")
+        self._argon2 = argon2
+        self._hasher = argon2.PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+    def identifies(self, encoded):
+        return encoded.startswith("$argon2")
+
+    def hash(self, password):
+        return self._hasher.hash(password)
+
+    def verify(self, password, encoded):
+        try:
+            return self._hasher.verify(encoded, password)
+        except self._argon2.exceptions.VerificationError:
+            return False
+
+    def needs_rehash(self, encoded):
+        return self._hasher.check_needs_rehash(encoded)
+
+
+_HASHERS = {"sha256": Sha256Hasher, "scrypt": ScryptHasher, "argon2": Argon2Hasher}
+_password_hasher = None
+
+
+def get_password_hasher():
+    global _password_hasher
+    if _password_hasher is None:
+        _password_hasher = _HASHERS[PASSWORD_HASHER]()
+    return _password_hasher
+
+
+def _hasher_for(encoded):
+    current = get_password_hasher()
+    if current.identifies(encoded):
+        return current
+    if encoded.startswith("$argon2"):
+        return Argon2Hasher()
+    for hasher_class in (ScryptHasher, Sha256Hasher):
+        hasher = hasher_class()
+        if hasher.identifies(encoded):
+            return hasher
+    raise ValueError("unknown password hash format")
+
 
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return get_password_hasher().hash(password)
+
+
+def verify_password(password, encoded):
+    # Returns (matches, needs_rehash); needs_rehash is set when the stored hash uses an older
+    # algorithm or other cost parameters than the configured hasher
+    hasher = _hasher_for(encoded)
+    if not hasher.verify(password, encoded):
+        return False, False
+    current = get_password_hasher()
+    return True, hasher.name != current.name or current.needs_rehash(encoded)
+
+
+# Bounded pool for the CPU/memory-heavy hash work, so a burst of logins can't occupy
+# every Streamlit script thread or exhaust memory with parallel scrypt/argon2 runs
+class AuthWorkerPool:
+
+    def __init__(self, workers, max_pending, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="auth")
+        self._slots = threading.BoundedSemaphore(max(max_pending, workers, 1))
+
+    def run(self, func, *args):
+        # One deadline for waiting on a slot and on the result, raises TimeoutError when it passes
+        deadline = time.monotonic() + self.timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("too many logins at once, please try again")
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+
+
+_auth_pool = AuthWorkerPool(AUTH_WORKERS, AUTH_MAX_PENDING, AUTH_TIMEOUT)
+
 
 def register_user(username, password):
+    password_hash = _auth_pool.run(hash_password, password)
     with get_conn() as conn:
         with conn.cursor() as cur:
             try:
-                cur.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, hash_password(password)))
+                cur.execute("INSERT INTO users (username, password) VALUES (%s, %s) RETURNING id", (username, password_hash))
+                user_id = cur.fetchone()[0]
+                if DEFAULT_GROUP:
+                    # New users start in the default group (if it exists)
+                    cur.execute("""
+                        INSERT INTO group_members (group_id, user_id)
+                        SELECT id, %s FROM groups WHERE LOWER(name) = LOWER(%s)
+                    """, (user_id, DEFAULT_GROUP))
                 conn.commit()
-                return True
             except psycopg2.errors.UniqueViolation:
                 conn.rollback()
                 return False
+    invalidate_cache("users", "groups", "challenges")
+    return True
 
 def authenticate_user(username, password):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT id, password, username FROM users WHERE LOWER(username) = LOWER(%s)", (username,))
             result = cur.fetchone()
-            if result and result[1] == hash_password(password):
-                return result[0]
-    return None
+    if not result:
+        return None
+    # Verify on the auth pool, without holding a database connection
+    matches, needs_rehash = _auth_pool.run(verify_password, password, result[1])
+    if not matches:
+        return None
+    if needs_rehash:
+        # Transparently upgrade old SHA-256 hashes (or outdated cost parameters) on login
+        new_hash = _auth_pool.run(hash_password, password)
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE users SET password = %s WHERE id = %s AND password = %s",
+                    (new_hash, result[0], result[1])
+                )
+                conn.commit()
+    return result[0]
+
+def _read(name, **params):
+    # Rows of a read query shared with page_data.py (queries.py), recorded in the metrics under its name
+    with metrics.query_name(name), get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(queries.select(name), params)
+            return cur.fetchall()
+
+def _read_one(name, **params):
+    return _read(name, **params)[0]
+
+def _group_filter(user_column, group_id, params):
+    # SQL condition restricting user_column to the members of a group (none without a group)
+    if group_id is None:
+        return ""
+    params.append(group_id)
+    return f" AND {user_column} IN (SELECT gm.user_id FROM group_members gm WHERE gm.group_id = %s)"
+
+@contextmanager
+def _reject_archived_year(day):
+    # Raises ArchivedYearError for the CHECK that keeps archived years out of the DEFAULT partitions
+    try:
+        yield
+    except psycopg2.errors.CheckViolation as e:
+        if not (e.diag.constraint_name or "").endswith("_default_not_archived"):
+            raise
+        raise ArchivedYearError(str(day)[:4]) from None
 
 def insert_weight(user_id, date, weight, note=None):
-    with get_conn() as conn:
+    with _reject_archived_year(date), get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 "INSERT INTO weight_entries (user_id, date, weight, note) VALUES (%s, %s, %s, %s) "
@@ -47,46 +697,168 @@ def insert_weight(user_id, date, weight, note=None):
                 (user_id, date, weight, note)
             )
             conn.commit()
+    invalidate_cache("weights")
 
-def get_all_weights_for_all_users():
+@cached_query("weights")
+def get_all_weights_for_all_users(group_id=None):
+    # All entries (incl. archived years) of all users, or of the members of group_id
+    params = []
+    query = """
+        SELECT u.username, w.date, w.weight
+        FROM weight_entries_history w
+        JOIN users u ON w.user_id = u.id
+        WHERE TRUE
+    """
+    query += _group_filter("w.user_id", group_id, params)
+    query += " ORDER BY w.date ASC"
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT u.username, w.date, w.weight
-                FROM weight_entries w
-                JOIN users u ON w.user_id = u.id
-                ORDER BY w.date ASC
-            """)
+            cur.execute(query, params)
+            return cur.fetchall()
+
+@cached_query("weights")
+def get_weights_filtered(start_date=None, end_date=None, usernames=None, limit=None, group_id=None):
+    # Same rows as get_all_weights_for_all_users(), restricted to a date window, users and/or a group.
+    # With limit only the most recent rows are returned (still sorted by date ascending).
+    if usernames is not None and not usernames:
+        return []
+    query = """
+        SELECT u.username, w.date, w.weight
+        FROM weight_entries_history w
+        JOIN users u ON w.user_id = u.id
+        WHERE TRUE
+    """
+    params = []
+    if start_date:
+        query += " AND w.date >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND w.date <= %s"
+        params.append(end_date)
+    if usernames is not None:
+        query += " AND u.username = ANY(%s)"
+        params.append(list(usernames))
+    query += _group_filter("w.user_id", group_id, params)
+    if limit:
+        query = f"SELECT * FROM ({query} ORDER BY w.date DESC LIMIT %s) AS recent ORDER BY date ASC"
+        params.append(limit)
+    else:
+        query += " ORDER BY w.date ASC"
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
             return cur.fetchall()
 
+@cached_query("weights")
+def get_weight_date_range(usernames=None, group_id=None):
+    # (first date, last date) over all weight entries incl. archived years, (None, None) if there are none
+    return _read_one("weight_date_range", usernames=list(usernames) if usernames is not None else None,
+                     group_id=group_id)
+
+@cached_query("weights")
+def get_usernames_with_entries(group_id=None):
+    return [row[0] for row in _read("usernames_with_entries", group_id=group_id)]
+
 def user_exists(username):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT 1 FROM users WHERE LOWER(username) = LOWER(%s)", (username,))
             return cur.fetchone() is not None
 
+def get_user_id(username):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM users WHERE LOWER(username) = LOWER(%s)", (username,))
+            row = cur.fetchone()
+            return row[0] if row else None
+
 def register_test_users():
     users = [("alice", "alice123"), ("bob", "bob123")]
     for username, password in users:
         if not user_exists(username):
             register_user(username, password)
 
-def init_challenge_table():
+@cached_query("weights")
+def get_daily_weights(start_date=None, end_date=None, usernames=None, group_id=None):
+    # Interpolated daily series from weight_daily: (username, date, weight, is_real)
+    if usernames is not None and not usernames:
+        return []
+    query = """
+        SELECT u.username, d.date, d.weight, d.is_real
+        FROM weight_daily d
+        JOIN users u ON d.user_id = u.id
+        WHERE TRUE
+    """
+    params = []
+    if start_date:
+        query += " AND d.date >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND d.date <= %s"
+        params.append(end_date)
+    if usernames is not None:
+        query += " AND u.username = ANY(%s)"
+        params.append(list(usernames))
+    query += _group_filter("d.user_id", group_id, params)
+    query += " ORDER BY d.date ASC, u.username"
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+@cached_query("weights")
+def get_weight_loss_ranking(limit=3, by="abs", group_id=None):
+    # Top users (of a group) by absolute ("abs", kg) or relative ("rel", %) loss since their first entry:
+    # (username, start weight, latest weight, loss kg, loss %, entry count)
+    if by not in ("abs", "rel"):
+        raise ValueError(f"Unknown ranking: {by}")
+    return _read(f"loss_ranking_{by}", ranking_limit=limit, group_id=group_id)
+
+@cached_query("weights")
+def get_latest_weight_entry(user_id):
+    # A user's latest entry and entry stats from their weight_summary row (primary key lookup):
+    # (latest date, latest weight, entry count, first date, first weight), None without entries
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("""
-                CREATE TABLE IF NOT EXISTS challenge_log (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id),
-                    date DATE NOT NULL,
-                    completed BOOLEAN DEFAULT FALSE,
-                    UNIQUE(user_id, date)
-                )
-            """)
-            conn.commit()
+                SELECT latest_date, latest_weight, entry_count, first_date, first_weight
+                FROM weight_summary
+                WHERE user_id = %s
+            """, (user_id,))
+            return cur.fetchone()
 
-def log_challenge_completion(user_id, challenge_date):
+@cached_query("weights", "users")
+def get_trend_versions(group_id=None):
+    # Per user with entries (of a group): (user_id, username, latest date, summary updated_at, goal weight).
+    # updated_at changes with every write to the user's entries, so it versions their trend (trends.py)
+    params = []
+    query = """
+        SELECT s.user_id, u.username, s.latest_date, s.updated_at, u.goal_weight
+        FROM weight_summary s
+        JOIN users u ON s.user_id = u.id
+        WHERE TRUE
+    """
+    query += _group_filter("s.user_id", group_id, params)
+    query += " ORDER BY s.user_id"
     with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+def get_weight_series(user_ids):
+    # All entries (incl. archived years) of the given users: (user_id, date, weight) ordered by user and date
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT user_id, date, weight
+                FROM weight_entries_history
+                WHERE user_id = ANY(%s)
+                ORDER BY user_id, date
+            """, (list(user_ids),))
+            return cur.fetchall()
+
+def log_challenge_completion(user_id, challenge_date):
+    with _reject_archived_year(challenge_date), get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 "INSERT INTO challenge_log (user_id, date, completed) VALUES (%s, %s, TRUE) "
@@ -94,34 +866,45 @@ def log_challenge_completion(user_id, challenge_date):
                 (user_id, challenge_date)
             )
             conn.commit()
+    invalidate_cache("challenges")
 
+@cached_query("challenges")
 def has_completed_challenge(user_id, challenge_date):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT completed FROM challenge_log WHERE user_id = %s AND date = %s",
-                (user_id, challenge_date)
-            )
-            result = cur.fetchone()
-            return result is not None and result[0]
+    return _read_one("challenge_completed", user_id=user_id, today=challenge_date)[0]
+
+@cached_query("challenges")
+def get_challenge_status_all_users(challenge_date, group_id=None):
+    return _read("challenge_status", today=challenge_date, group_id=group_id)
+
+# Challenge history: windows of the completion rates and length of the calendar heatmap
+CHALLENGE_RATE_WINDOWS = tuple(int(days) for days in os.getenv("CHALLENGE_RATE_WINDOWS", "7,30,90").split(","))
+CHALLENGE_CALENDAR_DAYS = int(os.getenv("CHALLENGE_CALENDAR_DAYS", "182"))
+
+@cached_query("challenges")
+def get_challenge_streaks(today, group_id=None, user_id=None):
+    # Current and longest streak of completed days per user, for user_id and the members of group_id
+    # (all users without either): (username, current streak, longest streak, last completed day)
+    return _read("challenge_streaks", today=today, group_id=group_id, user_id=user_id)
+
+@cached_query("challenges")
+def get_challenge_completion_rates(today, windows=CHALLENGE_RATE_WINDOWS, group_id=None, user_id=None):
+    # Share of completed days in the last n days (incl. today) per user and window, scoped as
+    # get_challenge_streaks(): (username, [rate per window]) with rates between 0 and 1
+    return _read("challenge_rates", today=today, rate_windows=list(windows), group_id=group_id, user_id=user_id)
+
+@cached_query("challenges")
+def get_challenge_calendar(user_id, start_date, end_date, group_id=None):
+    # One row per day for the heatmap: (date, completed by user_id, completions by the user and group)
+    return _read("challenge_calendar", user_id=user_id, start_date=start_date, end_date=end_date, group_id=group_id)
 
-def get_challenge_status_all_users(challenge_date):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT u.username, COALESCE(c.completed, FALSE)
-                FROM users u
-                LEFT JOIN challenge_log c ON u.id = c.user_id AND c.date = %s
-                ORDER BY u.username
-            """, (challenge_date,))
-            return cur.fetchall()
 def get_weights_for_user(user_id):
+    # All entries of a user incl. archived years, newest first
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
                 SELECT id, date, weight, note, created_at
-                FROM weight_entries
+                FROM weight_entries_history
                 WHERE user_id = %s
                 ORDER BY date DESC
                 """,
@@ -130,15 +913,19 @@ def get_weights_for_user(user_id):
             return cur.fetchall()
 
 def delete_weight_entry(entry_id, user_id):
+    # False if there was no such entry in the live years (archived years are read-only)
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 DELETE FROM weight_entries
                 WHERE id = %s AND user_id = %s
             """, (entry_id, user_id))
+            deleted = cur.rowcount > 0
+    invalidate_cache("weights")
+    return deleted
 
 def add_weight_entry(conn, user_id, date, weight, note=None):
-    with conn.cursor() as cur:
+    with _reject_archived_year(date), conn.cursor() as cur:
         cur.execute(
             """
             INSERT INTO weight_entries (user_id, date, weight, note)
@@ -151,12 +938,13 @@ def add_weight_entry(conn, user_id, date, weight, note=None):
             (user_id, date, weight, note)
         )
         conn.commit()
+    invalidate_cache("weights")
 
 def get_weight_entries(conn, user_id, start_date=None, end_date=None):
     with conn.cursor() as cur:
         query = """
             SELECT id, date, weight, note, created_at
-            FROM weight_entries
+            FROM weight_entries_history
             WHERE user_id = %s
         """
         params = [user_id]
@@ -170,16 +958,273 @@ def get_weight_entries(conn, user_id, start_date=None, end_date=None):
         cur.execute(query, params)
         return cur.fetchall()
 
+IMPORT_COLUMNS = ("username", "date", "weight", "note")
+IMPORT_MIN_WEIGHT = 20.0  # same bounds as the entry form
+IMPORT_MAX_WEIGHT = 300.0
+
+_GERMAN_DATE = re.compile(r"^\s*(\d{1,2})\.(\d{1,2})\.(\d{4})\s*$")
+
+
+# File-like object for COPY FROM STDIN: reads an uploaded CSV lazily (header names are
+# case-insensitive, ";" or "," separated, German dates) and yields normalized
+# line_no,username,date,weight,note rows, so large files are never loaded at once.
+class _ImportStream:
+
+    def __init__(self, fileobj):
+        if isinstance(fileobj, (bytes, bytearray)):
+            fileobj = io.BytesIO(fileobj)
+        if not isinstance(fileobj, io.TextIOBase):
+            fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        header = fileobj.readline()
+        delimiter = max([";", ",", "\t"], key=header.count)
+        self._fields = [name.strip().lower() for name in next(csv.reader([header], delimiter=delimiter))]
+        missing = {"date", "weight"} - set(self._fields)
+        if missing:
+            raise ValueError(f"CSV-Spalten fehlen: {', '.join(sorted(missing))}")
+        self._reader = csv.reader(fileobj, delimiter=delimiter)
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out, lineterminator="\n")
+        self._buffer = ""
+        self.rows = 0
+
+    def _normalize(self, values):
+        row = dict(zip(self._fields, (v.strip() for v in values)))
+        date_value = row.get("date", "")
+        match = _GERMAN_DATE.match(date_value)
+        if match:
+            day, month, year = match.groups()
+            date_value = f"{year}-{int(month):02d}-{int(day):02d}"
+        return [row.get("username", ""), date_value, row.get("weight", "").replace(",", "."), row.get("note", "")]
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            values = next(self._reader, None)
+            if values is None:
+                break
+            if not any(v.strip() for v in values):
+                continue
+            self.rows += 1
+            self._writer.writerow([self._reader.line_num + 1] + self._normalize(values))  # +1: header
+            self._buffer += self._out.getvalue()
+            self._out.seek(0)
+            self._out.truncate()
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+
+def import_weights_csv(fileobj, user_id=None):
+    # Bulk import: COPY the CSV into a staging table, then validate and upsert everything into
+    # weight_entries in one transaction with the same ON CONFLICT (user_id, date) rule as insert_weight.
+    # With user_id all rows belong to that user, otherwise the "username" column decides. Lines in
+    # archived years are rejected. Returns {"inserted", "updated", "rejected", "rejected_lines"}; a later line for the same
+    # user and day wins over an earlier one.
+    stream = _ImportStream(fileobj)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE weight_import (
+                    line_no INTEGER,
+                    username TEXT,
+                    date TEXT,
+                    weight TEXT,
+                    note TEXT
+                ) ON COMMIT DROP
+            """)
+            cur.copy_expert(
+                "COPY weight_import (line_no, username, date, weight, note) FROM STDIN WITH (FORMAT csv)",
+                stream
+            )
+            # One parsed row per line; anything without a user, a date or a weight in range is rejected
+            cur.execute("""
+                CREATE TEMP TABLE weight_import_parsed ON COMMIT DROP AS
+                SELECT s.line_no,
+                       COALESCE(%(user_id)s, u.id) AS user_id,
+                       CASE WHEN pg_input_is_valid(s.date, 'date') THEN s.date::date END AS date,
+                       CASE WHEN pg_input_is_valid(s.weight, 'real') THEN s.weight::real END AS weight,
+                       NULLIF(s.note, '') AS note
+                FROM weight_import s
+                LEFT JOIN users u ON %(user_id)s IS NULL AND LOWER(u.username) = LOWER(s.username)
+            """, {"user_id": user_id})
+            # Archived years are read-only: their lines are rejected like invalid ones
+            archived = archived_years(cur, "weight_entries")
+            cur.execute("""
+                SELECT line_no FROM weight_import_parsed
+                WHERE user_id IS NULL OR date IS NULL OR weight IS NULL
+                   OR weight NOT BETWEEN %s AND %s
+                   OR EXTRACT(YEAR FROM date)::int = ANY(%s::int[])
+                ORDER BY line_no
+            """, (IMPORT_MIN_WEIGHT, IMPORT_MAX_WEIGHT, archived))
+            rejected_lines = [row[0] for row in cur.fetchall()]
+            # Rows that already exist count as updated; the CTEs all see the table before the upsert
+            # (RETURNING xmax = 0 is not available on a partitioned table)
+            cur.execute("""
+                WITH rows AS (
+                    SELECT DISTINCT ON (user_id, date) user_id, date, weight, note
+                    FROM weight_import_parsed
+                    WHERE user_id IS NOT NULL AND date IS NOT NULL
+                      AND weight BETWEEN %s AND %s
+                      AND EXTRACT(YEAR FROM date)::int <> ALL(%s::int[])
+                    ORDER BY user_id, date, line_no DESC
+                ), existing AS (
+                    SELECT COUNT(*) AS n FROM rows r JOIN weight_entries w ON w.user_id = r.user_id AND w.date = r.date
+                ), upserted AS (
+                    INSERT INTO weight_entries (user_id, date, weight, note)
+                    SELECT user_id, date, weight, note FROM rows
+                    ON CONFLICT (user_id, date) DO UPDATE
+                    SET weight = EXCLUDED.weight,
+                        note = EXCLUDED.note,
+                        created_at = NOW()
+                    RETURNING 1
+                )
+                SELECT COUNT(*) - (SELECT n FROM existing), (SELECT n FROM existing) FROM upserted
+            """, (IMPORT_MIN_WEIGHT, IMPORT_MAX_WEIGHT, archived))
+            inserted, updated = cur.fetchone()
+            conn.commit()
+    invalidate_cache("weights")
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "rejected": len(rejected_lines),
+        "rejected_lines": rejected_lines[:100],
+    }
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))  # rows per round trip of the export cursor
+
+# Exportable tables: column names and the query behind them (aliased "t", joined with the user name).
+# Exports read the *_history views, so archived years are included.
+EXPORT_TABLES = {
+    "weight_entries": (
+        ("username", "date", "weight", "note", "created_at"),
+        "SELECT u.username, t.date, t.weight, t.note, t.created_at FROM weight_entries_history t JOIN users u ON u.id = t.user_id"
+    ),
+    "challenge_log": (
+        ("username", "date", "completed"),
+        "SELECT u.username, t.date, t.completed FROM challenge_log_history t JOIN users u ON u.id = t.user_id"
+    ),
+}
+
+
+def stream_export(table, user_id=None, batch_size=EXPORT_BATCH_SIZE):
+    # Yields the rows of an export table in batches from a named (server-side) cursor, so only
+    # one batch is ever held in memory. Without user_id all users are exported.
+    # The pooled connection stays borrowed until the generator is exhausted or closed.
+    columns, query = EXPORT_TABLES[table]
+    params = ()
+    if user_id is not None:
+        query += " WHERE t.user_id = %s"
+        params = (user_id,)
+    query += " ORDER BY t.user_id, t.date"
+    with get_conn() as conn:
+        with conn.cursor(name=f"export_{table}") as cur:
+            cur.itersize = batch_size
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+# Yearly partitions of weight_entries and challenge_log (migration 0005)
+PARTITIONED_TABLES = ("weight_entries", "challenge_log")
+PARTITION_YEARS_AHEAD = int(os.getenv("PARTITION_YEARS_AHEAD", "1"))  # partitions created in advance
+ARCHIVE_KEEP_YEARS = int(os.getenv("ARCHIVE_KEEP_YEARS", "3"))  # years (incl. the current one) kept live
+ARCHIVE_TABLESPACE = os.getenv("ARCHIVE_TABLESPACE") or None  # e.g. a tablespace on cheaper disks
+
+
+def archived_years(cur, table):
+    # Years of table whose partitions are archived (and read-only)
+    cur.execute("""
+        SELECT substring(c.relname FROM '_y(\\d{4})$')::int
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'archive' AND c.relkind = 'r' AND c.relname ~ ('^' || %s || '_y\\d{4}$')
+        ORDER BY 1
+    """, (table,))
+    return [row[0] for row in cur.fetchall()]
+
+def ensure_partitions(years_ahead=PARTITION_YEARS_AHEAD):
+    # Create the partitions for this year, the next years_ahead years and every year that has
+    # rows waiting in a DEFAULT partition (moved over). Returns the names of new partitions.
+    this_year = date.today().year
+    created = []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for table in PARTITIONED_TABLES:
+                cur.execute(f"SELECT DISTINCT EXTRACT(YEAR FROM date)::int FROM {table}_default")
+                years = {row[0] for row in cur.fetchall()} | set(range(this_year, this_year + years_ahead + 1))
+                for year in sorted(years):
+                    cur.execute("SELECT ensure_partition(%s, %s)", (table, year))
+                    if cur.fetchone()[0]:
+                        created.append(f"{table}_y{year}")
+        conn.commit()
+    return created
+
+def list_partitions():
+    # [(table, partition, "live"/"archive", rows estimate, bytes)] of both partitioned tables
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT substring(c.relname FROM '^(.*)_(?:y\\d{4}|default)$'), c.relname,
+                       CASE WHEN n.nspname = 'archive' THEN 'archive' ELSE 'live' END,
+                       GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+                FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relkind = 'r' AND n.nspname IN ('public', 'archive')
+                  AND c.relname ~ ('^(' || array_to_string(%s, '|') || ')_(y\\d{4}|default)$')
+                ORDER BY 1, 2
+            """, (list(PARTITIONED_TABLES),))
+            return cur.fetchall()
+
+def archive_partitions(before_year, tablespace=ARCHIVE_TABLESPACE):
+    # Detach the yearly partitions older than before_year into the archive schema (BRIN index,
+    # optional tablespace) and freeze them. They stay readable through the *_history views.
+    archived = []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for table in PARTITIONED_TABLES:
+                cur.execute("""
+                    SELECT year FROM (
+                        SELECT substring(c.relname FROM '_y(\\d{4})$')::int AS year
+                        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE i.inhparent = %s::regclass
+                    ) partitions
+                    WHERE year < %s
+                    ORDER BY year
+                """, (table, before_year))
+                for (year,) in cur.fetchall():
+                    cur.execute("SELECT archive_partition(%s, %s, %s)", (table, year, tablespace))
+                    if cur.fetchone()[0]:
+                        archived.append(f"{table}_y{year}")
+        conn.commit()
+    if archived:
+        # VACUUM can't run inside a transaction block, which get_conn() always opens
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                for name in archived:
+                    cur.execute(f"VACUUM (FREEZE, ANALYZE) archive.{name}")
+        finally:
+            conn.autocommit = False
+            pool.putconn(conn)
+        invalidate_cache("weights")
+    return archived
+
 def change_password(user_id, new_password):
     try:
+        password_hash = _auth_pool.run(hash_password, new_password)  # <-- hash the new password!
         with get_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     "UPDATE users SET password = %s WHERE id = %s",
-                    (hash_password(new_password), user_id)  # <-- hash the new password!
+                    (password_hash, user_id)
                 )
                 conn.commit()
         return True
+    except TimeoutError:
+        raise  # busy auth workers: the page asks to try again
     except Exception:
         return False
 
@@ -195,10 +1240,85 @@ def set_user_color(user_id, color):
         with conn.cursor() as cur:
             cur.execute("UPDATE users SET color = %s WHERE id = %s", (color, user_id))
             conn.commit()
+    invalidate_cache("users")
+
+def get_goal_weight(user_id):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT goal_weight FROM users WHERE id = %s", (user_id,))
+            result = cur.fetchone()
+            return result[0] if result else None
+
+def set_goal_weight(user_id, goal_weight):
+    # goal_weight None removes the goal
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE users SET goal_weight = %s WHERE id = %s", (goal_weight, user_id))
+            conn.commit()
+    invalidate_cache("users")
 
-def get_all_user_colors():
+@cached_query("users")
+def get_all_user_colors(group_id=None):
+    return dict(_read("user_colors", group_id=group_id))
+
+@cached_query("groups")
+def get_user_groups(user_id):
+    # Groups of a user, oldest membership first: (id, name, join code, start date, end date)
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT username, color FROM users")
-            return dict(cur.fetchall())
+            cur.execute("""
+                SELECT g.id, g.name, g.join_code, g.start_date, g.end_date
+                FROM group_members gm
+                JOIN groups g ON g.id = gm.group_id
+                WHERE gm.user_id = %s
+                ORDER BY gm.joined_at, g.id
+            """, (user_id,))
+            return cur.fetchall()
+
+def create_group(name, user_id, start_date=None, end_date=None):
+    # New group with the creator as first member; returns its id, None if the name is taken.
+    # A generated join code that another group already has is replaced by a fresh one.
+    for _ in range(JOIN_CODE_ATTEMPTS):
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                try:
+                    cur.execute("""
+                        INSERT INTO groups (name, join_code, start_date, end_date, created_by)
+                        VALUES (%s, %s, COALESCE(%s, CURRENT_DATE), %s, %s)
+                        RETURNING id
+                    """, (name, secrets.token_hex(4), start_date, end_date, user_id))
+                    group_id = cur.fetchone()[0]
+                    cur.execute("INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)", (group_id, user_id))
+                    conn.commit()
+                except psycopg2.errors.UniqueViolation as e:
+                    conn.rollback()
+                    if e.diag.constraint_name != "groups_join_code_key":
+                        return None
+                    continue
+        invalidate_cache("groups")
+        return group_id
+    raise RuntimeError("no free join code found")
+
+def join_group(user_id, join_code):
+    # Join the group with this code; returns its id, None for an unknown code
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO group_members (group_id, user_id)
+                SELECT id, %s FROM groups WHERE join_code = %s
+                ON CONFLICT DO NOTHING
+            """, (user_id, join_code.strip()))
+            cur.execute("SELECT id FROM groups WHERE join_code = %s", (join_code.strip(),))
+            row = cur.fetchone()
+            conn.commit()
+    # Group-scoped reads of the other members now include this user
+    invalidate_cache("groups", "weights", "users", "challenges")
+    return row[0] if row else None
+
+def leave_group(group_id, user_id):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM group_members WHERE group_id = %s AND user_id = %s", (group_id, user_id))
+            conn.commit()
+    invalidate_cache("groups", "weights", "users", "challenges")
 
@@ -0,0 +1,101 @@
+import csv
+import datetime
+import io
+import os
+from db import EXPORT_TABLES, stream_export
+
+# CSV/Parquet export of weight_entries and challenge_log. Rows come in batches from a
+# server-side cursor (db.stream_export) and are written out batch by batch, so the export
+# never holds more than one batch of rows in memory.
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))  # larger downloads: export_data.py
+
+
+class ExportTooLarge(ValueError):
+    pass
+
+
+class _CappedBuffer(io.BufferedIOBase):
+    # In-memory output that refuses to grow past max_bytes, so an oversized export stops at
+    # the first batch over the limit instead of after the last one
+
+    def __init__(self, max_bytes):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self._buffer.tell() + len(data) > self.max_bytes:
+            raise ExportTooLarge(
+                f"Export größer als {self.max_bytes // (1024 * 1024)} MB, bitte export_data.py verwenden"
+            )
+        return self._buffer.write(data)
+
+    def tell(self):
+        return self._buffer.tell()
+
+    def getvalue(self):
+        return self._buffer.getvalue()
+
+
+def export_filename(table, fmt, username=None):
+    return f"{table}_{username or 'all'}_{datetime.date.today().isoformat()}.{fmt}"
+
+
+def write_csv(table, out, user_id=None):
+    columns, _ = EXPORT_TABLES[table]
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for rows in stream_export(table, user_id):
+        writer.writerows(rows)
+    text.detach()  # leave out open for the caller
+
+
+def _parquet_schema(pa, table):
+    types = {
+        "username": pa.string(),
+        "date": pa.date32(),
+        "weight": pa.float32(),
+        "note": pa.string(),
+        "created_at": pa.timestamp("us"),
+        "completed": pa.bool_(),
+    }
+    columns, _ = EXPORT_TABLES[table]
+    return pa.schema([(name, types[name]) for name in columns])
+
+
+def write_parquet(table, out, user_id=None):
+    # One row group per cursor batch (pyarrow is an optional dependency)
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires the pyarrow package")
+    schema = _parquet_schema(pa, table)
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for rows in stream_export(table, user_id):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+_WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+def write_export(table, fmt, out, user_id=None):
+    # Write the export to the binary file object out
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table: {table}")
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    _WRITERS[fmt](table, out, user_id)
+
+
+def export_bytes(table, fmt, user_id=None, max_bytes=None):
+    # The whole export as bytes, for download buttons; raises ExportTooLarge past max_bytes
+    out = _CappedBuffer(EXPORT_MAX_BYTES if max_bytes is None else max_bytes)
+    write_export(table, fmt, out, user_id)
+    return out.getvalue()
@@ -0,0 +1,34 @@
+import argparse
+import sys
+from db import EXPORT_TABLES, get_user_id
+from export import EXPORT_FORMATS, write_export
+
+# Export weight entries or challenge completions to CSV/Parquet, streamed from the database.
+# Usage: python app/export_data.py weight_entries [--format parquet] [--user NAME] [-o FILE]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export weight_entries or challenge_log.")
+    parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--user", help="only this user's rows (default: all users)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    user_id = None
+    if args.user:
+        user_id = get_user_id(args.user)
+        if user_id is None:
+            parser.error(f"unknown user: {args.user}")
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            write_export(args.table, args.format, out, user_id)
+    else:
+        write_export(args.table, args.format, sys.stdout.buffer, user_id)
+        sys.stdout.buffer.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import argparse
+import sys
+from db import get_user_id, import_weights_csv
+
+# Bulk import of weight entries from a CSV file (columns: username, date, weight, note).
+# Usage: python app/import_weights.py entries.csv [--user NAME]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import weight entries from a CSV file.")
+    parser.add_argument("path", help="CSV file ('-' for stdin)")
+    parser.add_argument("--user", help="import all rows for this user (the CSV needs no username column)")
+    args = parser.parse_args(argv)
+
+    user_id = None
+    if args.user:
+        user_id = get_user_id(args.user)
+        if user_id is None:
+            parser.error(f"unknown user: {args.user}")
+
+    if args.path == "-":
+        result = import_weights_csv(sys.stdin.buffer, user_id=user_id)
+    else:
+        with open(args.path, "rb") as f:
+            result = import_weights_csv(f, user_id=user_id)
+
+    print(f"inserted: {result['inserted']}, updated: {result['updated']}, rejected: {result['rejected']}")
+    if result["rejected_lines"]:
+        print("rejected lines: " + ", ".join(str(n) for n in result["rejected_lines"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import atexit
+import bisect
+import contextvars
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Query metrics for db.py: every cursor is a db.InstrumentedCursor that records latency, row count
+# and errors per query name (the db.py function that ran it). Totals are kept per process and per
+# page rerun, and exported in the Prometheus text format to METRICS_FILE and/or an HTTP endpoint
+# on METRICS_PORT. Queries slower than SLOW_QUERY_MS are logged to the "db.slow_query" logger.
+# No database driver is imported here, so every page can record its reruns without loading psycopg2.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_FILE = os.getenv("METRICS_FILE", "")  # e.g. /var/lib/node_exporter/textfile/project42.prom
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "10"))  # min seconds between file writes
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no HTTP endpoint
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))  # 0 = no slow query log
+
+# Histogram buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_log = logging.getLogger("db.slow_query")
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+# Per-rerun totals, collected in a context variable while a page script runs
+class RerunStats:
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.queries = {}  # name -> [calls, seconds, rows]
+        self.acquire_seconds = 0.0
+        self.acquires = 0
+        self._lock = threading.Lock()  # queries of one rerun may run on several threads
+
+    def add_query(self, name, seconds, rows):
+        with self._lock:
+            totals = self.queries.setdefault(name, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += rows
+
+    def add_rows(self, name, rows):
+        with self._lock:
+            self.queries.setdefault(name, [0, 0.0, 0])[2] += rows
+
+    def add_acquire(self, seconds):
+        with self._lock:
+            self.acquires += 1
+            self.acquire_seconds += seconds
+
+    @property
+    def query_count(self):
+        with self._lock:
+            return sum(t[0] for t in self.queries.values())
+
+    @property
+    def query_seconds(self):
+        with self._lock:
+            return sum(t[1] for t in self.queries.values())
+
+
+_current_rerun = contextvars.ContextVar("metrics_rerun", default=None)
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}  # query name -> Histogram
+        self._rows = {}  # query name -> rows returned/affected
+        self._errors = {}  # query name -> failed executions
+        self._acquire = Histogram()
+        self._rerun_db = {}  # page -> Histogram of db seconds per rerun
+        self._rerun_queries = {}  # page -> queries over all reruns
+        self._gauges = []  # callables returning {metric name: value}
+        self._last_write = 0.0
+
+    def observe_query(self, name, seconds, rows, failed=False):
+        with self._lock:
+            histogram = self._latency.get(name)
+            if histogram is None:
+                histogram = self._latency[name] = Histogram()
+            histogram.observe(seconds)
+            self._rows[name] = self._rows.get(name, 0) + rows
+            if failed:
+                self._errors[name] = self._errors.get(name, 0) + 1
+        rerun = _current_rerun.get()
+        if rerun is not None:
+            rerun.add_query(name, seconds, rows)
+
+    def add_rows(self, name, rows):
+        # Rows fetched later from a server-side cursor
+        with self._lock:
+            self._rows[name] = self._rows.get(name, 0) + rows
+        rerun = _current_rerun.get()
+        if rerun is not None:
+            rerun.add_rows(name, rows)
+
+    def observe_acquire(self, seconds):
+        with self._lock:
+            self._acquire.observe(seconds)
+        rerun = _current_rerun.get()
+        if rerun is not None:
+            rerun.add_acquire(seconds)
+
+    def observe_rerun(self, rerun):
+        with self._lock:
+            histogram = self._rerun_db.get(rerun.page)
+            if histogram is None:
+                histogram = self._rerun_db[rerun.page] = Histogram()
+            histogram.observe(rerun.query_seconds)
+            self._rerun_queries[rerun.page] = self._rerun_queries.get(rerun.page, 0) + rerun.query_count
+
+    def add_gauges(self, callback):
+        self._gauges.append(callback)
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+
+        def histogram(name, help_text, label, histograms):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, h in sorted(histograms.items()):
+                labels = {label: key} if label else {}
+                cumulative = 0
+                for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(**labels, le=le)} {cumulative}")
+                suffix = _labels(**labels) if labels else ""
+                lines.append(f"{name}_sum{suffix} {h.sum:.6f}")
+                lines.append(f"{name}_count{suffix} {h.count}")
+
+        def counter(name, help_text, label, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(values.items()):
+                lines.append(f"{name}{_labels(**{label: key})} {value}")
+
+        with self._lock:
+            histogram("db_query_duration_seconds", "Query latency per db.py function.", "query", self._latency)
+            counter("db_query_rows_total", "Rows returned or affected per db.py function.", "query", self._rows)
+            counter("db_query_errors_total", "Failed queries per db.py function.", "query", self._errors)
+            histogram("db_pool_acquire_seconds", "Time to borrow a pooled connection.", None, {"": self._acquire})
+            histogram("page_rerun_db_seconds", "Query time per page rerun.", "page", self._rerun_db)
+            counter("page_rerun_queries_total", "Queries run by page reruns.", "page", self._rerun_queries)
+        for callback in self._gauges:
+            for name, value in sorted(callback().items()):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path=None, force=False):
+        path = path or METRICS_FILE
+        now = time.monotonic()
+        if not path or (not force and now - self._last_write < METRICS_FILE_INTERVAL):
+            return
+        self._last_write = now
+        # Atomic replace, so a scraper never reads a half-written file
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+
+_query_label = contextvars.ContextVar("metrics_query_label", default=None)
+
+
+@contextmanager
+def query_name(name):
+    # Records the queries run inside the block under name, for helpers that run SQL on behalf of
+    # several callers (the frame walk below would name them all after the helper)
+    token = _query_label.set(name)
+    try:
+        yield
+    finally:
+        _query_label.reset(token)
+
+
+def current_query_name():
+    # The explicit query_name() label, else the db.py function that ran the query: the caller
+    # of the cursor method that calls this
+    label = _query_label.get()
+    if label is not None:
+        return label
+    frame = sys._getframe(2)
+    return frame.f_code.co_name if frame is not None else "unknown"
+
+
+def log_slow_query(name, seconds, rows, query):
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        text = query.decode(errors="replace") if isinstance(query, bytes) else str(query)
+        slow_query_log.warning(
+            "slow query %s: %.1f ms, %d rows: %s", name, seconds * 1000, rows, " ".join(text.split())[:500]
+        )
+
+
+def start_rerun(page):
+    # Begin collecting the queries of one page rerun (in the current context)
+    rerun = RerunStats(page)
+    _current_rerun.set(rerun)
+    return rerun
+
+
+def end_rerun(rerun=None):
+    # Finish a rerun: record it process-wide and refresh the metrics file if due
+    rerun = rerun or _current_rerun.get()
+    if rerun is None:
+        return None
+    if _current_rerun.get() is rerun:
+        _current_rerun.set(None)
+    registry.observe_rerun(rerun)
+    registry.write_file()
+    return rerun
+
+
+def current_rerun():
+    return _current_rerun.get()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def start_exporter():
+    # Once per process: HTTP endpoint on METRICS_PORT and a final metrics file write at exit
+    global _exporter_started
+    if _exporter_started:
+        return
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        if METRICS_PORT:
+            server = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+        if METRICS_FILE:
+            atexit.register(registry.write_file, force=True)
+        _exporter_started = True
@@ -0,0 +1,76 @@
+import os
+import re
+import threading
+from db import ensure_partitions, get_conn, register_test_users
+
+# Versioned schema migrations: app/migrations/<version>_<name>.sql, applied in order
+# and recorded in schema_migrations. Run once at process start, never per rerun.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_LOCK_ID = 42420001  # pg_advisory_lock key, keeps concurrent app processes from migrating twice
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+
+def list_migrations():
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r"^(\d+)_(.+)\.sql$", filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+
+def migrate():
+    # Apply all pending migrations (each in its own transaction) and seed the test users.
+    # Returns the list of (version, name) that were applied.
+    applied = []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT NOW()
+                    )
+                """)
+                conn.commit()
+                cur.execute("SELECT version FROM schema_migrations")
+                done = {row[0] for row in cur.fetchall()}
+                for version, name, path in list_migrations():
+                    if version in done:
+                        continue
+                    with open(path, encoding="utf-8") as f:
+                        cur.execute(f.read())
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                    conn.commit()
+                    applied.append((version, name))
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+    # Testnutzer einmalig registrieren
+    register_test_users()
+    # Yearly partitions for this year and the next (migration 0005)
+    ensure_partitions()
+    return applied
+
+
+def ensure_migrated():
+    # Cheap to call from every page: only the first call per process touches the database
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            migrate()
+            _migrated = True
+
+
+if __name__ == "__main__":
+    for version, name in migrate():
+        print(f"applied migration {version:04d}_{name}")
@@ -0,0 +1,68 @@
+-- Per-user leaderboard row (first/latest entry, losses, count), kept up to date by
+-- statement-level triggers on weight_entries so the rankings never scan all entries.
+
+CREATE TABLE IF NOT EXISTS weight_summary (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    first_date DATE NOT NULL,
+    first_weight REAL NOT NULL,
+    latest_date DATE NOT NULL,
+    latest_weight REAL NOT NULL,
+    entry_count INTEGER NOT NULL,
+    loss_abs DOUBLE PRECISION GENERATED ALWAYS AS
+        ((first_weight::numeric - latest_weight::numeric)::float8) STORED,
+    loss_rel DOUBLE PRECISION GENERATED ALWAYS AS
+        (((first_weight::numeric - latest_weight::numeric) / NULLIF(first_weight::numeric, 0) * 100)::float8) STORED,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION refresh_weight_summary(p_user_id INTEGER) RETURNS VOID AS $$
+BEGIN
+    -- Serialize refreshes per user so concurrent writers can't store a stale row
+    PERFORM pg_advisory_xact_lock(hashtext('weight_summary'), p_user_id);
+    IF NOT EXISTS (SELECT 1 FROM weight_entries WHERE user_id = p_user_id) THEN
+        DELETE FROM weight_summary WHERE user_id = p_user_id;
+        RETURN;
+    END IF;
+    INSERT INTO weight_summary (user_id, first_date, first_weight, latest_date, latest_weight, entry_count, updated_at)
+    SELECT p_user_id, f.date, f.weight, l.date, l.weight, c.n, NOW()
+    FROM (SELECT date, weight FROM weight_entries WHERE user_id = p_user_id ORDER BY date ASC LIMIT 1) f,
+         (SELECT date, weight FROM weight_entries WHERE user_id = p_user_id ORDER BY date DESC LIMIT 1) l,
+         (SELECT COUNT(*) AS n FROM weight_entries WHERE user_id = p_user_id) c
+    ON CONFLICT (user_id) DO UPDATE SET
+        first_date = EXCLUDED.first_date,
+        first_weight = EXCLUDED.first_weight,
+        latest_date = EXCLUDED.latest_date,
+        latest_weight = EXCLUDED.latest_weight,
+        entry_count = EXCLUDED.entry_count,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION weight_summary_on_change() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM refresh_weight_summary(user_id) FROM (SELECT DISTINCT user_id FROM new_rows) changed;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_weight_summary(user_id) FROM (SELECT DISTINCT user_id FROM old_rows) changed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER weight_summary_insert AFTER INSERT ON weight_entries
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_summary_on_change();
+
+CREATE OR REPLACE TRIGGER weight_summary_update AFTER UPDATE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_summary_on_change();
+
+CREATE OR REPLACE TRIGGER weight_summary_delete AFTER DELETE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_summary_on_change();
+
+-- Backfill users whose entries predate the triggers
+SELECT refresh_weight_summary(user_id)
+FROM (SELECT DISTINCT user_id FROM weight_entries) w
+WHERE NOT EXISTS (SELECT 1 FROM weight_summary s WHERE s.user_id = w.user_id);
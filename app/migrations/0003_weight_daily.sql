@@ -0,0 +1,72 @@
+-- Dense daily weight series per user, linearly interpolated between real entries.
+-- Triggers on weight_entries only recompute the segment between the neighbouring
+-- real entries of whatever was inserted, updated or deleted.
+
+CREATE TABLE IF NOT EXISTS weight_daily (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    date DATE NOT NULL,
+    weight DOUBLE PRECISION NOT NULL,
+    is_real BOOLEAN NOT NULL DEFAULT FALSE, -- TRUE on days with an actual entry
+    PRIMARY KEY (user_id, date)
+);
+
+CREATE OR REPLACE FUNCTION refresh_weight_daily(p_user_id INTEGER, p_from DATE, p_to DATE) RETURNS VOID AS $$
+DECLARE
+    lo DATE;
+    hi DATE;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('weight_daily'), p_user_id);
+    -- Widen the changed range to the surrounding real entries
+    SELECT COALESCE(MAX(date), p_from) INTO lo FROM weight_entries WHERE user_id = p_user_id AND date < p_from;
+    SELECT COALESCE(MIN(date), p_to) INTO hi FROM weight_entries WHERE user_id = p_user_id AND date > p_to;
+    DELETE FROM weight_daily WHERE user_id = p_user_id AND date BETWEEN lo AND hi;
+    INSERT INTO weight_daily (user_id, date, weight, is_real)
+    SELECT p_user_id, d::date,
+           CASE WHEN s.next_date IS NULL THEN s.weight
+                ELSE s.weight + (s.next_weight - s.weight) * (d::date - s.date) / (s.next_date - s.date)
+           END,
+           d::date = s.date
+    FROM (
+        SELECT date, weight::numeric::float8 AS weight,
+               LEAD(date) OVER w AS next_date,
+               LEAD(weight::numeric::float8) OVER w AS next_weight
+        FROM weight_entries
+        WHERE user_id = p_user_id AND date BETWEEN lo AND hi
+        WINDOW w AS (ORDER BY date)
+    ) s
+    CROSS JOIN LATERAL generate_series(s.date, COALESCE(s.next_date - 1, s.date), INTERVAL '1 day') d;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION weight_daily_on_change() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_weight_daily(user_id, MIN(date), MAX(date)) FROM new_rows GROUP BY user_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_weight_daily(user_id, MIN(date), MAX(date)) FROM old_rows GROUP BY user_id;
+    ELSE
+        PERFORM refresh_weight_daily(user_id, MIN(date), MAX(date))
+        FROM (SELECT user_id, date FROM old_rows UNION ALL SELECT user_id, date FROM new_rows) changed
+        GROUP BY user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER weight_daily_insert AFTER INSERT ON weight_entries
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_daily_on_change();
+
+CREATE OR REPLACE TRIGGER weight_daily_update AFTER UPDATE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_daily_on_change();
+
+CREATE OR REPLACE TRIGGER weight_daily_delete AFTER DELETE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_daily_on_change();
+
+-- Backfill users whose entries predate the triggers
+SELECT refresh_weight_daily(user_id, MIN(date), MAX(date))
+FROM weight_entries w
+WHERE NOT EXISTS (SELECT 1 FROM weight_daily d WHERE d.user_id = w.user_id)
+GROUP BY user_id;
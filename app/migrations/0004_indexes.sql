@@ -0,0 +1,28 @@
+-- Index set for the queries in app/db.py (checked by bench/check_plans.py)
+
+-- authenticate_user, user_exists, get_user_id, import_weights_csv: case-insensitive login name
+-- (the UNIQUE(username) index only serves exact matches)
+CREATE INDEX IF NOT EXISTS users_username_lower_idx ON users (LOWER(username));
+
+-- get_weights_filtered, get_all_weights_for_all_users, get_weight_date_range: date windows and
+-- MIN/MAX across all users. INCLUDE makes the range scan index-only for the chart columns.
+CREATE INDEX IF NOT EXISTS weight_entries_date_idx ON weight_entries (date) INCLUDE (user_id, weight);
+
+-- get_weight_entries: a user's entries newest first by creation time
+CREATE INDEX IF NOT EXISTS weight_entries_user_created_idx ON weight_entries (user_id, created_at DESC);
+
+-- get_challenge_status_all_users: everybody's status for one day
+CREATE INDEX IF NOT EXISTS challenge_log_date_idx ON challenge_log (date, user_id) INCLUDE (completed);
+
+-- get_daily_weights: date window across users (the primary key leads with user_id)
+CREATE INDEX IF NOT EXISTS weight_daily_date_idx ON weight_daily (date) INCLUDE (user_id, weight, is_real);
+
+-- get_weight_loss_ranking: top N by absolute / relative loss
+CREATE INDEX IF NOT EXISTS weight_summary_loss_abs_idx ON weight_summary (loss_abs DESC);
+CREATE INDEX IF NOT EXISTS weight_summary_loss_rel_idx ON weight_summary (loss_rel DESC);
+
+ANALYZE users;
+ANALYZE weight_entries;
+ANALYZE challenge_log;
+ANALYZE weight_daily;
+ANALYZE weight_summary;
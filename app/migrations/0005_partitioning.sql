@@ -0,0 +1,226 @@
+-- Range partitioning by year for weight_entries and challenge_log (weight_entries_y2025, ...).
+-- Rows for a year without a partition land in the DEFAULT partition until ensure_partition()
+-- creates that year and moves them over (db.ensure_partitions runs at every migrate).
+-- Old years can be archived (archive_partition, app/archive_partitions.py): detached into the
+-- archive schema with a BRIN index instead of the b-trees, and still readable through the
+-- weight_entries_history / challenge_log_history views.
+
+CREATE SCHEMA IF NOT EXISTS archive;
+
+CREATE OR REPLACE FUNCTION ensure_partition(p_table TEXT, p_year INTEGER) RETURNS BOOLEAN AS $$
+DECLARE
+    part TEXT := format('%s_y%s', p_table, p_year);
+    lo DATE := make_date(p_year, 1, 1);
+    hi DATE := make_date(p_year + 1, 1, 1);
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_partition'), hashtext(part));
+    IF to_regclass(format('public.%I', part)) IS NOT NULL OR to_regclass(format('archive.%I', part)) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    -- Rows of that year parked in the DEFAULT partition move into the new partition first,
+    -- otherwise the DEFAULT partition would violate its new bounds
+    EXECUTE format('CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS)', part, p_table);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM public.%I WHERE date >= %L AND date < %L RETURNING *) INSERT INTO public.%I SELECT * FROM moved',
+        p_table || '_default', lo, hi, part
+    );
+    EXECUTE format('ALTER TABLE public.%I ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)', p_table, part, lo, hi);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_history_view(p_table TEXT) RETURNS VOID AS $$
+DECLARE
+    query TEXT := format('SELECT * FROM public.%I', p_table);
+    part RECORD;
+BEGIN
+    FOR part IN
+        SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'archive' AND c.relkind = 'r' AND c.relname ~ ('^' || p_table || '_y\d{4}$')
+        ORDER BY c.relname
+    LOOP
+        query := query || format(' UNION ALL SELECT * FROM archive.%I', part.relname);
+    END LOOP;
+    EXECUTE format('CREATE OR REPLACE VIEW public.%I AS %s', p_table || '_history', query);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION archive_partition(p_table TEXT, p_year INTEGER, p_tablespace TEXT DEFAULT NULL) RETURNS BOOLEAN AS $$
+DECLARE
+    part TEXT := format('%s_y%s', p_table, p_year);
+    idx RECORD;
+BEGIN
+    IF to_regclass(format('public.%I', part)) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('ALTER TABLE public.%I DETACH PARTITION public.%I', p_table, part);
+    EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', part);
+    -- Cold data keeps its unique (user_id, date) index for the per-user history reads and
+    -- trades the other b-trees for a BRIN index on date
+    FOR idx IN
+        SELECT i.indexrelid::regclass AS name FROM pg_index i
+        WHERE i.indrelid = format('archive.%I', part)::regclass AND NOT i.indisunique
+    LOOP
+        EXECUTE format('DROP INDEX %s', idx.name);
+    END LOOP;
+    EXECUTE format('CREATE INDEX %I ON archive.%I USING brin (date)', part || '_date_brin', part);
+    IF p_tablespace IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE archive.%I SET TABLESPACE %I', part, p_tablespace);
+    END IF;
+    PERFORM rebuild_history_view(p_table);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- weight_entries: rebuild as a partitioned table and copy the rows over
+DROP TRIGGER IF EXISTS weight_summary_insert ON weight_entries;
+DROP TRIGGER IF EXISTS weight_summary_update ON weight_entries;
+DROP TRIGGER IF EXISTS weight_summary_delete ON weight_entries;
+DROP TRIGGER IF EXISTS weight_daily_insert ON weight_entries;
+DROP TRIGGER IF EXISTS weight_daily_update ON weight_entries;
+DROP TRIGGER IF EXISTS weight_daily_delete ON weight_entries;
+ALTER TABLE weight_entries RENAME TO weight_entries_unpartitioned;
+ALTER TABLE weight_entries_unpartitioned DROP CONSTRAINT weight_entries_user_id_fkey;
+ALTER INDEX weight_entries_pkey RENAME TO weight_entries_unpartitioned_pkey;
+ALTER INDEX weight_entries_user_id_date_key RENAME TO weight_entries_unpartitioned_user_id_date_key;
+DROP INDEX IF EXISTS weight_entries_date_idx;
+DROP INDEX IF EXISTS weight_entries_user_created_idx;
+ALTER SEQUENCE weight_entries_id_seq OWNED BY NONE;
+
+CREATE TABLE weight_entries (
+    id INTEGER NOT NULL DEFAULT nextval('weight_entries_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    date DATE NOT NULL,
+    weight REAL NOT NULL, -- in kilograms
+    note TEXT, -- optional note for each entry
+    created_at TIMESTAMP DEFAULT NOW(), -- when the entry was added
+    PRIMARY KEY (id, date), -- the partition key has to be part of every unique constraint
+    UNIQUE (user_id, date) -- only one entry per user per day
+) PARTITION BY RANGE (date);
+ALTER SEQUENCE weight_entries_id_seq OWNED BY weight_entries.id;
+CREATE TABLE weight_entries_default PARTITION OF weight_entries DEFAULT;
+
+-- Same secondary indexes as 0004, created on every partition through the parent
+CREATE INDEX weight_entries_date_idx ON weight_entries (date) INCLUDE (user_id, weight);
+CREATE INDEX weight_entries_user_created_idx ON weight_entries (user_id, created_at DESC);
+
+-- challenge_log: same procedure
+ALTER TABLE challenge_log RENAME TO challenge_log_unpartitioned;
+ALTER TABLE challenge_log_unpartitioned DROP CONSTRAINT challenge_log_user_id_fkey;
+ALTER INDEX challenge_log_pkey RENAME TO challenge_log_unpartitioned_pkey;
+ALTER INDEX challenge_log_user_id_date_key RENAME TO challenge_log_unpartitioned_user_id_date_key;
+DROP INDEX IF EXISTS challenge_log_date_idx;
+ALTER SEQUENCE challenge_log_id_seq OWNED BY NONE;
+
+CREATE TABLE challenge_log (
+    id INTEGER NOT NULL DEFAULT nextval('challenge_log_id_seq'),
+    user_id INTEGER REFERENCES users(id),
+    date DATE NOT NULL,
+    completed BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (id, date),
+    UNIQUE (user_id, date)
+) PARTITION BY RANGE (date);
+ALTER SEQUENCE challenge_log_id_seq OWNED BY challenge_log.id;
+CREATE TABLE challenge_log_default PARTITION OF challenge_log DEFAULT;
+
+CREATE INDEX challenge_log_date_idx ON challenge_log (date, user_id) INCLUDE (completed);
+
+-- One partition per year that has rows, plus this year and the next
+SELECT ensure_partition('weight_entries', y)
+FROM (
+    SELECT DISTINCT EXTRACT(YEAR FROM date)::int AS y FROM weight_entries_unpartitioned
+    UNION SELECT EXTRACT(YEAR FROM CURRENT_DATE)::int + n FROM generate_series(0, 1) n
+) years ORDER BY y;
+SELECT ensure_partition('challenge_log', y)
+FROM (
+    SELECT DISTINCT EXTRACT(YEAR FROM date)::int AS y FROM challenge_log_unpartitioned
+    UNION SELECT EXTRACT(YEAR FROM CURRENT_DATE)::int + n FROM generate_series(0, 1) n
+) years ORDER BY y;
+
+-- weight_summary and weight_daily are already up to date, the triggers come back after the copy
+INSERT INTO weight_entries SELECT * FROM weight_entries_unpartitioned;
+INSERT INTO challenge_log SELECT * FROM challenge_log_unpartitioned;
+DROP TABLE weight_entries_unpartitioned;
+DROP TABLE challenge_log_unpartitioned;
+
+SELECT rebuild_history_view('weight_entries');
+SELECT rebuild_history_view('challenge_log');
+
+-- The summary and daily series are computed over the archived years too
+CREATE OR REPLACE FUNCTION refresh_weight_summary(p_user_id INTEGER) RETURNS VOID AS $$
+BEGIN
+    -- Serialize refreshes per user so concurrent writers can't store a stale row
+    PERFORM pg_advisory_xact_lock(hashtext('weight_summary'), p_user_id);
+    IF NOT EXISTS (SELECT 1 FROM weight_entries_history WHERE user_id = p_user_id) THEN
+        DELETE FROM weight_summary WHERE user_id = p_user_id;
+        RETURN;
+    END IF;
+    INSERT INTO weight_summary (user_id, first_date, first_weight, latest_date, latest_weight, entry_count, updated_at)
+    SELECT p_user_id, f.date, f.weight, l.date, l.weight, c.n, NOW()
+    FROM (SELECT date, weight FROM weight_entries_history WHERE user_id = p_user_id ORDER BY date ASC LIMIT 1) f,
+         (SELECT date, weight FROM weight_entries_history WHERE user_id = p_user_id ORDER BY date DESC LIMIT 1) l,
+         (SELECT COUNT(*) AS n FROM weight_entries_history WHERE user_id = p_user_id) c
+    ON CONFLICT (user_id) DO UPDATE SET
+        first_date = EXCLUDED.first_date,
+        first_weight = EXCLUDED.first_weight,
+        latest_date = EXCLUDED.latest_date,
+        latest_weight = EXCLUDED.latest_weight,
+        entry_count = EXCLUDED.entry_count,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_weight_daily(p_user_id INTEGER, p_from DATE, p_to DATE) RETURNS VOID AS $$
+DECLARE
+    lo DATE;
+    hi DATE;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('weight_daily'), p_user_id);
+    -- Widen the changed range to the surrounding real entries
+    SELECT COALESCE(MAX(date), p_from) INTO lo FROM weight_entries_history WHERE user_id = p_user_id AND date < p_from;
+    SELECT COALESCE(MIN(date), p_to) INTO hi FROM weight_entries_history WHERE user_id = p_user_id AND date > p_to;
+    DELETE FROM weight_daily WHERE user_id = p_user_id AND date BETWEEN lo AND hi;
+    INSERT INTO weight_daily (user_id, date, weight, is_real)
+    SELECT p_user_id, d::date,
+           CASE WHEN s.next_date IS NULL THEN s.weight
+                ELSE s.weight + (s.next_weight - s.weight) * (d::date - s.date) / (s.next_date - s.date)
+           END,
+           d::date = s.date
+    FROM (
+        SELECT date, weight::numeric::float8 AS weight,
+               LEAD(date) OVER w AS next_date,
+               LEAD(weight::numeric::float8) OVER w AS next_weight
+        FROM weight_entries_history
+        WHERE user_id = p_user_id AND date BETWEEN lo AND hi
+        WINDOW w AS (ORDER BY date)
+    ) s
+    CROSS JOIN LATERAL generate_series(s.date, COALESCE(s.next_date - 1, s.date), INTERVAL '1 day') d;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER weight_summary_insert AFTER INSERT ON weight_entries
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_summary_on_change();
+
+CREATE TRIGGER weight_summary_update AFTER UPDATE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_summary_on_change();
+
+CREATE TRIGGER weight_summary_delete AFTER DELETE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_summary_on_change();
+
+CREATE TRIGGER weight_daily_insert AFTER INSERT ON weight_entries
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_daily_on_change();
+
+CREATE TRIGGER weight_daily_update AFTER UPDATE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_daily_on_change();
+
+CREATE TRIGGER weight_daily_delete AFTER DELETE ON weight_entries
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weight_daily_on_change();
+
+ANALYZE weight_entries;
+ANALYZE challenge_log;
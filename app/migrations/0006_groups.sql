@@ -0,0 +1,38 @@
+-- Groups (challenge rounds): independent friend groups on one installation. Dashboards,
+-- rankings and the challenge overview only read the members of the active group, so their
+-- cost follows the group size instead of the number of registered users.
+
+CREATE TABLE IF NOT EXISTS groups (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    join_code TEXT NOT NULL UNIQUE, -- shared with friends to join the group
+    start_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    end_date DATE, -- NULL = open-ended round
+    created_by INTEGER REFERENCES users(id),
+    created_at TIMESTAMP DEFAULT NOW(),
+    CHECK (end_date IS NULL OR end_date >= start_date)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS groups_name_lower_idx ON groups (LOWER(name));
+
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    joined_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (group_id, user_id) -- members of a group; per-user reads then use (user_id, date) keys
+);
+-- get_user_groups: the groups of one user
+CREATE INDEX IF NOT EXISTS group_members_user_idx ON group_members (user_id);
+
+-- Everybody registered so far shares one group, as before
+INSERT INTO groups (name, join_code, start_date)
+SELECT 'Project42', substr(md5(random()::text), 1, 8),
+       COALESCE((SELECT MIN(date) FROM weight_entries_history), CURRENT_DATE)
+WHERE NOT EXISTS (SELECT 1 FROM groups WHERE LOWER(name) = 'project42');
+
+INSERT INTO group_members (group_id, user_id)
+SELECT g.id, u.id FROM groups g CROSS JOIN users u
+WHERE LOWER(g.name) = 'project42'
+ON CONFLICT DO NOTHING;
+
+ANALYZE groups;
+ANALYZE group_members;
@@ -0,0 +1,4 @@
+-- Optional goal weight per user, used by the trend projection (trends.py)
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS goal_weight REAL -- in kilograms, NULL = no goal
+    CHECK (goal_weight BETWEEN 20 AND 300);
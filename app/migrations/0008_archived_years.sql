@@ -0,0 +1,53 @@
+-- Archived years are read-only. Once a year is detached into the archive schema, a write for
+-- that year would land in the DEFAULT partition, next to the archived rows and outside the reach
+-- of UNIQUE (user_id, date), so ON CONFLICT upserts would duplicate entries. A CHECK constraint
+-- on the DEFAULT partition rejects such rows; archive_partition() rebuilds it for every new year.
+
+CREATE OR REPLACE FUNCTION guard_archived_years(p_table TEXT) RETURNS VOID AS $$
+DECLARE
+    years INTEGER[];
+BEGIN
+    SELECT array_agg(substring(c.relname FROM '_y(\d{4})$')::int ORDER BY c.relname) INTO years
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'archive' AND c.relkind = 'r' AND c.relname ~ ('^' || p_table || '_y\d{4}$');
+    EXECUTE format('ALTER TABLE public.%I DROP CONSTRAINT IF EXISTS %I', p_table || '_default', p_table || '_default_not_archived');
+    IF years IS NOT NULL THEN
+        -- NOT VALID: rows parked there before this migration are left for the admin to resolve
+        EXECUTE format(
+            'ALTER TABLE public.%I ADD CONSTRAINT %I CHECK (EXTRACT(YEAR FROM date)::int <> ALL (%L::int[])) NOT VALID',
+            p_table || '_default', p_table || '_default_not_archived', years
+        );
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION archive_partition(p_table TEXT, p_year INTEGER, p_tablespace TEXT DEFAULT NULL) RETURNS BOOLEAN AS $$
+DECLARE
+    part TEXT := format('%s_y%s', p_table, p_year);
+    idx RECORD;
+BEGIN
+    IF to_regclass(format('public.%I', part)) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('ALTER TABLE public.%I DETACH PARTITION public.%I', p_table, part);
+    EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', part);
+    -- Cold data keeps its unique (user_id, date) index for the per-user history reads and
+    -- trades the other b-trees for a BRIN index on date
+    FOR idx IN
+        SELECT i.indexrelid::regclass AS name FROM pg_index i
+        WHERE i.indrelid = format('archive.%I', part)::regclass AND NOT i.indisunique
+    LOOP
+        EXECUTE format('DROP INDEX %s', idx.name);
+    END LOOP;
+    EXECUTE format('CREATE INDEX %I ON archive.%I USING brin (date)', part || '_date_brin', part);
+    IF p_tablespace IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE archive.%I SET TABLESPACE %I', part, p_tablespace);
+    END IF;
+    PERFORM rebuild_history_view(p_table);
+    PERFORM guard_archived_years(p_table);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT guard_archived_years('weight_entries');
+SELECT guard_archived_years('challenge_log');
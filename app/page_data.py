@@ -0,0 +1,136 @@
+import contextvars
+import copy
+import datetime
+import queries
+
+# Page data loader: a page declares the datasets it needs and load() fetches all of them in
+# one round trip (a single SELECT of json sub-selects). Results are memoized for the rest of
+# the rerun (the page shell resets the memo) until a write invalidates their cache tags, and
+# batches of cacheable datasets also go through db.py's shared read cache.
+#
+#   (first, last), colors = load("weight_date_range", "user_colors", group_id=1)
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value) if value is not None else None
+
+
+def _rows(rows):
+    # json row objects -> tuples in column order, as db.py returns them
+    return [tuple(row.values()) for row in rows]
+
+
+def _ranking(rows):
+    # json numbers lose the float type of whole weights (74.0 -> 74)
+    return [(user, float(first), float(latest), *rest) for user, first, latest, *rest in _rows(rows)]
+
+
+# name -> (SQL returning one json value, decoder, cache tags or None for uncached).
+# Datasets over several users are scoped to the group_id parameter; the challenge history
+# datasets cover the user and their group (only the user without a group). The SQL is shared
+# with db.py's readers (queries.py).
+DATASETS = {
+    "weight_date_range": (
+        queries.select_json("weight_date_range"),
+        lambda row: (_date(row["first_date"]), _date(row["last_date"])),
+        ("weights",)
+    ),
+    "usernames_with_entries": (
+        queries.select_json("usernames_with_entries"),
+        lambda rows: [row["username"] for row in rows],
+        ("weights",)
+    ),
+    "user_colors": (
+        queries.select_json("user_colors"),
+        lambda rows: dict(_rows(rows)),
+        ("users",)
+    ),
+    "loss_ranking_abs": (queries.select_json("loss_ranking_abs"), _ranking, ("weights",)),
+    "loss_ranking_rel": (queries.select_json("loss_ranking_rel"), _ranking, ("weights",)),
+    "challenge_completed": (
+        queries.select_json("challenge_completed"),
+        lambda row: row["completed"],
+        ("challenges",)
+    ),
+    "challenge_status": (queries.select_json("challenge_status"), _rows, ("challenges",)),
+    "challenge_streaks": (
+        queries.select_json("challenge_streaks"),
+        lambda rows: [(user, current, longest, _date(last)) for user, current, longest, last in _rows(rows)],
+        ("challenges",)
+    ),
+    "challenge_rates": (
+        queries.select_json("challenge_rates"),
+        lambda rows: [(user, [float(rate) for rate in rates]) for user, rates in _rows(rows)],
+        ("challenges",)
+    ),
+    "challenge_calendar": (
+        queries.select_json("challenge_calendar"),
+        lambda rows: [(_date(day), mine, done) for day, mine, done in _rows(rows)],
+        ("challenges",)
+    ),
+}
+
+DEFAULT_PARAMS = {"ranking_limit": 3, "group_id": None, "usernames": None}
+
+_memo = contextvars.ContextVar("page_data_memo", default=None)  # (name, params) -> (generation, value)
+
+
+def start_rerun():
+    # Fresh memo for a page rerun (called by the page shell)
+    _memo.set({})
+
+
+def _fetch(names, params):
+    # One round trip: SELECT json_build_object('name', (sub-select), ...)
+    import db
+    import metrics
+    pairs = ", ".join(f"'{name}', ({DATASETS[name][0]})" for name in names)
+    # One metrics series per batch of datasets, e.g. page_data[user_colors,weight_date_range]
+    with metrics.query_name(f"page_data[{','.join(sorted(names))}]"), db.get_conn() as conn:
+        with conn.cursor() as cur:
+            # Tuple parameters (e.g. rate_windows) are passed as arrays
+            values = {key: list(value) if isinstance(value, tuple) else value for key, value in params}
+            cur.execute(f"SELECT json_build_object({pairs})", values)
+            row = cur.fetchone()[0]
+    return {name: DATASETS[name][1](row[name]) for name in names}
+
+
+def _load_batch(names, params):
+    # Shared cache only if every dataset in the batch has tags its writes invalidate
+    import db
+    tags = set()
+    for name in names:
+        if DATASETS[name][2] is None:
+            return _fetch(names, params)
+        tags.update(DATASETS[name][2])
+    batch = db.cached_query(*sorted(tags))(_fetch)(names, params)
+    return {name: copy.copy(value) for name, value in batch.items()}
+
+
+def _generation(name):
+    import db
+    return db.cache_generation(*(DATASETS[name][2] or ()))
+
+
+def load(*names, **params):
+    # Returns the datasets in the order given; parameters: user_id, today, group_id, ranking_limit, usernames,
+    # rate_windows (tuple of days), start_date, end_date
+    unknown = [name for name in names if name not in DATASETS]
+    if unknown:
+        raise ValueError(f"Unknown dataset: {', '.join(unknown)}")
+    params = tuple(sorted({**DEFAULT_PARAMS, **params}.items()))
+    memo = _memo.get()
+    if memo is None:
+        # Outside a page rerun: nothing to memoize into
+        fetched = _load_batch(tuple(dict.fromkeys(names)), params)
+        return [fetched[name] for name in names]
+
+    missing = [
+        name for name in dict.fromkeys(names)
+        if memo.get((name, params), (None,))[0] != _generation(name)
+    ]
+    if missing:
+        generations = {name: _generation(name) for name in missing}
+        for name, value in _load_batch(tuple(missing), params).items():
+            memo[(name, params)] = (generations[name], value)
+    return [memo[(name, params)][1] for name in names]
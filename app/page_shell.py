@@ -0,0 +1,204 @@
+import os
+import sys
+import streamlit as st
+from streamlit_cookies_manager import EncryptedCookieManager
+
+# Shared page setup: cookies, session restore, one-time startup and the login/register forms.
+# Heavy modules (db/psycopg2, pandas, altair) are imported only on the code paths that need them:
+# a page showing just the login form loads db (and runs the one-time migrations) only when the
+# form is submitted, a logged-in page when its session is restored.
+
+
+def _start_rerun(page):
+    # Query metrics per rerun; a rerun cut short by st.rerun()/st.stop() is closed here
+    import metrics
+    metrics.start_exporter()
+    unfinished = st.session_state.pop("metrics_rerun", None)
+    if unfinished is not None:
+        metrics.end_rerun(unfinished)
+    st.session_state.metrics_rerun = metrics.start_rerun(page)
+
+    # Page data loaded through page_data.load() is memoized for this rerun only
+    import page_data
+    page_data.start_rerun()
+
+    # Opt-in section profiling (PROFILE_PAGES=1 or the admin toggle in the sidebar)
+    import profiling
+    unfinished_profile = st.session_state.pop("page_profile", None)
+    if unfinished_profile is not None:
+        profiling.end_profile(unfinished_profile)
+    if profiling.PROFILE_PAGES or st.session_state.get("profiling"):
+        st.session_state.page_profile = profiling.start_profile(page)
+
+
+def _page_name(depth=2):
+    # File name of the page script calling start_page()/start_static_page()
+    return os.path.splitext(os.path.basename(sys._getframe(depth).f_globals.get("__file__", "")))[0]
+
+
+def start_static_page(**page_config):
+    # Setup for pages without login or database (e.g. the recipes): rerun metrics and profiling only
+    if page_config:
+        st.set_page_config(**page_config)
+    _start_rerun(_page_name())
+    st.session_state.page_with_login = False
+
+
+def start_page(**page_config):
+    # page_config is passed to st.set_page_config (must be the first Streamlit call of the page)
+    if page_config:
+        st.set_page_config(**page_config)
+    _start_rerun(_page_name())
+    st.session_state.page_with_login = True
+    import profiling
+
+    with profiling.section("auth restore"):
+        # Initialize cookie manager
+        cookies = EncryptedCookieManager(
+            prefix="wt_",  # optional, to avoid conflicts
+            password="super-secret-password"  # use a strong secret in production!
+        )
+        if not cookies.ready():
+            st.stop()
+
+        # Session-Init
+        if "user_id" not in st.session_state:
+            st.session_state.user_id = None
+        if "username" not in st.session_state:
+            st.session_state.username = ""
+
+        # Restore session from cookies, once per session
+        if not st.session_state.get("session_restored"):
+            if st.session_state.user_id is None and cookies.get("user_id"):
+                st.session_state.user_id = int(cookies.get("user_id"))
+                st.session_state.username = cookies.get("username")
+            st.session_state.session_restored = True
+
+        if st.session_state.user_id is not None:
+            _ensure_migrated()
+
+    return cookies
+
+
+def _ensure_migrated():
+    # Schema-Migrationen und Testnutzer einmalig pro Prozess, vor dem ersten Datenbankzugriff
+    try:
+        from migrate import ensure_migrated
+        ensure_migrated()
+    except Exception as e:
+        st.warning(f"Fehler beim Migrieren der Datenbank: {e}")
+
+
+# Shown when the password hashing workers are saturated (db.AuthWorkerPool timed out)
+BUSY_HINT = "Zu viele Anmeldungen, bitte erneut versuchen."
+
+
+def render_login(cookies):
+    st.subheader("🔐 Login")
+
+    tab1, tab2 = st.tabs(["Login", "Registrieren"])
+
+    with tab1:
+        with st.form("login_form"):
+            username = st.text_input("Benutzername")
+            password = st.text_input("Passwort", type="password")
+            login_submitted = st.form_submit_button("Login")
+            if login_submitted:
+                _ensure_migrated()
+                from db import authenticate_user
+                try:
+                    user_id = authenticate_user(username, password)
+                except TimeoutError:
+                    st.error(BUSY_HINT)
+                else:
+                    if user_id:
+                        st.session_state.user_id = user_id
+                        st.session_state.username = username
+                        cookies["user_id"] = str(user_id)
+                        cookies["username"] = username
+                        st.success(f"Eingeloggt als {username}")
+                        st.rerun()
+                    else:
+                        st.error("Ungültige Zugangsdaten.")
+
+    with tab2:
+        with st.form("register_form"):
+            new_username = st.text_input("Neuer Benutzername")
+            new_password = st.text_input("Neues Passwort", type="password")
+            register_submitted = st.form_submit_button("Registrieren")
+            if register_submitted:
+                _ensure_migrated()
+                from db import register_user
+                try:
+                    registered = register_user(new_username, new_password)
+                except TimeoutError:
+                    st.error(BUSY_HINT)
+                else:
+                    if registered:
+                        st.success("Benutzer registriert. Bitte einloggen.")
+                    else:
+                        st.error("Benutzername existiert bereits.")
+
+
+def select_group():
+    # Active group of the logged-in user, chosen in the sidebar if there are several:
+    # (id, name, join code, start date, end date), None if the user is in no group
+    from db import get_user_groups
+    groups = get_user_groups(st.session_state.user_id)
+    if not groups:
+        return None
+    ids = [group[0] for group in groups]
+    index = ids.index(st.session_state.active_group) if st.session_state.get("active_group") in ids else 0
+    if len(groups) > 1:
+        names = {group[0]: group[1] for group in groups}
+        index = ids.index(st.sidebar.selectbox("👥 Gruppe", ids, index=index, format_func=names.get))
+    st.session_state.active_group = ids[index]
+    return groups[index]
+
+
+def group_window(group, min_date, max_date):
+    # Default chart window: the group's round, clamped to the dates that have data
+    start = min(max(min_date, group[3]), max_date)
+    end = max(min(max_date, group[4] or max_date), start)
+    return start, end
+
+
+NO_GROUP_HINT = "Du bist in keiner Gruppe. In den ⚙️ Einstellungen kannst du einer Gruppe beitreten oder eine gründen."
+
+
+def logout_button(cookies):
+    if st.button("Logout"):
+        st.session_state.user_id = None
+        st.session_state.username = ""
+        st.session_state.pop("active_group", None)
+        cookies["user_id"] = ""
+        cookies["username"] = ""
+        st.rerun()
+
+
+def _render_profile(breakdown, percentiles):
+    rows = ["| Abschnitt | ms | davon DB | p50 | p95 |", "|---|---:|---:|---:|---:|"]
+    for name, ms, db_ms in breakdown:
+        p50, p95, _ = percentiles.get(name, (ms, ms, 1))
+        rows.append(f"| {name} | {ms:.1f} | {db_ms:.1f} | {p50:.1f} | {p95:.1f} |")
+    p50, p95, samples = percentiles.get("total", (0.0, 0.0, 0))
+    with st.sidebar.expander("⏱️ Profil dieses Reruns", expanded=True):
+        st.markdown("\n".join(rows))
+        st.caption(f"Gesamt p50 {p50:.0f} ms / p95 {p95:.0f} ms über {samples} Reruns")
+
+
+def end_page():
+    # Last call of every page: profiling panel and the rerun's query metrics
+    profile = st.session_state.pop("page_profile", None)
+    if profile is not None:
+        import profiling
+        breakdown = profiling.end_profile(profile)
+        _render_profile(breakdown, profiling.section_percentiles(profile.page))
+    if st.session_state.get("page_with_login") and st.session_state.get("username"):
+        from db import is_admin
+        if is_admin(st.session_state.username):
+            st.sidebar.toggle("⏱️ Profiling", key="profiling", help="Zeiten der Seitenabschnitte messen")
+    rerun = st.session_state.pop("metrics_rerun", None)
+    if rerun is not None:
+        import metrics
+        metrics.end_rerun(rerun)
@@ -1,111 +1,48 @@
 import streamlit as st
-import pandas as pd
-from datetime import date
-from db import (
-    authenticate_user,
-    register_user,
-    insert_weight,
-    get_all_weights_for_all_users,
-    register_test_users,
-    init_challenge_table,
-    log_challenge_completion,
-    has_completed_challenge,
-    get_challenge_status_all_users,
-    delete_weight_entry,
-    get_weights_for_user,
-    change_password,
-    get_user_color, 
-    set_user_color, 
-    get_all_user_colors 
-)
-import random
-from streamlit_cookies_manager import EncryptedCookieManager
-import altair as alt
-import re
+from page_shell import start_page, render_login, logout_button, end_page, select_group, group_window, NO_GROUP_HINT
 
-st.set_page_config(
+cookies = start_page(
     page_title="Project42 - Tracker",  # This will be the sidebar/main page name
     page_icon="🏠",
     layout="centered",
     initial_sidebar_state="collapsed"
 )
 
-# Initialize cookie manager
-cookies = EncryptedCookieManager(
-    prefix="wt_",  # optional, to avoid conflicts
-    password="super-secret-password"  # use a strong secret in production!
-)
-if not cookies.ready():
-    st.stop()
-
-# Session-Init
-if "user_id" not in st.session_state:
-    st.session_state.user_id = None
-if "username" not in st.session_state:
-    st.session_state.username = ""
-
-# Restore session from cookies if available
-if st.session_state.user_id is None and cookies.get("user_id"):
-    st.session_state.user_id = int(cookies.get("user_id"))
-    st.session_state.username = cookies.get("username")
-
-# Testnutzer einmalig registrieren
-try:
-    register_test_users()
-except Exception as e:
-    st.warning(f"Fehler beim Anlegen von Testusern: {e}")
-
 st.title("📊 Gewichtsentwicklung")
-st.markdown("_Aller Teilnehmer im Vergleich_")
-st.divider()
 
 # Login/Registrierung
 if st.session_state.user_id is None:
-    st.subheader("🔐 Login")
-
-    tab1, tab2 = st.tabs(["Login", "Registrieren"])
-
-    with tab1:
-        with st.form("login_form"):
-            username = st.text_input("Benutzername")
-            password = st.text_input("Passwort", type="password")
-            login_submitted = st.form_submit_button("Login")
-            if login_submitted:
-                user_id = authenticate_user(username, password)
-                if user_id:
-                    st.session_state.user_id = user_id
-                    st.session_state.username = username
-                    cookies["user_id"] = str(user_id)
-                    cookies["username"] = username
-                    st.success(f"Eingeloggt als {username}")
-                    st.rerun()
-                else:
-                    st.error("Ungültige Zugangsdaten.")
-
-    with tab2:
-        with st.form("register_form"):
-            new_username = st.text_input("Neuer Benutzername")
-            new_password = st.text_input("Neues Passwort", type="password")
-            register_submitted = st.form_submit_button("Registrieren")
-            if register_submitted:
-                if register_user(new_username, new_password):
-                    st.success("Benutzer registriert. Bitte einloggen.")
-                else:
-                    st.error("Benutzername existiert bereits.")
-
+    st.divider()
+    render_login(cookies)
 else:
-    # Hole die bisherigen Einträge des Users
-    weight_entries = get_weights_for_user(st.session_state.user_id)
-
-    # Öffentlicher Verlauf
-    all_data = get_all_weights_for_all_users()
-    if all_data:
-        df_all = pd.DataFrame(all_data, columns=["User", "Date", "Weight"])
-        df_all["Date"] = pd.to_datetime(df_all["Date"]).dt.date
+    group = select_group()
+    if group is None:
+        st.divider()
+        st.info(NO_GROUP_HINT)
+        logout_button(cookies)
+        st.stop()
+    st.markdown(f"_Alle Teilnehmer von {group[1]} im Vergleich_")
+    st.divider()
 
+    # Heavy modules are only imported once the user is logged in
+    import pandas as pd
+    from db import get_daily_weights
+    from page_data import load
+    from charts import progress_chart
+    from profiling import section
+    from trends import get_trends, trend_frame, TREND_WINDOW_DAYS
+
+    with section("data fetch"):
+        # Zeitraum, Farben, Teilnehmer und Rankings der Gruppe in einem Datenbank-Roundtrip
+        (min_date, max_date), user_colors, all_users, abs_data, rel_data = load(
+            "weight_date_range", "user_colors", "usernames_with_entries",
+            "loss_ranking_abs", "loss_ranking_rel", ranking_limit=3, group_id=group[0]
+        )
+    with section("trends"):
+        # Geglättetes Gewicht, Wochentrend und Zielprognose (nur neu berechnet, wo neue Einträge sind)
+        trends = get_trends(group[0])
+    if min_date is not None:
         # --- Date Range Filter ---
-        min_date = df_all["Date"].min()
-        max_date = df_all["Date"].max()
 
         # Quick filter buttons
         col1, col2, col3= st.columns(3)
@@ -116,15 +53,16 @@ else:
         with col3:
             quick_week = st.button("Letzte 7 Tage")
 
-        # Default filter values
-        filter_start = min_date
-        filter_end = max_date
+        # Default filter values: the group's round
+        filter_start, filter_end = group_window(group, min_date, max_date)
 
         # Apply quick filters
-        if quick_month:
-            filter_start = max(min_date, max_date - pd.Timedelta(days=30))
+        if quick_all:
+            filter_start, filter_end = min_date, max_date
+        elif quick_month:
+            filter_start, filter_end = max(min_date, max_date - pd.Timedelta(days=30)), max_date
         elif quick_week:
-            filter_start = max(min_date, max_date - pd.Timedelta(days=6))
+            filter_start, filter_end = max(min_date, max_date - pd.Timedelta(days=6)), max_date
 
         with st.expander("📅 Manuelle Datumsauswahl"):    # Manual date selection (overrides quick filters if changed)
             col5, col6 = st.columns(2)
@@ -133,55 +71,22 @@ else:
             with col6:
                 filter_end = st.date_input("Bis", value=filter_end, min_value=min_date, max_value=max_date, key="filter_end")
 
-        # Get all user colors for the chart
-        user_colors = get_all_user_colors()
-        all_users = sorted(df_all["User"].unique())
         selected_users = st.multiselect("Teilnehmer auswählen", options=all_users, default=all_users)
+        show_trend = st.checkbox("📈 Trendlinie anzeigen", value=True)
      
-        # Gefilterte Daten
-        filtered_df = df_all[
-            (df_all["User"].isin(selected_users)) &
-            (df_all["Date"] >= filter_start) &
-            (df_all["Date"] <= filter_end)
-        ]
-
-        # Interpolation: create a complete date range
+        # Gefilterte Daten (Filter laufen in SQL, es kommt nur das sichtbare Fenster zurück)
+        with section("data fetch"):
+            daily_weights = get_daily_weights(filter_start, filter_end, selected_users, group[0])
+        with section("transform"):
+            filtered_df = pd.DataFrame(daily_weights, columns=["User", "Date", "Weight", "Real"])
+            filtered_df["Date"] = pd.to_datetime(filtered_df["Date"])
+
         if not filtered_df.empty:
-            all_dates = pd.date_range(filtered_df["Date"].min(), filtered_df["Date"].max())
-            pivot = filtered_df.pivot(index="Date", columns="User", values="Weight")
-            pivot = pivot.reindex(all_dates)  # fill missing dates
-            interpolated = pivot.interpolate(method="linear", limit_direction="both")
-
-            # --- Colors for users ---
-            user_list = list(pivot.columns)
-            def get_random_color():
-                return "#{:06x}".format(random.randint(0, 0xFFFFFF))
-            color_map = {user: user_colors.get(user) or get_random_color() for user in user_list}
-            domain = user_list
-            color_range = [color_map[user] for user in user_list]
-            # ------------------------
-
-            real_points = pivot.reset_index().melt(id_vars="index", var_name="User", value_name="Weight")
-            real_points = real_points.dropna()
-            real_points = real_points.rename(columns={"index": "Date"})
-            chart = (
-                alt.Chart(interpolated.reset_index().melt(id_vars="index", var_name="User", value_name="Weight"))
-                .mark_line()
-                .encode(
-                    x="index:T",
-                    y=alt.Y("Weight:Q", scale=alt.Scale(domain=[70, 130])),
-                    color=alt.Color("User:N", scale=alt.Scale(domain=domain, range=color_range))
-                )
-                +
-                alt.Chart(real_points)
-                .mark_point(filled=True, size=60)
-                .encode(
-                    x="Date:T",
-                    y=alt.Y("Weight:Q", scale=alt.Scale(domain=[70, 130])),
-                    color=alt.Color("User:N", scale=alt.Scale(domain=domain, range=color_range))
-                )
-            )
-            st.altair_chart(chart, use_container_width=True)
+            # Line and points are downsampled to a per-user budget for long ranges
+            trend_df = trend_frame(trends, selected_users, filter_start, filter_end) if show_trend else None
+            chart = progress_chart(filtered_df, user_colors, trend_df)
+            with section("render"):
+                st.altair_chart(chart, use_container_width=True)
         else:
             st.info("Keine Daten für die ausgewählten Teilnehmer.")
     else:
@@ -192,56 +97,71 @@ else:
     # 🏆 Gewichtverlust-Rankings
     st.subheader("🏆 Top 3 Gewichtverlust (absolut & relativ)")
 
-    all_data = get_all_weights_for_all_users()
-    if all_data:
-        df_all = pd.DataFrame(all_data, columns=["User", "Date", "Weight"])
-        df_all["Date"] = pd.to_datetime(df_all["Date"])
-        # Find start and latest weight for each user
-        start_weights = df_all.sort_values("Date").groupby("User").first().reset_index()
-        latest_weights = df_all.sort_values("Date").groupby("User").last().reset_index()
-        merged = pd.merge(
-            start_weights[["User", "Weight"]],
-            latest_weights[["User", "Weight"]],
-            on="User",
-            suffixes=("_start", "_latest")
-        )
-        merged["loss_abs"] = merged["Weight_start"] - merged["Weight_latest"]
-        merged["loss_rel"] = merged["loss_abs"] / merged["Weight_start"] * 100
-
-        # Round all weights and losses to 1 decimal
-        merged["Weight_start"] = merged["Weight_start"].round(1)
-        merged["Weight_latest"] = merged["Weight_latest"].round(1)
-        merged["loss_abs"] = merged["loss_abs"].round(1)
-        merged["loss_rel"] = merged["loss_rel"].round(1)
-
-        # Absolute Ranking
-        abs_rank = merged.sort_values("loss_abs", ascending=False).head(3)
-        abs_rank = abs_rank[["User", "Weight_start", "Weight_latest", "loss_abs"]].rename(
-            columns={"Weight_start": "Startgewicht", "Weight_latest": "Aktuell", "loss_abs": "Verlust (kg)"}
-        )
-        # Format to one decimal as string
-        abs_rank["Startgewicht"] = abs_rank["Startgewicht"].map("{:.1f}".format)
-        abs_rank["Aktuell"] = abs_rank["Aktuell"].map("{:.1f}".format)
-        abs_rank["Verlust (kg)"] = abs_rank["Verlust (kg)"].map("{:.1f}".format)
-        st.markdown("**Absolut (kg):**")
-        st.table(abs_rank.reset_index(drop=True))
-
-        # Relative Ranking
-        rel_rank = merged.sort_values("loss_rel", ascending=False).head(3)
-        rel_rank = rel_rank[["User", "Weight_start", "Weight_latest", "loss_rel"]].rename(
-            columns={"Weight_start": "Startgewicht", "Weight_latest": "Aktuell", "loss_rel": "Verlust (%)"}
-        )
-        rel_rank["Startgewicht"] = rel_rank["Startgewicht"].map("{:.1f}".format)
-        rel_rank["Aktuell"] = rel_rank["Aktuell"].map("{:.1f}".format)
-        rel_rank["Verlust (%)"] = rel_rank["Verlust (%)"].map("{:.1f}".format)
-        st.markdown("**Relativ (%):**")
-        st.table(rel_rank.reset_index(drop=True))
+    ranking_columns = ["User", "Weight_start", "Weight_latest", "loss_abs", "loss_rel", "entries"]
+    if abs_data:
+        with section("transform"):
+            # Start/latest weights come from the maintained weight_summary table
+            abs_rank = pd.DataFrame(abs_data, columns=ranking_columns).round(1)
+            rel_rank = pd.DataFrame(rel_data, columns=ranking_columns).round(1)
+
+            # Absolute Ranking
+            abs_rank = abs_rank[["User", "Weight_start", "Weight_latest", "loss_abs"]].rename(
+                columns={"Weight_start": "Startgewicht", "Weight_latest": "Aktuell", "loss_abs": "Verlust (kg)"}
+            )
+            # Format to one decimal as string
+            abs_rank["Startgewicht"] = abs_rank["Startgewicht"].map("{:.1f}".format)
+            abs_rank["Aktuell"] = abs_rank["Aktuell"].map("{:.1f}".format)
+            abs_rank["Verlust (kg)"] = abs_rank["Verlust (kg)"].map("{:.1f}".format)
+
+            # Relative Ranking
+            rel_rank = rel_rank[["User", "Weight_start", "Weight_latest", "loss_rel"]].rename(
+                columns={"Weight_start": "Startgewicht", "Weight_latest": "Aktuell", "loss_rel": "Verlust (%)"}
+            )
+            rel_rank["Startgewicht"] = rel_rank["Startgewicht"].map("{:.1f}".format)
+            rel_rank["Aktuell"] = rel_rank["Aktuell"].map("{:.1f}".format)
+            rel_rank["Verlust (%)"] = rel_rank["Verlust (%)"].map("{:.1f}".format)
+
+            # Current weekly trend from trends.py
+            def weekly_rate(user):
+                trend = trends.get(user)
+                return f"{trend.weekly_rate:+.2f}" if trend and trend.weekly_rate is not None else "–"
+            abs_rank["Trend (kg/Woche)"] = abs_rank["User"].map(weekly_rate)
+            rel_rank["Trend (kg/Woche)"] = rel_rank["User"].map(weekly_rate)
+
+        with section("render"):
+            st.markdown("**Absolut (kg):**")
+            st.table(abs_rank.reset_index(drop=True))
+            st.markdown("**Relativ (%):**")
+            st.table(rel_rank.reset_index(drop=True))
     else:
         st.info("Noch keine Einträge für Rankings vorhanden.")
 
-    if st.button("Logout"):
-       st.session_state.user_id = None
-       st.session_state.username = ""
-       cookies["user_id"] = ""
-       cookies["username"] = ""
-       st.rerun()
+    # 🎯 Trend & Zielprognose
+    st.subheader("🎯 Trend & Zielprognose")
+    if trends:
+        with section("transform"):
+            def goal_status(trend):
+                if trend.goal_weight is None:
+                    return "kein Ziel"
+                if trend.goal_date is None:
+                    return "nicht in Sicht"
+                return "erreicht 🎉" if trend.goal_date <= trend.latest_date else f"{trend.goal_date:%d.%m.%Y}"
+
+            forecast = pd.DataFrame(
+                [(t.username, f"{t.smoothed:.1f}",
+                  f"{t.weekly_rate:+.2f}" if t.weekly_rate is not None else "–",
+                  f"{t.goal_weight:.1f}" if t.goal_weight is not None else "–",
+                  goal_status(t), t.weekly_rate if t.weekly_rate is not None else float("inf"))
+                 for t in trends.values()],
+                columns=["User", "Trend (kg)", "kg/Woche", "Ziel (kg)", "Ziel erreicht am", "rate"]
+            ).sort_values(["rate", "User"]).drop(columns="rate")
+        with section("render"):
+            st.table(forecast.reset_index(drop=True))
+            st.caption(f"Trend: gleitender Durchschnitt · kg/Woche: Steigung der letzten {TREND_WINDOW_DAYS} Tage · "
+                       "Ziel setzen in den ⚙️ Einstellungen")
+    else:
+        st.info("Noch keine Einträge für Trends vorhanden.")
+
+    logout_button(cookies)
+
+end_page()
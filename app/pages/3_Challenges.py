@@ -1,91 +1,25 @@
 import streamlit as st
-import pandas as pd
-from datetime import date
-from db import (
-    authenticate_user,
-    register_user,
-    insert_weight,
-    get_all_weights_for_all_users,
-    register_test_users,
-    init_challenge_table,
-    log_challenge_completion,
-    has_completed_challenge,
-    get_challenge_status_all_users,
-    delete_weight_entry,
-    get_weights_for_user,
-    change_password,
-    get_user_color, 
-    set_user_color, 
-    get_all_user_colors 
-)
-import random
-from streamlit_cookies_manager import EncryptedCookieManager
-import altair as alt
-import re
+from page_shell import start_page, render_login, logout_button, end_page, select_group
 
-# Initialize cookie manager
-cookies = EncryptedCookieManager(
-    prefix="wt_",  # optional, to avoid conflicts
-    password="super-secret-password"  # use a strong secret in production!
-)
-if not cookies.ready():
-    st.stop()
-
-# Session-Init
-if "user_id" not in st.session_state:
-    st.session_state.user_id = None
-if "username" not in st.session_state:
-    st.session_state.username = ""
-
-# Restore session from cookies if available
-if st.session_state.user_id is None and cookies.get("user_id"):
-    st.session_state.user_id = int(cookies.get("user_id"))
-    st.session_state.username = cookies.get("username")
-
-# Testnutzer einmalig registrieren
-try:
-    register_test_users()
-except Exception as e:
-    st.warning(f"Fehler beim Anlegen von Testusern: {e}")
+cookies = start_page()
 
 st.title("🤖 Marvin’s Tages-Challenge")
 
 # Login/Registrierung
 if st.session_state.user_id is None:
-    st.subheader("🔐 Login")
-
-    tab1, tab2 = st.tabs(["Login", "Registrieren"])
-
-    with tab1:
-        with st.form("login_form"):
-            username = st.text_input("Benutzername")
-            password = st.text_input("Passwort", type="password")
-            login_submitted = st.form_submit_button("Login")
-            if login_submitted:
-                user_id = authenticate_user(username, password)
-                if user_id:
-                    st.session_state.user_id = user_id
-                    st.session_state.username = username
-                    cookies["user_id"] = str(user_id)
-                    cookies["username"] = username
-                    st.success(f"Eingeloggt als {username}")
-                    st.rerun()
-                else:
-                    st.error("Ungültige Zugangsdaten.")
-
-    with tab2:
-        with st.form("register_form"):
-            new_username = st.text_input("Neuer Benutzername")
-            new_password = st.text_input("Neues Passwort", type="password")
-            register_submitted = st.form_submit_button("Registrieren")
-            if register_submitted:
-                if register_user(new_username, new_password):
-                    st.success("Benutzer registriert. Bitte einloggen.")
-                else:
-                    st.error("Benutzername existiert bereits.")
+    render_login(cookies)
 else:
-    init_challenge_table()
+    # Heavy modules are only imported once the user is logged in
+    import random
+    import pandas as pd
+    from datetime import date, timedelta
+    from charts import challenge_heatmap
+    from db import log_challenge_completion, CHALLENGE_RATE_WINDOWS, CHALLENGE_CALENDAR_DAYS
+    from page_data import load
+    from profiling import section
+
     today = date.today()
+    group = select_group()
     # 🧠 Marvin der Fitness-Coach
     def get_marvin_challenge():
         challenges = [
@@ -124,8 +58,21 @@ else:
         return random.choice(challenges)
 
     st.divider()
+    with section("data fetch"):
+        # Eigener Status, Übersicht und Historie (der Gruppe) in einem Datenbank-Roundtrip
+        history = ("challenge_streaks", "challenge_rates", "challenge_calendar")
+        params = dict(user_id=st.session_state.user_id, today=today,
+                      rate_windows=CHALLENGE_RATE_WINDOWS,
+                      start_date=today - timedelta(days=CHALLENGE_CALENDAR_DAYS - 1), end_date=today)
+        if group is not None:
+            completed_today, status_list, streaks, rates, calendar = load(
+                "challenge_completed", "challenge_status", *history, group_id=group[0], **params
+            )
+        else:
+            completed_today, streaks, rates, calendar = load("challenge_completed", *history, **params)
+            status_list = [(st.session_state.username, completed_today)]
     with st.container():
-        if has_completed_challenge(st.session_state.user_id, today):
+        if completed_today:
             st.success("Challenge bereits erledigt! Marvin ist... na ja... weniger unzufrieden.")
         else:
             st.markdown(f"*{get_marvin_challenge()}*")
@@ -135,15 +82,39 @@ else:
                 st.rerun()
 
     # Challenge Übersicht
-    st.subheader("👀 Challenge-Erfüllung heute")
-    status_list = get_challenge_status_all_users(today)
-    status_df = pd.DataFrame(status_list, columns=["User", "Erledigt"])
-    status_df["Erledigt"] = status_df["Erledigt"].map({True: "✅", False: "❌"})
-    st.table(status_df)
+    st.subheader(f"👀 Challenge-Erfüllung heute – {group[1]}" if group else "👀 Challenge-Erfüllung heute")
+    with section("transform"):
+        status_df = pd.DataFrame(status_list, columns=["User", "Erledigt"])
+        status_df["Erledigt"] = status_df["Erledigt"].map({True: "✅", False: "❌"})
+    with section("render"):
+        st.table(status_df)
+
+    # Challenge-Historie: Serien, Quoten und Kalender
+    st.subheader("🔥 Serien & Quoten")
+    with section("transform"):
+        history_df = pd.DataFrame(
+            [(user, current, longest) for user, current, longest, _ in streaks],
+            columns=["User", "Aktuelle Serie", "Längste Serie"]
+        )
+        rate_columns = [f"{days} Tage" for days in CHALLENGE_RATE_WINDOWS]
+        rates_df = pd.DataFrame([(user, *user_rates) for user, user_rates in rates], columns=["User", *rate_columns])
+        history_df = history_df.merge(rates_df, on="User", how="left")
+        history_df[rate_columns] = (history_df[rate_columns] * 100).round().astype(int).astype(str) + " %"
+    with section("render"):
+        st.dataframe(history_df, hide_index=True)
+
+    st.subheader("📅 Kalender")
+    scope = st.radio("Anzeigen für", ["Mich", group[1]], horizontal=True) if group else "Mich"
+    with section("transform"):
+        calendar_df = pd.DataFrame(calendar, columns=["Date", "Mine", "Done"])
+        calendar_df["Date"] = pd.to_datetime(calendar_df["Date"])
+        if scope == "Mich":
+            calendar_df["Share"] = calendar_df["Mine"].astype(float)
+        else:
+            calendar_df["Share"] = calendar_df["Done"] / max(len(streaks), 1)
+    with section("render"):
+        st.altair_chart(challenge_heatmap(calendar_df), use_container_width=True)
+
+    logout_button(cookies)
 
-    if st.button("Logout"):
-        st.session_state.user_id = None
-        st.session_state.username = ""
-        cookies["user_id"] = ""
-        cookies["username"] = ""
-        st.rerun()
+end_page()
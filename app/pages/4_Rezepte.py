@@ -1,45 +1,42 @@
 import streamlit as st
-import os
-import glob
-import frontmatter
-import markdown
+from page_shell import start_static_page, end_page
+from profiling import section
+from recipe_index import get_recipe_index
+from recipe_render import render_recipe_html
+from recipe_search import get_recipe_search
 
-st.set_page_config(
+start_static_page(
     page_title="Rezepte",
     page_icon="🍲",  # <-- Icon for sidebar and browser tab
 )
 
-RECIPE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "recipes"))
-
-def load_recipes():
-    files = glob.glob(os.path.join(RECIPE_DIR, "*.md"))
-    recipes = []
-    for path in files:
-        post = frontmatter.load(path)
-        recipes.append({
-            "title": post.get("title", os.path.basename(path)),
-            "tags": post.get("tags", []),
-            "content": post.content,
-            "filename": os.path.basename(path)
-        })
-    return recipes
-
 st.title("🍲 Rezeptdatenbank")
 st.divider()
-recipes = load_recipes()
-all_tags = sorted({tag for recipe in recipes for tag in recipe["tags"]})
+with section("recipe index refresh"):
+    # Process-wide index; only new or modified files are parsed again
+    recipe_index = get_recipe_index()
+    recipe_index.refresh()
+    all_tags = recipe_index.tags()
 
+search_query = st.text_input("🔎 Suche", placeholder="Titel, Tags oder Zutaten, z. B. tomat")
 selected_tags = st.multiselect("Nach Tags filtern", options=all_tags)
 
-filtered = [
-    r for r in recipes
-    if all(tag in r["tags"] for tag in selected_tags)
-]
-
-for recipe in filtered:
-    with st.expander(recipe["title"]):
-        st.markdown(f"**Tags:** {', '.join(recipe['tags'])}")
-        st.markdown(recipe["content"])
+with section("search"):
+    filtered = recipe_index.filter_by_tags(selected_tags)
+    if search_query.strip():
+        # Ranked full-text search, restricted to the tag filter
+        by_filename = {r["filename"]: r for r in filtered}
+        ranked = get_recipe_search(recipe_index).search(search_query)
+        filtered = [by_filename[name] for name in ranked if name in by_filename]
+
+with section("render"):
+    for recipe in filtered:
+        with st.expander(recipe["title"]):
+            st.markdown(f"**Tags:** {', '.join(recipe['tags'])}")
+            # Pre-rendered, sanitized HTML from the recipe HTML cache
+            st.html(render_recipe_html(recipe["content"]))
 
 if not filtered:
-    st.info("Keine Rezepte gefunden.")
\ No newline at end of file
+    st.info("Keine Rezepte gefunden.")
+
+end_page()
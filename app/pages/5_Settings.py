@@ -1,99 +1,42 @@
 import streamlit as st
-import pandas as pd
-from datetime import date
-from db import (
-    authenticate_user,
-    register_user,
-    insert_weight,
-    get_all_weights_for_all_users,
-    register_test_users,
-    init_challenge_table,
-    log_challenge_completion,
-    has_completed_challenge,
-    get_challenge_status_all_users,
-    delete_weight_entry,
-    get_weights_for_user,
-    change_password,
-    get_user_color, 
-    set_user_color, 
-    get_all_user_colors 
-)
-import random
-from streamlit_cookies_manager import EncryptedCookieManager
-import altair as alt
-import re
+from page_shell import BUSY_HINT, start_page, render_login, logout_button, end_page
 
-st.set_page_config(
+cookies = start_page(
     page_title="Project42 - Tracker",  # This will be the sidebar/main page name
     page_icon="🏠",
     layout="centered",
     initial_sidebar_state="collapsed"
 )
 
-# Initialize cookie manager
-cookies = EncryptedCookieManager(
-    prefix="wt_",  # optional, to avoid conflicts
-    password="super-secret-password"  # use a strong secret in production!
-)
-if not cookies.ready():
-    st.stop()
-
-# Session-Init
-if "user_id" not in st.session_state:
-    st.session_state.user_id = None
-if "username" not in st.session_state:
-    st.session_state.username = ""
-
-# Restore session from cookies if available
-if st.session_state.user_id is None and cookies.get("user_id"):
-    st.session_state.user_id = int(cookies.get("user_id"))
-    st.session_state.username = cookies.get("username")
-
-# Testnutzer einmalig registrieren
-try:
-    register_test_users()
-except Exception as e:
-    st.warning(f"Fehler beim Anlegen von Testusern: {e}")
-
 st.title("⚙️ User Settings")
 
 st.divider()
 
 # Login/Registrierung
 if st.session_state.user_id is None:
-    st.subheader("🔐 Login")
-
-    tab1, tab2 = st.tabs(["Login", "Registrieren"])
-
-    with tab1:
-        with st.form("login_form"):
-            username = st.text_input("Benutzername")
-            password = st.text_input("Passwort", type="password")
-            login_submitted = st.form_submit_button("Login")
-            if login_submitted:
-                user_id = authenticate_user(username, password)
-                if user_id:
-                    st.session_state.user_id = user_id
-                    st.session_state.username = username
-                    cookies["user_id"] = str(user_id)
-                    cookies["username"] = username
-                    st.success(f"Eingeloggt als {username}")
-                    st.rerun()
-                else:
-                    st.error("Ungültige Zugangsdaten.")
-
-    with tab2:
-        with st.form("register_form"):
-            new_username = st.text_input("Neuer Benutzername")
-            new_password = st.text_input("Neues Passwort", type="password")
-            register_submitted = st.form_submit_button("Registrieren")
-            if register_submitted:
-                if register_user(new_username, new_password):
-                    st.success("Benutzer registriert. Bitte einloggen.")
-                else:
-                    st.error("Benutzername existiert bereits.")
-
+    render_login(cookies)
 else:
+    # Heavy modules are only imported once the user is logged in
+    import re
+    import pandas as pd
+    from db import (
+        authenticate_user,
+        delete_weight_entry,
+        get_weights_for_user,
+        change_password,
+        get_user_color,
+        set_user_color,
+        get_goal_weight,
+        set_goal_weight,
+        import_weights_csv,
+        is_admin,
+        get_user_groups,
+        create_group,
+        join_group,
+        leave_group
+    )
+    from profiling import section
+
     # --- User Color Picker (Collapsible) ---
     st.subheader("🎨 Benutzerdefinierte Farbe für den Verlauf")
     with st.expander("🎨 Farbe auswählen"):
@@ -108,6 +51,68 @@ else:
             else:
                 st.error("Bitte gib einen gültigen Hex-Code ein (z.B. #1a2b3c).")
     
+    # 🎯 Zielgewicht
+    st.subheader("🎯 Zielgewicht")
+    with st.expander("🎯 Ziel festlegen"):
+        current_goal = get_goal_weight(st.session_state.user_id)
+        goal_input = st.number_input("Zielgewicht (kg)", min_value=20.0, max_value=300.0, step=0.1,
+                                     format="%.1f", value=current_goal)
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Ziel speichern"):
+                if goal_input is None:
+                    st.error("Bitte gib ein Zielgewicht ein.")
+                else:
+                    set_goal_weight(st.session_state.user_id, round(goal_input, 1))
+                    st.success("Ziel gespeichert! Die Prognose findest du in der Statistik.")
+        with col2:
+            if current_goal is not None and st.button("Ziel entfernen"):
+                set_goal_weight(st.session_state.user_id, None)
+                st.rerun()
+
+    # 👥 Gruppen
+    st.subheader("👥 Gruppen")
+    with st.expander("👥 Meine Gruppen"):
+        my_groups = get_user_groups(st.session_state.user_id)
+        for group_id, name, join_code, start, end in my_groups:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                period = f"{start:%d.%m.%Y} – {end:%d.%m.%Y}" if end else f"seit {start:%d.%m.%Y}"
+                st.markdown(f"**{name}** ({period}) · Beitrittscode `{join_code}`")
+            with col2:
+                if st.button("Verlassen", key=f"leave_group_{group_id}"):
+                    leave_group(group_id, st.session_state.user_id)
+                    st.rerun()
+        if not my_groups:
+            st.info("Du bist noch in keiner Gruppe.")
+
+        with st.form("join_group_form"):
+            code = st.text_input("Beitrittscode")
+            if st.form_submit_button("Beitreten"):
+                if join_group(st.session_state.user_id, code):
+                    st.success("Willkommen in der Gruppe!")
+                    st.rerun()
+                else:
+                    st.error("Unbekannter Beitrittscode.")
+
+        with st.form("create_group_form"):
+            group_name = st.text_input("Name der neuen Gruppe")
+            col1, col2 = st.columns(2)
+            with col1:
+                group_start = st.date_input("Start der Runde")
+            with col2:
+                group_end = st.date_input("Ende der Runde (optional)", value=None)
+            if st.form_submit_button("Gruppe gründen"):
+                if not group_name.strip():
+                    st.error("Bitte gib einen Namen ein.")
+                elif group_end is not None and group_end < group_start:
+                    st.error("Das Ende muss nach dem Start liegen.")
+                elif create_group(group_name.strip(), st.session_state.user_id, group_start, group_end):
+                    st.success("Gruppe gegründet! Teile den Beitrittscode mit deinen Freunden.")
+                    st.rerun()
+                else:
+                    st.error("Eine Gruppe mit diesem Namen gibt es schon.")
+
     # Passwort ändern
     st.subheader("🔑 Account Einstellungen")
     with st.expander("🔑 Passwort ändern"):
@@ -117,66 +122,111 @@ else:
             new_pw2 = st.text_input("Neues Passwort wiederholen", type="password")
             pw_submit = st.form_submit_button("Passwort ändern")
             if pw_submit:
-                if not authenticate_user(st.session_state.username, old_pw):
-                    st.error("Altes Passwort ist falsch.")
-                elif new_pw != new_pw2:
-                    st.error("Die neuen Passwörter stimmen nicht überein.")
-                elif len(new_pw) < 6:
-                    st.error("Das neue Passwort muss mindestens 6 Zeichen lang sein.")
-                else:
-                    if change_password(st.session_state.user_id, new_pw):
-                        st.success("Passwort erfolgreich geändert.")
+                try:
+                    if not authenticate_user(st.session_state.username, old_pw):
+                        st.error("Altes Passwort ist falsch.")
+                    elif new_pw != new_pw2:
+                        st.error("Die neuen Passwörter stimmen nicht überein.")
+                    elif len(new_pw) < 6:
+                        st.error("Das neue Passwort muss mindestens 6 Zeichen lang sein.")
                     else:
-                        st.error("Fehler beim Ändern des Passworts.")
+                        if change_password(st.session_state.user_id, new_pw):
+                            st.success("Passwort erfolgreich geändert.")
+                        else:
+                            st.error("Fehler beim Ändern des Passworts.")
+                except TimeoutError:
+                    st.error(BUSY_HINT)
+
+    # 📥 Gewichtsverlauf importieren
+    st.subheader("📥 Import")
+    with st.expander("📥 Gewichtseinträge aus CSV importieren"):
+        st.caption(
+            "Spalten: `date` (YYYY-MM-DD oder TT.MM.JJJJ), `weight`, optional `note`. "
+            "Bestehende Einträge am selben Tag werden überschrieben."
+        )
+        upload = st.file_uploader("CSV-Datei", type=["csv", "txt"])
+        if upload is not None and st.button("Importieren"):
+            try:
+                result = import_weights_csv(upload, user_id=st.session_state.user_id)
+            except Exception as e:
+                st.error(f"Import fehlgeschlagen: {e}")
+            else:
+                st.success(f"{result['inserted']} neu, {result['updated']} aktualisiert.")
+                if result["rejected"]:
+                    lines = ", ".join(str(n) for n in result["rejected_lines"])
+                    st.warning(f"{result['rejected']} Zeilen übersprungen (Zeile {lines}).")
+
+    # 📤 Export
+    with st.expander("📤 Daten exportieren"):
+        from export import EXPORT_FORMATS, EXPORT_MAX_BYTES, export_bytes, export_filename
+
+        export_format = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, format_func=str.upper)
+        export_targets = [("Meine Gewichtseinträge", "weight_entries", st.session_state.user_id),
+                          ("Meine Challenges", "challenge_log", st.session_state.user_id)]
+        if is_admin(st.session_state.username):
+            export_targets += [("Alle Gewichtseinträge", "weight_entries", None),
+                               ("Alle Challenges", "challenge_log", None)]
+        for label, table, export_user in export_targets:
+            # Deferred: the export only runs when the button is clicked
+            st.download_button(
+                f"⬇️ {label}",
+                data=lambda table=table, export_user=export_user: export_bytes(table, export_format, export_user),
+                file_name=export_filename(table, export_format, st.session_state.username if export_user else None),
+                mime=EXPORT_FORMATS[export_format],
+                on_click="ignore",
+                key=f"export_{table}_{'me' if export_user else 'all'}"
+            )
+        st.caption(
+            f"Downloads bis {EXPORT_MAX_BYTES // (1024 * 1024)} MB. Größere Exporte über die Kommandozeile "
+            "(`export_data.py`, siehe README)."
+        )
 
     # 🗑️ Eigene Gewichtseinträge löschen
     st.subheader("🗑️ Einträge löschen")
 
     # When displaying user's own entries
     with st.expander("🗑️ Wähle Datensätze"):
-        my_entries = get_weights_for_user(st.session_state.user_id)
+        with section("data fetch"):
+            my_entries = get_weights_for_user(st.session_state.user_id)
         df = pd.DataFrame(my_entries, columns=["ID", "Datum", "Gewicht", "Notiz", "Erstellt am"])
 
         if my_entries:
-            # Show timestamp and note in the table
-            df["Erstellt am"] = pd.to_datetime(df["Erstellt am"])
-            df["Label"] = (
-                df["Erstellt am"].dt.strftime("%Y-%m-%d %H:%M") +  # Show timestamp
-                " – " + df["Gewicht"].astype(str) + " kg" +
-                df["Notiz"].fillna("").apply(lambda n: f" ({n})" if n else "")
-            )
-
-            entry_to_delete = st.selectbox(
-                "Eintrag auswählen",
-                options=df["ID"],
-                format_func=lambda x: df[df["ID"] == x]["Label"].values[0]
-            )
-
-            # Display all entries with timestamp and note (user's own entries)
-            st.dataframe(
-                df[["Datum", "Gewicht", "Notiz", "Erstellt am"]]
-                .sort_values("Erstellt am", ascending=False)
-                .rename(columns={"Datum": "Datum Gewicht","Gewicht": "Gewicht (kg)", "Notiz": "Notiz","Erstellt am": "Eingetragen am"})
-                .assign(**{"Gewicht (kg)": lambda x: x["Gewicht (kg)"].round(1)}),  # round to 1 decimal
-                hide_index=True,
-                use_container_width=True
-            )
+            with section("transform"):
+                # Show timestamp and note in the table
+                df["Erstellt am"] = pd.to_datetime(df["Erstellt am"])
+                df["Label"] = (
+                    df["Erstellt am"].dt.strftime("%Y-%m-%d %H:%M") +  # Show timestamp
+                    " – " + df["Gewicht"].astype(str) + " kg" +
+                    df["Notiz"].fillna("").apply(lambda n: f" ({n})" if n else "")
+                )
+
+            with section("render"):
+                entry_to_delete = st.selectbox(
+                    "Eintrag auswählen",
+                    options=df["ID"],
+                    format_func=lambda x: df[df["ID"] == x]["Label"].values[0]
+                )
+
+                # Display all entries with timestamp and note (user's own entries)
+                st.dataframe(
+                    df[["Datum", "Gewicht", "Notiz", "Erstellt am"]]
+                    .sort_values("Erstellt am", ascending=False)
+                    .rename(columns={"Datum": "Datum Gewicht","Gewicht": "Gewicht (kg)", "Notiz": "Notiz","Erstellt am": "Eingetragen am"})
+                    .assign(**{"Gewicht (kg)": lambda x: x["Gewicht (kg)"].round(1)}),  # round to 1 decimal
+                    hide_index=True,
+                    use_container_width=True
+                )
 
             if st.button("Eintrag löschen"):
-                delete_weight_entry(entry_to_delete, st.session_state.user_id)
-                st.success("Eintrag gelöscht!")
-                st.rerun()
+                if delete_weight_entry(entry_to_delete, st.session_state.user_id):
+                    st.success("Eintrag gelöscht!")
+                    st.rerun()
+                else:
+                    st.error("Einträge aus archivierten Jahren können nicht gelöscht werden.")
         else:
             st.info("Du hast noch keine Einträge.")
     
     
-    if st.button("Logout"):
-        st.session_state.user_id = None
-        st.session_state.username = ""
-        cookies["user_id"] = ""
-        cookies["username"] = ""
-        st.rerun()
-    # Challenge Tracking vorbereiten
-    init_challenge_table()
-    today = date.today()
+    logout_button(cookies)
 
+end_page()
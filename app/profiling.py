@@ -0,0 +1,105 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Opt-in per-rerun profiling of page sections (auth, data fetch, transform, chart, render).
+# Enabled for everyone with PROFILE_PAGES=1 or per session by an admin (sidebar toggle).
+# Each profiled rerun is logged as one JSON line to the "profiling" logger and kept in a
+# bounded in-process sample window for p50/p95 per page and section.
+PROFILE_PAGES = os.getenv("PROFILE_PAGES", "0") == "1"
+PROFILE_SAMPLES = int(os.getenv("PROFILE_SAMPLES", "500"))  # samples kept per page and section
+
+profile_log = logging.getLogger("profiling")
+
+_current_profile = contextvars.ContextVar("page_profile", default=None)
+_samples = {}  # (page, section) -> deque of milliseconds
+_samples_lock = threading.Lock()
+
+
+def _db_seconds():
+    # Query time of the current rerun so far (see metrics.py)
+    import metrics
+    rerun = metrics.current_rerun()
+    return rerun.query_seconds if rerun is not None else 0.0
+
+
+class PageProfile:
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.sections = {}  # name -> [seconds, db seconds], in first-use order
+        self.total = None
+
+    def add(self, name, seconds, db_seconds):
+        totals = self.sections.setdefault(name, [0.0, 0.0])
+        totals[0] += seconds
+        totals[1] += db_seconds
+
+    def breakdown(self):
+        # [(section, ms, db ms)], with the untimed rest of the rerun as "other"
+        rows = [(name, seconds * 1000, db * 1000) for name, (seconds, db) in self.sections.items()]
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        other = total * 1000 - sum(ms for _, ms, _ in rows)
+        if other > 0:
+            rows.append(("other", other, 0.0))
+        return rows
+
+
+@contextmanager
+def section(name):
+    # Times a block of the page; a no-op unless this rerun is being profiled. Sections with
+    # the same name add up, nested sections are counted in both.
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    db_before = _db_seconds()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start, _db_seconds() - db_before)
+
+
+def start_profile(page):
+    profile = PageProfile(page)
+    _current_profile.set(profile)
+    return profile
+
+
+def end_profile(profile):
+    # Finish a profiled rerun: log it and add it to the sample window
+    if _current_profile.get() is profile:
+        _current_profile.set(None)
+    profile.total = time.perf_counter() - profile.started
+    breakdown = profile.breakdown()
+    profile_log.info(json.dumps({
+        "event": "page_profile",
+        "page": profile.page,
+        "total_ms": round(profile.total * 1000, 2),
+        "sections": {name: {"ms": round(ms, 2), "db_ms": round(db_ms, 2)} for name, ms, db_ms in breakdown},
+    }))
+    with _samples_lock:
+        for name, ms, _ in breakdown + [("total", profile.total * 1000, 0.0)]:
+            window = _samples.get((profile.page, name))
+            if window is None:
+                window = _samples[(profile.page, name)] = deque(maxlen=PROFILE_SAMPLES)
+            window.append(ms)
+    return breakdown
+
+
+def _percentile(values, q):
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def section_percentiles(page):
+    # {section: (p50 ms, p95 ms, samples)} over the recent profiled reruns of a page
+    with _samples_lock:
+        windows = {name: sorted(window) for (p, name), window in _samples.items() if p == page}
+    return {name: (_percentile(v, 0.5), _percentile(v, 0.95), len(v)) for name, v in windows.items()}
@@ -0,0 +1,128 @@
+from collections import namedtuple
+
+# Read queries shared by db.py (one function per query) and page_data.py (several queries in
+# one round trip as json), so both run the same SQL. Parameters are named: group_id (NULL =
+# all users), user_id, today, ranking_limit, usernames (NULL = all), rate_windows (int array),
+# start_date, end_date. Each query is read as the
+# subquery r; order is the row order over r's output columns, single marks one-row queries.
+# No imports beyond the standard library: page_data.py must stay cheap to import.
+
+Query = namedtuple("Query", "sql order single", defaults=(None, False))
+
+
+def members(user_column):
+    # Restricts user_column to the members of %(group_id)s; without a group (NULL) it folds to TRUE.
+    # An array rather than IN (subquery): the planner cannot turn IN under OR into a join, but
+    # = ANY of the array (computed once) still uses the user_id indexes.
+    return (f"(%(group_id)s::int IS NULL OR {user_column} = ANY(ARRAY("
+            f"SELECT gm.user_id FROM group_members gm WHERE gm.group_id = %(group_id)s)))")
+
+
+def user_and_members(user_column):
+    # Restricts user_column to %(user_id)s and the members of %(group_id)s: only the user without
+    # a group, every user without either (same array form as members())
+    return (f"(%(user_id)s::int IS NULL AND %(group_id)s::int IS NULL OR {user_column} = ANY(ARRAY("
+            f"SELECT %(user_id)s::int UNION SELECT gm.user_id FROM group_members gm WHERE gm.group_id = %(group_id)s)))")
+
+
+def _loss_ranking(column):
+    return Query(
+        f"""SELECT u.username, s.first_weight, s.latest_weight, s.loss_abs, s.loss_rel, s.entry_count
+            FROM weight_summary s JOIN users u ON s.user_id = u.id
+            WHERE {members('s.user_id')}
+            ORDER BY s.{column} DESC, u.username LIMIT %(ranking_limit)s""",
+        f"{column} DESC, username"
+    )
+
+
+QUERIES = {
+    # (first date, last date) incl. archived years
+    "weight_date_range": Query(
+        f"""SELECT MIN(w.date) AS first_date, MAX(w.date) AS last_date
+            FROM weight_entries_history w
+            WHERE {members('w.user_id')}
+              AND (%(usernames)s::text[] IS NULL
+                   OR w.user_id IN (SELECT u.id FROM users u WHERE u.username = ANY(%(usernames)s::text[])))""",
+        single=True
+    ),
+    "usernames_with_entries": Query(
+        f"""SELECT u.username FROM users u
+            WHERE EXISTS (SELECT 1 FROM weight_entries_history w WHERE w.user_id = u.id) AND {members('u.id')}""",
+        "username"
+    ),
+    "user_colors": Query(f"SELECT u.username, u.color FROM users u WHERE {members('u.id')}"),
+    # Top users by loss since their first entry, from the maintained weight_summary table
+    "loss_ranking_abs": _loss_ranking("loss_abs"),
+    "loss_ranking_rel": _loss_ranking("loss_rel"),
+    "challenge_completed": Query(
+        """SELECT COALESCE((SELECT c.completed FROM challenge_log c
+                            WHERE c.user_id = %(user_id)s AND c.date = %(today)s), FALSE) AS completed""",
+        single=True
+    ),
+    "challenge_status": Query(
+        f"""SELECT u.username, COALESCE(c.completed, FALSE) AS completed
+            FROM users u LEFT JOIN challenge_log c ON u.id = c.user_id AND c.date = %(today)s
+            WHERE {members('u.id')}""",
+        "username"
+    ),
+    # Current and longest streak of completed days per user, computed as gaps and islands: consecutive
+    # days share date - row_number. A current streak ends today or, if today is still open, yesterday.
+    "challenge_streaks": Query(
+        f"""WITH islands AS (
+                SELECT c.user_id, c.date, c.date - (ROW_NUMBER() OVER (PARTITION BY c.user_id ORDER BY c.date))::int AS island
+                FROM challenge_log_history c
+                WHERE c.completed AND c.date <= %(today)s AND {user_and_members('c.user_id')}
+            ), streaks AS (
+                SELECT user_id, COUNT(*) AS length, MAX(date) AS last_day FROM islands GROUP BY user_id, island
+            )
+            SELECT u.username,
+                   COALESCE(MAX(s.length) FILTER (WHERE s.last_day >= %(today)s::date - 1), 0) AS current_streak,
+                   COALESCE(MAX(s.length), 0) AS longest_streak,
+                   MAX(s.last_day) AS last_completed
+            FROM users u LEFT JOIN streaks s ON s.user_id = u.id
+            WHERE {user_and_members('u.id')}
+            GROUP BY u.username""",
+        "current_streak DESC, longest_streak DESC, username"
+    ),
+    # Share of completed days in the last n days (incl. today) per user and window, between 0 and 1
+    "challenge_rates": Query(
+        f"""SELECT u.username, array_agg(r.done::float / w.days ORDER BY w.pos) AS rates
+            FROM users u
+            CROSS JOIN unnest(%(rate_windows)s::int[]) WITH ORDINALITY w(days, pos)
+            CROSS JOIN LATERAL (
+                SELECT COUNT(*) AS done FROM challenge_log_history c
+                WHERE c.user_id = u.id AND c.completed AND c.date > %(today)s::date - w.days AND c.date <= %(today)s
+            ) r
+            WHERE {user_and_members('u.id')}
+            GROUP BY u.username""",
+        "username"
+    ),
+    # One row per day for the heatmap: (day, completed by user_id, completions by the user and group)
+    "challenge_calendar": Query(
+        f"""SELECT d.day::date AS day, COALESCE(c.mine, FALSE) AS mine, COALESCE(c.done, 0) AS done
+            FROM generate_series(%(start_date)s::date, %(end_date)s::date, interval '1 day') d(day)
+            LEFT JOIN (
+                SELECT c.date, bool_or(c.user_id = %(user_id)s) AS mine, COUNT(*) AS done
+                FROM challenge_log_history c
+                WHERE c.completed AND c.date BETWEEN %(start_date)s AND %(end_date)s
+                  AND {user_and_members('c.user_id')}
+                GROUP BY c.date
+            ) c ON c.date = d.day""",
+        "day"
+    ),
+}
+
+
+def select(name):
+    # Plain SELECT of a query's rows in order (db.py)
+    query = QUERIES[name]
+    return f"SELECT * FROM ({query.sql}) r" + (f" ORDER BY {query.order}" if query.order else "")
+
+
+def select_json(name):
+    # The query as one json value: its row as an object, or an array of row objects in order (page_data.py)
+    query = QUERIES[name]
+    if query.single:
+        return f"SELECT to_json(r) FROM ({query.sql}) r"
+    order = f" ORDER BY {query.order}" if query.order else ""
+    return f"SELECT COALESCE(json_agg(to_json(r){order}), '[]') FROM ({query.sql}) r"
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+import frontmatter
+
+RECIPE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "recipes"))
+RECIPE_REFRESH_INTERVAL = float(os.getenv("RECIPE_REFRESH_INTERVAL", "5"))  # seconds between directory scans
+
+
+def _title_key(recipe):
+    return str(recipe["title"]).lower()
+
+
+# Process-wide index of the recipe markdown files. A refresh only stats the directory and
+# re-parses files whose mtime/size changed; tags are kept in an inverted tag -> filenames map
+# so filtering is a set intersection instead of a scan over every recipe.
+class RecipeIndex:
+
+    def __init__(self, directory, refresh_interval):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._signatures = {}  # filename -> (mtime_ns, size)
+        self._recipes = {}  # filename -> recipe dict
+        self._tags = {}  # tag -> set of filenames
+        self._last_scan = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        # callback(changed_recipes, removed_filenames) runs after every refresh that changed something
+        self._listeners.append(callback)
+
+    def _scan(self):
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".md") and entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def _load(self, filename):
+        post = frontmatter.load(os.path.join(self.directory, filename))
+        tags = post.get("tags", [])
+        if isinstance(tags, str):
+            tags = [tags]
+        return {
+            "title": post.get("title", filename),
+            "tags": tags,
+            "content": post.content,
+            "filename": filename
+        }
+
+    def _remove(self, filename):
+        recipe = self._recipes.pop(filename, None)
+        if recipe is None:
+            return
+        for tag in recipe["tags"]:
+            filenames = self._tags.get(tag)
+            if filenames is not None:
+                filenames.discard(filename)
+                if not filenames:
+                    del self._tags[tag]
+
+    def _add(self, recipe):
+        self._recipes[recipe["filename"]] = recipe
+        for tag in recipe["tags"]:
+            self._tags.setdefault(tag, set()).add(recipe["filename"])
+
+    def refresh(self, force=False):
+        # Returns True if any recipe was added, changed or removed
+        now = time.monotonic()
+        if not force and self._last_scan is not None and now - self._last_scan < self.refresh_interval:
+            return False
+        with self._lock:
+            signatures = self._scan()
+            changed = [name for name, signature in signatures.items() if self._signatures.get(name) != signature]
+            removed = [name for name in self._signatures if name not in signatures]
+            for name in removed:
+                self._remove(name)
+            updated = []
+            for name in changed:
+                self._remove(name)
+                recipe = self._load(name)
+                self._add(recipe)
+                updated.append(recipe)
+            self._signatures = signatures
+            self._last_scan = now
+        if updated or removed:
+            for callback in self._listeners:
+                callback(updated, removed)
+        return bool(updated or removed)
+
+    def recipes(self):
+        with self._lock:
+            return sorted(self._recipes.values(), key=_title_key)
+
+    def tags(self):
+        with self._lock:
+            return sorted(self._tags)
+
+    def filter_by_tags(self, tags):
+        # Recipes carrying all of the given tags
+        if not tags:
+            return self.recipes()
+        with self._lock:
+            filenames = set.intersection(*(self._tags.get(tag, set()) for tag in tags))
+            return sorted((self._recipes[name] for name in filenames), key=_title_key)
+
+
+_recipe_index = None
+_recipe_index_lock = threading.Lock()
+
+
+def get_recipe_index():
+    global _recipe_index
+    if _recipe_index is None:
+        with _recipe_index_lock:
+            if _recipe_index is None:
+                _recipe_index = RecipeIndex(RECIPE_DIR, RECIPE_REFRESH_INTERVAL)
+    return _recipe_index
@@ -0,0 +1,163 @@
+import os
+import re
+import hashlib
+import html
+import tempfile
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+import markdown
+
+# Markdown -> sanitized HTML, rendered once per recipe content and cached in memory and on disk
+# (keyed by content hash, so edited recipes get a fresh entry and restarts reuse the old ones).
+RECIPE_HTML_CACHE_DIR = os.getenv(
+    "RECIPE_HTML_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "recipe_html")
+)
+RECIPE_HTML_MEMORY_ENTRIES = int(os.getenv("RECIPE_HTML_MEMORY_ENTRIES", "2048"))
+RENDERER_VERSION = "2"  # bump when the markdown extensions or the sanitizer change
+
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists"]
+
+ALLOWED_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "strong", "em", "b", "i", "del", "sup", "sub",
+    "ul", "ol", "li", "dl", "dt", "dd", "blockquote", "code", "pre", "a", "img",
+    "table", "thead", "tbody", "tr", "th", "td", "abbr",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title"},
+    "abbr": {"title"},
+    "th": {"align"},
+    "td": {"align"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+ALLOWED_URL_SCHEMES = {"http", "https", "mailto"}
+# Dropped with their content; svg/math/textarea/noscript/template are parsed differently by browsers
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "svg", "math", "textarea", "noscript", "template"}
+VOID_TAGS = {"br", "hr", "img"}
+
+
+def _safe_url(url):
+    scheme = url.strip().split(":", 1)[0].lower() if ":" in url.split("/", 1)[0] else ""
+    return not scheme or scheme in ALLOWED_URL_SCHEMES
+
+
+# Allowlist sanitizer: keeps known tags/attributes, escapes everything else as text
+class _Sanitizer(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self._open = []
+        self._dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping += 1
+            return
+        if self._dropping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        parts = [tag]
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not _safe_url(value):
+                continue
+            parts.append(f'{name}="{html.escape(value, quote=True)}"')
+        self.out.append(f"<{' '.join(parts)}>")
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self._open and self._open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping = max(self._dropping - 1, 0)
+            return
+        if self._dropping or tag not in self._open:
+            return
+        # Close everything that was left open inside this tag
+        while self._open:
+            current = self._open.pop()
+            self.out.append(f"</{current}>")
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._dropping:
+            self.out.append(html.escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return "".join(self.out) + "".join(f"</{tag}>" for tag in reversed(self._open))
+
+
+def sanitize_html(fragment):
+    sanitizer = _Sanitizer()
+    sanitizer.feed(fragment)
+    return sanitizer.result()
+
+
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+\.)\s+")
+
+
+def _separate_lists(content):
+    # Python-Markdown only starts a list after a blank line, CommonMark (what st.markdown used)
+    # also directly after a paragraph line like "Zutaten:" - insert the blank line it needs
+    lines = []
+    previous = ""
+    for line in content.splitlines():
+        if _LIST_ITEM.match(line) and previous.strip() and not _LIST_ITEM.match(previous):
+            lines.append("")
+        lines.append(line)
+        previous = line
+    return "\n".join(lines)
+
+
+def render_markdown(content):
+    return sanitize_html(markdown.markdown(_separate_lists(content), extensions=MARKDOWN_EXTENSIONS))
+
+
+_memory = OrderedDict()  # content hash -> html
+_memory_lock = threading.Lock()
+
+
+def _remember(key, rendered):
+    with _memory_lock:
+        _memory[key] = rendered
+        _memory.move_to_end(key)
+        while len(_memory) > RECIPE_HTML_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def render_recipe_html(content):
+    key = hashlib.sha256(f"{RENDERER_VERSION}\0{content}".encode()).hexdigest()
+    with _memory_lock:
+        rendered = _memory.get(key)
+    if rendered is not None:
+        return rendered
+
+    path = os.path.join(RECIPE_HTML_CACHE_DIR, f"{key}.html")
+    try:
+        with open(path, encoding="utf-8") as f:
+            rendered = f.read()
+    except OSError:
+        rendered = render_markdown(content)
+        try:
+            # Write atomically so concurrent sessions never read a half-written fragment
+            os.makedirs(RECIPE_HTML_CACHE_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=RECIPE_HTML_CACHE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(rendered)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # read-only app dir: keep serving from memory
+    _remember(key, rendered)
+    return rendered
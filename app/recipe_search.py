@@ -0,0 +1,160 @@
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+# In-process full-text search over the recipes: inverted index over title, tags and body
+# with German-friendly normalization, BM25 ranking and prefix matching. Kept up to date
+# incrementally by the recipe index (see get_recipe_search()).
+
+FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "content": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_WEIGHT = 0.7  # prefix matches rank below exact (stemmed) matches
+MAX_PREFIX_TERMS = 50
+MIN_PREFIX_LENGTH = 2
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ern", "em", "en", "er", "es", "e", "s")  # light German stemming, applied once
+
+
+def normalize(text):
+    # lowercase, umlauts -> ae/oe/ue/ss, other accents stripped (é -> e)
+    text = str(text).lower().translate(_UMLAUTS)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def stem(token):
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize(text))
+
+
+class RecipeSearchIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}  # term -> {filename: weighted term frequency}
+        self._doc_terms = {}  # filename -> set of terms (for removal)
+        self._doc_length = {}  # filename -> weighted document length
+        self._total_length = 0.0
+        self._terms = []  # sorted list of all terms, for prefix lookups
+
+    def _remove(self, filename):
+        terms = self._doc_terms.pop(filename, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_length.pop(filename)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[filename]
+            if not posting:
+                del self._postings[term]
+                self._terms.pop(bisect_left(self._terms, term))
+
+    def _add(self, recipe):
+        filename = recipe["filename"]
+        frequencies = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            value = recipe.get(field) or ""
+            if isinstance(value, (list, tuple)):
+                value = " ".join(str(v) for v in value)
+            for token in tokenize(value):
+                term = stem(token)
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+        for term, frequency in frequencies.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                insort(self._terms, term)
+            posting[filename] = frequency
+        self._doc_terms[filename] = set(frequencies)
+        self._doc_length[filename] = length
+        self._total_length += length
+
+    def update(self, recipes, removed=()):
+        # Add or replace recipes and drop removed filenames; usable as a RecipeIndex listener
+        with self._lock:
+            for filename in removed:
+                self._remove(filename)
+            for recipe in recipes:
+                self._remove(recipe["filename"])
+                self._add(recipe)
+
+    def _prefix_terms(self, prefix):
+        start = bisect_left(self._terms, prefix)
+        matches = []
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query, limit=None):
+        # Filenames ranked by BM25; every query word has to match (exactly or as a prefix)
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores = None
+            for token in tokens:
+                term_weights = {stem(token): 1.0}
+                if len(token) >= MIN_PREFIX_LENGTH:
+                    for term in self._prefix_terms(token) + self._prefix_terms(stem(token)):
+                        term_weights.setdefault(term, PREFIX_WEIGHT)
+                token_scores = {}
+                # Prefix terms are scored with at most the exact term's idf, otherwise a rare
+                # longer word (Salatgurke) would outrank the common word asked for (Salat)
+                max_idf = math.inf
+                for term, term_weight in term_weights.items():
+                    posting = self._postings.get(term)
+                    if not posting:
+                        continue
+                    idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                    if term_weight == 1.0:
+                        max_idf = idf
+                    idf = min(idf, max_idf)
+                    for filename, frequency in posting.items():
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_length[filename] / avg_length)
+                        score = term_weight * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                        token_scores[filename] = max(token_scores.get(filename, 0.0), score)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {f: s + token_scores[f] for f, s in scores.items() if f in token_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores, key=lambda f: (-scores[f], f))
+        return ranked[:limit] if limit else ranked
+
+
+_recipe_search = None
+_recipe_search_lock = threading.Lock()
+
+
+def get_recipe_search(recipe_index):
+    # Process-wide search index, built once from the recipe index and then updated
+    # incrementally whenever a refresh of the recipe index sees changed files
+    global _recipe_search
+    if _recipe_search is None:
+        with _recipe_search_lock:
+            if _recipe_search is None:
+                search = RecipeSearchIndex()
+                recipe_index.add_listener(search.update)
+                search.update(recipe_index.recipes())
+                _recipe_search = search
+    return _recipe_search
@@ -0,0 +1,132 @@
+import datetime
+import os
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+import pandas as pd
+import db
+import metrics
+
+# Weight trends per user: smoothed weight (time-aware exponential moving average), weekly rate
+# of change (least squares slope over the last TREND_WINDOW_DAYS) and the projected date the
+# goal weight is reached at that rate. All stale users are computed together in one vectorized
+# pandas/NumPy pass. Results are cached per user and versioned by their weight_summary row, so
+# a rerun only recomputes the users whose entries (or goal) changed since.
+#
+#   trends = get_trends(group_id)   # username -> Trend
+
+TREND_HALFLIFE_DAYS = float(os.getenv("TREND_HALFLIFE_DAYS", "7"))  # half-life of the moving average
+TREND_WINDOW_DAYS = int(os.getenv("TREND_WINDOW_DAYS", "28"))  # entries used for the weekly rate
+TREND_MAX_PROJECTION_DAYS = int(os.getenv("TREND_MAX_PROJECTION_DAYS", "730"))  # no goal date beyond this
+TREND_CACHE_MAX_USERS = int(os.getenv("TREND_CACHE_MAX_USERS", "1000"))
+GOAL_TOLERANCE = 0.1  # kg; a smoothed weight this close to the goal counts as reached
+
+# smoothed: latest smoothed weight, weekly_rate: kg per week (None with too few entries),
+# goal_date: projected date of the goal weight (None without goal or when not heading there),
+# dates/values: the smoothed series at each entry (NumPy arrays, for chart overlays)
+Trend = namedtuple("Trend", "username latest_date smoothed weekly_rate goal_weight goal_date dates values")
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # user_id -> (version, Trend)
+_stats = {"hits": 0, "recomputed": 0}
+
+
+def _compute(series, versions):
+    # series: DataFrame user_id, date, weight ordered by user and date; versions: user_id -> version row
+    series["date"] = pd.to_datetime(series["date"])
+    series["weight"] = series["weight"].astype(float)
+    by_user = series.groupby("user_id", sort=False)
+    series["smoothed"] = (
+        by_user["weight"].ewm(halflife=f"{TREND_HALFLIFE_DAYS} days", times=series["date"]).mean()
+        .reset_index(level=0, drop=True)
+    )
+
+    # Least squares slope per user over the regression window, from grouped sums:
+    # slope = (n Σxy - Σx Σy) / (n Σx² - (Σx)²) with x = days relative to the latest entry
+    latest = by_user["date"].transform("max")
+    x = (series["date"] - latest).dt.days.astype(float)
+    window = x > -TREND_WINDOW_DAYS
+    y = series["weight"]
+    sums = pd.DataFrame({"user_id": series["user_id"], "n": 1.0, "x": x, "y": y, "xx": x * x, "xy": x * y})[window]
+    sums = sums.groupby("user_id").sum()
+    denominator = sums["n"] * sums["xx"] - sums["x"] ** 2
+    slope = (sums["n"] * sums["xy"] - sums["x"] * sums["y"]) / denominator.where(denominator > 0)
+
+    last = by_user.tail(1).set_index("user_id")  # same user order as the groupby below
+    per_day = slope.reindex(last.index).to_numpy()
+    smoothed = last["smoothed"].to_numpy()
+    goal = np.array([versions[user_id][4] for user_id in last.index], dtype=float)  # NaN without goal
+
+    # Days until the goal at the current rate; only when heading towards it and within the horizon
+    remaining = goal - smoothed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(np.abs(remaining) <= GOAL_TOLERANCE, 0.0, remaining / per_day)
+    days = np.where((days >= 0) & (days <= TREND_MAX_PROJECTION_DAYS), np.ceil(days), np.nan)
+
+    results = {}
+    for i, (user_id, user_series) in enumerate(series.groupby("user_id", sort=False)):
+        latest_date = last["date"].iloc[i].date()
+        results[user_id] = Trend(
+            username=versions[user_id][1],
+            latest_date=latest_date,
+            smoothed=float(smoothed[i]),
+            weekly_rate=None if np.isnan(per_day[i]) else float(per_day[i] * 7),
+            goal_weight=None if np.isnan(goal[i]) else float(goal[i]),
+            goal_date=None if np.isnan(days[i]) else latest_date + datetime.timedelta(days=int(days[i])),
+            dates=user_series["date"].to_numpy(),
+            values=user_series["smoothed"].to_numpy(),
+        )
+    return results
+
+
+def get_trends(group_id=None):
+    # username -> Trend for every user with entries (of a group)
+    versions = {row[0]: row for row in db.get_trend_versions(group_id)}
+    trends = {}
+    stale = []
+    with _lock:
+        for user_id, row in versions.items():
+            cached = _cache.get(user_id)
+            if cached is not None and cached[0] == row[2:]:
+                _cache.move_to_end(user_id)
+                trends[user_id] = cached[1]
+            else:
+                stale.append(user_id)
+        _stats["hits"] += len(trends)
+
+    if stale:
+        series = pd.DataFrame(db.get_weight_series(stale), columns=["user_id", "date", "weight"])
+        computed = _compute(series, versions) if not series.empty else {}
+        with _lock:
+            for user_id, trend in computed.items():
+                _cache[user_id] = (versions[user_id][2:], trend)
+                _cache.move_to_end(user_id)
+            while len(_cache) > max(TREND_CACHE_MAX_USERS, 1):
+                _cache.popitem(last=False)
+            _stats["recomputed"] += len(computed)
+        trends.update(computed)
+    return {trend.username: trend for _, trend in sorted(trends.items())}
+
+
+def trend_frame(trends, usernames=None, start=None, end=None):
+    # Smoothed series as a DataFrame (User, Date, Trend) for chart overlays
+    parts = []
+    for username, trend in trends.items():
+        if usernames is not None and username not in usernames:
+            continue
+        part = pd.DataFrame({"User": username, "Date": trend.dates, "Trend": trend.values})
+        if start is not None:
+            part = part[part["Date"] >= pd.Timestamp(start)]
+        if end is not None:
+            part = part[part["Date"] <= pd.Timestamp(end)]
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["User", "Date", "Trend"])
+
+
+def _trend_gauges():
+    with _lock:
+        return {"trend_cache_users": len(_cache), "trend_cache_hits": _stats["hits"],
+                "trend_recomputed_users": _stats["recomputed"]}
+
+
+metrics.registry.add_gauges(_trend_gauges)
@@ -0,0 +1,301 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+import db
+import page_data
+from seed import bench_username, clear, seed
+
+# Query plan regression check for the hot db.py queries and the page_data datasets. Seeds a dataset, runs each function
+# while capturing the SQL it sends, and EXPLAINs every statement with enable_seqscan = off:
+# if the plan still reads one of the checked tables in full (Seq Scan or an index scan without a
+# condition on the leading index key), no index can serve the query and the check fails
+# (exit code 1). Needs the database from .env with all migrations applied.
+#
+#   python bench/check_plans.py                      # seeds 1000 bench users x 1 year first
+#   python bench/check_plans.py --no-seed            # check against the data that is there
+
+
+def _cold(func):
+    return getattr(func, "uncached", func)
+
+
+def _weight_entries(ctx):
+    with db.get_conn() as conn:
+        return db.get_weight_entries(conn, ctx["user_id"])
+
+
+# name -> (function(ctx), tables that must be read through an index)
+HOT_QUERIES = {
+    "authenticate_user": (lambda c: db.authenticate_user(c["username"], "wrong password"), {"users"}),
+    "user_exists": (lambda c: db.user_exists(c["username"].upper()), {"users"}),
+    "get_user_id": (lambda c: db.get_user_id(c["username"]), {"users"}),
+    "get_user_color": (lambda c: db.get_user_color(c["user_id"]), {"users"}),
+    "get_weights_filtered[30d]": (
+        lambda c: _cold(db.get_weights_filtered)(c["month_ago"], c["today"]), {"weight_entries"}
+    ),
+    "get_weights_filtered[user]": (
+        lambda c: _cold(db.get_weights_filtered)(usernames=[c["username"]]), {"weight_entries", "users"}
+    ),
+    "get_weight_date_range": (lambda c: _cold(db.get_weight_date_range)(), {"weight_entries"}),
+    "get_usernames_with_entries": (lambda c: _cold(db.get_usernames_with_entries)(), {"weight_entries"}),
+    "get_daily_weights[30d]": (
+        lambda c: _cold(db.get_daily_weights)(c["month_ago"], c["today"]), {"weight_daily"}
+    ),
+    "get_daily_weights[user]": (
+        lambda c: _cold(db.get_daily_weights)(c["month_ago"], c["today"], [c["username"]]),
+        {"weight_daily", "users"}
+    ),
+    "get_weight_loss_ranking": (lambda c: _cold(db.get_weight_loss_ranking)(3, "abs"), {"weight_summary"}),
+    "has_completed_challenge": (lambda c: _cold(db.has_completed_challenge)(c["user_id"], c["today"]), {"challenge_log"}),
+    "get_challenge_status_all_users": (
+        lambda c: _cold(db.get_challenge_status_all_users)(c["today"]), {"challenge_log"}
+    ),
+    "get_daily_weights[group]": (
+        lambda c: _cold(db.get_daily_weights)(c["month_ago"], c["today"], group_id=c["group_id"]),
+        {"weight_daily", "users", "group_members"}
+    ),
+    "get_weight_date_range[group]": (
+        lambda c: _cold(db.get_weight_date_range)(group_id=c["group_id"]), {"weight_entries", "group_members"}
+    ),
+    "get_usernames_with_entries[group]": (
+        lambda c: _cold(db.get_usernames_with_entries)(c["group_id"]), {"weight_entries", "users", "group_members"}
+    ),
+    "get_weight_loss_ranking[group]": (
+        lambda c: _cold(db.get_weight_loss_ranking)(3, "abs", c["group_id"]), {"weight_summary", "group_members"}
+    ),
+    "get_challenge_status_all_users[group]": (
+        lambda c: _cold(db.get_challenge_status_all_users)(c["today"], c["group_id"]),
+        {"challenge_log", "users", "group_members"}
+    ),
+    "get_challenge_streaks[group]": (
+        lambda c: _cold(db.get_challenge_streaks)(c["today"], c["group_id"]),
+        {"challenge_log", "users", "group_members"}
+    ),
+    "get_challenge_completion_rates[group]": (
+        lambda c: _cold(db.get_challenge_completion_rates)(c["today"], group_id=c["group_id"]),
+        {"challenge_log", "users", "group_members"}
+    ),
+    "get_challenge_calendar[group]": (
+        lambda c: _cold(db.get_challenge_calendar)(c["user_id"], c["year_ago"], c["today"], c["group_id"]),
+        {"challenge_log", "group_members"}
+    ),
+    "get_trend_versions[group]": (
+        lambda c: _cold(db.get_trend_versions)(c["group_id"]), {"weight_summary", "users", "group_members"}
+    ),
+    "get_weight_series": (lambda c: db.get_weight_series([c["user_id"]]), {"weight_entries"}),
+    "get_all_user_colors[group]": (lambda c: _cold(db.get_all_user_colors)(c["group_id"]), {"users", "group_members"}),
+    "get_user_groups": (lambda c: _cold(db.get_user_groups)(c["user_id"]), {"group_members"}),
+    "get_weights_for_user": (lambda c: db.get_weights_for_user(c["user_id"]), {"weight_entries"}),
+    "get_latest_weight_entry": (lambda c: _cold(db.get_latest_weight_entry)(c["user_id"]), {"weight_summary"}),
+    "get_weight_entries": (_weight_entries, {"weight_entries"}),
+}
+
+
+def dataset_params(ctx, group_id):
+    # page_data.load() parameters as the pages pass them, in its (sorted) memo key form
+    params = {
+        **page_data.DEFAULT_PARAMS,
+        "user_id": ctx["user_id"],
+        "today": ctx["today"],
+        "group_id": group_id,
+        "rate_windows": db.CHALLENGE_RATE_WINDOWS,
+        "start_date": ctx["today"] - datetime.timedelta(days=db.CHALLENGE_CALENDAR_DAYS - 1),
+        "end_date": ctx["today"],
+    }
+    return tuple(sorted(params.items()))
+
+
+def _dataset(name, grouped):
+    def run(ctx):
+        return page_data._fetch((name,), dataset_params(ctx, ctx["group_id"] if grouped else None))
+    return run
+
+
+# page_data dataset -> (tables that must be read through an index without a group, with a group)
+HOT_DATASETS = {
+    "weight_date_range": ({"weight_entries"}, {"weight_entries", "group_members"}),
+    "usernames_with_entries": ({"weight_entries"}, {"weight_entries", "users", "group_members"}),
+    "user_colors": (set(), {"users", "group_members"}),  # all users without a group
+    "loss_ranking_abs": ({"weight_summary"}, {"weight_summary", "group_members"}),
+    "loss_ranking_rel": ({"weight_summary"}, {"weight_summary", "group_members"}),
+    "challenge_completed": ({"challenge_log"}, {"challenge_log"}),
+    "challenge_status": ({"challenge_log"}, {"challenge_log", "users", "group_members"}),
+    "challenge_streaks": ({"challenge_log", "users"}, {"challenge_log", "users", "group_members"}),
+    "challenge_rates": ({"challenge_log", "users"}, {"challenge_log", "users", "group_members"}),
+    "challenge_calendar": ({"challenge_log"}, {"challenge_log", "group_members"}),
+}
+
+for _name, (_tables, _group_tables) in HOT_DATASETS.items():
+    HOT_QUERIES[f"page_data:{_name}"] = (_dataset(_name, False), _tables)
+    HOT_QUERIES[f"page_data:{_name}[group]"] = (_dataset(_name, True), _group_tables)
+
+
+def unchecked_datasets():
+    # page_data datasets without an entry in HOT_DATASETS, so new datasets get noticed
+    return sorted(set(page_data.DATASETS) - set(HOT_DATASETS))
+
+
+@contextmanager
+def capture_sql():
+    # Collect the SQL (parameters bound) of every statement executed through db.py's cursors
+    statements = []
+    original = db.InstrumentedCursor.execute
+
+    def execute(self, query, vars=None):
+        result = original(self, query, vars)
+        statements.append(self.query.decode())
+        return result
+
+    db.InstrumentedCursor.execute = execute
+    try:
+        yield statements
+    finally:
+        db.InstrumentedCursor.execute = original
+
+
+INDEX_SCANS = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+SMALL_RELATION_PAGES = 8  # reading a relation this small in full costs about as much as an index lookup
+
+
+def load_indexes(cur):
+    # index name -> (table, leading key column or expression); partition indexes map to the
+    # partitioned table
+    cur.execute("""
+        SELECT i.indexrelid::regclass::text, COALESCE(pg_partition_root(i.indrelid), i.indrelid)::regclass::text,
+               pg_get_indexdef(i.indexrelid, 1, true)
+        FROM pg_index i
+    """)
+    return {index: (table, leading) for index, table, leading in cur.fetchall()}
+
+
+def load_partitions(cur):
+    # partition name -> partitioned table; small partitions (e.g. DEFAULT or a year that has
+    # just started) map to None, the planner may read those in full whatever the indexes
+    cur.execute("""
+        SELECT c.oid::regclass::text,
+               CASE WHEN c.relpages >= %s THEN pg_partition_root(c.oid)::regclass::text END
+        FROM pg_class c WHERE c.relispartition AND c.relkind = 'r'
+    """, (SMALL_RELATION_PAGES,))
+    return dict(cur.fetchall())
+
+
+def _uses_leading_key(condition, leading):
+    return re.search(r"(?<![\w.])" + re.escape(leading) + r"(?!\w)", condition or "") is not None
+
+
+def full_scans(plan, indexes, partitions, limited=False):
+    # Tables read in full in an EXPLAIN (FORMAT JSON) plan tree: Seq Scans, and index scans whose
+    # condition does not constrain the leading index key (the planner walks a whole index when
+    # seq scans are disabled), unless a Limit above them stops early (top-N in index order)
+    found = []
+    node = plan.get("Node Type")
+    limited = limited or node == "Limit"
+    relation = plan.get("Relation Name")
+    if relation in partitions and partitions[relation] is None:
+        pass  # small partition
+    elif node == "Seq Scan":
+        found.append(partitions.get(relation, relation))
+    elif node in INDEX_SCANS and not limited:
+        table, leading = indexes.get(plan["Index Name"], (relation, None))
+        if leading is None or not _uses_leading_key(plan.get("Index Cond"), leading):
+            found.append(table)
+    children = plan.get("Plans", [])
+    per_child = [full_scans(child, indexes, partitions, limited) for child in children]
+    if node == "Merge Join" and any(not scans for scans in per_child):
+        # A merge join stops once one input is exhausted: if that input is read through an index
+        # condition, walking the other one in join key order ends early, like under a Limit
+        per_child = [full_scans(child, indexes, partitions, True) for child in children]
+    for scans in per_child:
+        found.extend(scans)
+    return found
+
+
+def check(ctx):
+    results = []
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            indexes = load_indexes(cur)
+            partitions = load_partitions(cur)
+            cur.execute("SET enable_seqscan = off")
+            for name, (func, tables) in HOT_QUERIES.items():
+                with capture_sql() as statements:
+                    func(ctx)
+                failures = []
+                for sql in statements:
+                    if not sql.lstrip().upper().startswith("SELECT"):
+                        continue
+                    cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+                    plan = cur.fetchone()[0][0]["Plan"]
+                    scanned = sorted(set(full_scans(plan, indexes, partitions)) & tables)
+                    if scanned:
+                        failures.append({"sql": " ".join(sql.split()), "full_scan": scanned})
+                results.append({"query": name, "statements": len(statements), "failures": failures})
+        conn.rollback()
+    return results
+
+
+def bench_context(today=None):
+    # Parameters the checked queries run with: the first bench user, their group and date ranges.
+    # None while the bench data is missing
+    today = today or datetime.date.today()
+    username = bench_username(1)
+    user_id = db.get_user_id(username)
+    if user_id is None:
+        return None
+    return {
+        "user_id": user_id,
+        "username": username,
+        "group_id": db.get_user_groups.uncached(user_id)[0][0],
+        "today": today,
+        "month_ago": today - datetime.timedelta(days=30),
+        "year_ago": today - datetime.timedelta(days=364),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot db.py query can only be served by a full table scan")
+    parser.add_argument("--users", type=int, default=1000)  # enough groups for member lookups to beat a users scan
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--no-seed", action="store_true", help="use the existing data (needs a bench_0001 user)")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded bench_* data")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed(args.users, args.years)
+    ctx = bench_context()
+    if ctx is None:
+        parser.error(f"user {bench_username(1)} not found, run without --no-seed")
+
+    try:
+        results = check(ctx)
+    finally:
+        if not args.no_seed and not args.keep:
+            with db.get_conn() as conn:
+                with conn.cursor() as cur:
+                    clear(cur)
+                conn.commit()
+
+    unchecked = unchecked_datasets()
+    if unchecked:
+        print("not checked: " + ", ".join(unchecked))
+    failed = [r for r in results if r["failures"]]
+    for result in results:
+        print(f"{'FAIL' if result['failures'] else 'ok':<5} {result['query']}")
+        for failure in result["failures"]:
+            print(f"      full scan of {', '.join(failure['full_scan'])}: {failure['sql'][:200]}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if failed or unchecked:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import types
+
+# Helpers to render the Streamlit pages headless (streamlit.testing AppTest) for the benchmarks.
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app"))
+
+PAGES = [
+    "Weighttracker.py",
+    "pages/2_Statistics.py",
+    "pages/3_Challenges.py",
+    "pages/4_Rezepte.py",
+    "pages/5_Settings.py",
+]
+
+
+class FakeCookieManager(dict):
+    # Stands in for EncryptedCookieManager, whose browser component never becomes
+    # ready without a frontend. Pre-filled with the user to log in as, if any.
+    user_id = None
+    username = None
+
+    def __init__(self, prefix="", password=""):
+        super().__init__()
+        if FakeCookieManager.user_id is not None:
+            self["user_id"] = str(FakeCookieManager.user_id)
+            self["username"] = FakeCookieManager.username or ""
+
+    def ready(self):
+        return True
+
+    def save(self):
+        pass
+
+
+def install_fake_cookies(user_id=None, username=None):
+    FakeCookieManager.user_id = user_id
+    FakeCookieManager.username = username
+    module = types.ModuleType("streamlit_cookies_manager")
+    module.EncryptedCookieManager = FakeCookieManager
+    sys.modules["streamlit_cookies_manager"] = module
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+
+def app_test(page, timeout=60):
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=timeout)
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Cold page load benchmark: every page is rendered in a fresh interpreter (logged out and,
+# with --user-id, logged in) and we report import + first render time, a warm rerun and
+# which heavy modules the page pulled in.
+#
+#   python bench/page_load.py                 # login form only, no database needed for most pages
+#   python bench/page_load.py --user-id 1     # also render the logged-in pages (needs the DB from .env)
+
+HEAVY_MODULES = ["pandas", "altair", "numpy", "psycopg2", "frontmatter", "markdown"]
+
+
+def run_child(page, user_id, username):
+    from headless import app_test, install_fake_cookies
+
+    install_fake_cookies(user_id, username)
+    start = time.perf_counter()
+    import streamlit.testing.v1  # noqa: F401  (AppTest itself is not part of the page load)
+    streamlit_import = time.perf_counter() - start
+
+    at = app_test(page)
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    at.run()
+    warm = time.perf_counter() - start
+    return {
+        "page": page,
+        "logged_in": user_id is not None,
+        "streamlit_import_s": round(streamlit_import, 4),
+        "first_render_s": round(first, 4),
+        "warm_rerun_s": round(warm, 4),
+        "exceptions": [str(e.value) for e in at.exception],
+        "heavy_modules": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+
+
+def render_pages(user_id=None, username="alice", pages=None):
+    # Render each page in its own interpreter; yields one result dict per page
+    from headless import PAGES
+
+    for page in pages or PAGES:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", page, "--username", username]
+        if user_id is not None:
+            cmd += ["--child-user-id", str(user_id)]
+        out = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(__file__))
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            continue
+        yield json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold page load benchmark")
+    parser.add_argument("--user-id", type=int, help="also render the pages logged in as this user")
+    parser.add_argument("--username", default="alice")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-user-id", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.child_user_id, args.username)))
+        return
+
+    results = []
+    for user_id in [None] + ([args.user_id] if args.user_id is not None else []):
+        for result in render_pages(user_id, args.username):
+            results.append(result)
+            print(
+                f"{result['page']:<24} {'in ' if result['logged_in'] else 'out'}  "
+                f"first {result['first_render_s'] * 1000:8.1f} ms  warm {result['warm_rerun_s'] * 1000:7.1f} ms  "
+                f"modules: {', '.join(result['heavy_modules']) or '-'}"
+                + (f"  EXCEPTION: {result['exceptions'][0]}" if result["exceptions"] else "")
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
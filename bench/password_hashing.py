@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+import db
+
+# Login throughput per hasher cost setting: many concurrent "sessions" verify a password
+# through db.AuthWorkerPool, like authenticate_user() does. No database needed.
+#
+#   python bench/password_hashing.py --workers 1 2 4 --costs sha256 scrypt:14 scrypt:15 argon2:3:65536
+
+
+def make_hasher(spec):
+    # sha256 | scrypt:<log2 n>[:r[:p]] | argon2:<time cost>[:memory KiB[:parallelism]]
+    name, *params = spec.split(":")
+    params = [int(p) for p in params]
+    if name == "sha256":
+        return db.Sha256Hasher()
+    if name == "scrypt":
+        log_n, r, p = (params + [14, 8, 1][len(params):])[:3]
+        return db.ScryptHasher(n=1 << log_n, r=r, p=p)
+    if name == "argon2":
+        time_cost, memory_cost, parallelism = (params + [3, 65536, 1][len(params):])[:3]
+        return db.Argon2Hasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    raise ValueError(f"unknown hasher {spec}")
+
+
+def bench(hasher, workers, logins, clients):
+    encoded = hasher.hash("correct horse battery staple")
+    pool = db.AuthWorkerPool(workers, max(clients, workers), timeout=600)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as sessions:
+        results = list(sessions.map(
+            lambda _: pool.run(hasher.verify, "correct horse battery staple", encoded),
+            range(logins)
+        ))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing throughput benchmark")
+    parser.add_argument("--costs", nargs="+", default=["sha256", "scrypt:14", "scrypt:15", "scrypt:16"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--logins", type=int, default=40, help="verifications per setting")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent sessions logging in")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for spec in args.costs:
+        try:
+            hasher = make_hasher(spec)
+        except RuntimeError as e:
+            print(f"{spec:<18} skipped: {e}")
+            continue
+        for workers in args.workers:
+            elapsed = bench(hasher, workers, args.logins, args.clients)
+            result = {
+                "hasher": spec,
+                "workers": workers,
+                "logins": args.logins,
+                "clients": args.clients,
+                "seconds": round(elapsed, 4),
+                "logins_per_second": round(args.logins / elapsed, 1),
+                "ms_per_login": round(elapsed / args.logins * workers * 1000, 2),
+            }
+            results.append(result)
+            print(
+                f"{spec:<18} workers={workers:<3} {result['logins_per_second']:>9.1f} logins/s  "
+                f"({result['ms_per_login']:.1f} ms per hash)"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
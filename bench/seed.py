@@ -0,0 +1,166 @@
+import argparse
+import datetime
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+import db
+
+# Synthetic data for the benchmarks: users named bench_0001, bench_0002, ... with a noisy
+# weight curve over the last N years and challenge completions, loaded with COPY into the
+# database from .env. The users are split into groups of BENCH_GROUP_SIZE (bench_group_001, ...).
+# Only bench_* users and groups are ever touched, so it can run against a dev database.
+#
+#   python bench/seed.py --users 500 --years 3      # replaces all existing bench_* data
+#   python bench/seed.py --clear                    # removes it again
+
+BENCH_PREFIX = "bench_"
+BENCH_PASSWORD = "bench123"
+BENCH_GROUP_SIZE = 20
+
+
+def bench_username(i):
+    return f"{BENCH_PREFIX}{i:04d}"
+
+
+def bench_group_name(i):
+    return f"{BENCH_PREFIX}group_{i:03d}"
+
+
+def clear(cur):
+    cur.execute("DELETE FROM groups WHERE name LIKE %s", (BENCH_PREFIX.replace("_", r"\_") + "%",))
+    cur.execute("SELECT id FROM users WHERE username LIKE %s", (BENCH_PREFIX.replace("_", r"\_") + "%",))
+    user_ids = [row[0] for row in cur.fetchall()]
+    if user_ids:
+        cur.execute("DELETE FROM group_members WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM challenge_log WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM weight_entries WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM weight_summary WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM weight_daily WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+    return len(user_ids)
+
+
+def _copy(cur, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join("\\N" if v is None else str(v) for v in row) + "\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _weight_rows(rng, user_id, start, end, entry_rate):
+    # Random walk with a slow downward trend, one entry on roughly entry_rate of the days
+    weight = rng.uniform(70, 125)
+    trend = rng.uniform(-0.03, 0.005)
+    day = start
+    while day <= end:
+        weight = min(max(weight + trend + rng.gauss(0, 0.35), 45), 200)
+        if rng.random() < entry_rate:
+            yield user_id, day, round(weight, 1), None
+        day += datetime.timedelta(days=1)
+
+
+def _challenge_rows(rng, user_id, start, end, challenge_rate):
+    day = start
+    while day <= end:
+        if rng.random() < challenge_rate:
+            yield user_id, day, True
+        day += datetime.timedelta(days=1)
+
+
+def seed(users, years, entry_rate=0.7, challenge_rate=0.5, rng_seed=42, end=None, group_size=BENCH_GROUP_SIZE):
+    # Replace the bench_* data; returns the row counts that were loaded
+    rng = random.Random(rng_seed)
+    end = end or datetime.date.today()
+    first_day = end - datetime.timedelta(days=int(365 * years))
+    password_hash = db.hash_password(BENCH_PASSWORD)  # one hash for everyone, hashing is not what we measure
+
+    counts = {"users": users, "groups": 0, "weight_entries": 0, "challenge_log": 0}
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            clear(cur)
+            _copy(cur, "users", ("username", "password", "color"), (
+                (bench_username(i), password_hash, "#%06x" % rng.randrange(1 << 24)) for i in range(1, users + 1)
+            ))
+            cur.execute(
+                "SELECT id FROM users WHERE username LIKE %s ORDER BY id",
+                (BENCH_PREFIX.replace("_", r"\_") + "%",)
+            )
+            user_ids = [row[0] for row in cur.fetchall()]
+            group_count = (len(user_ids) + group_size - 1) // group_size
+            _copy(cur, "groups", ("name", "join_code", "start_date"), (
+                (bench_group_name(i), f"{BENCH_PREFIX}{i:03d}", first_day) for i in range(1, group_count + 1)
+            ))
+            cur.execute(
+                "SELECT id FROM groups WHERE name LIKE %s ORDER BY name",
+                (BENCH_PREFIX.replace("_", r"\_") + "%",)
+            )
+            group_ids = [row[0] for row in cur.fetchall()]
+            _copy(cur, "group_members", ("group_id", "user_id"), (
+                (group_ids[i // group_size], user_id) for i, user_id in enumerate(user_ids)
+            ))
+
+            weight_rows = []
+            challenge_rows = []
+            for user_id in user_ids:
+                # Participants join at different times during the first tenth of the period
+                start = first_day + datetime.timedelta(days=rng.randrange(max(int(365 * years / 10), 1)))
+                weight_rows.extend(_weight_rows(rng, user_id, start, end, entry_rate))
+                challenge_rows.extend(_challenge_rows(rng, user_id, start, end, challenge_rate))
+            _copy(cur, "weight_entries", ("user_id", "date", "weight", "note"), weight_rows)
+            _copy(cur, "challenge_log", ("user_id", "date", "completed"), challenge_rows)
+            counts["weight_entries"] = len(weight_rows)
+            counts["challenge_log"] = len(challenge_rows)
+            counts["groups"] = len(group_ids)
+        conn.commit()
+    # Past years land in the DEFAULT partitions; give them their own, like a long-running install
+    db.ensure_partitions()
+    # VACUUM as well: the visibility map decides what index-only scans cost, and leaving it to
+    # autovacuum would make plans (and check_plans.py) depend on when that last ran
+    pool = db.get_pool()
+    conn = pool.getconn()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+    finally:
+        conn.autocommit = False
+        pool.putconn(conn)
+    db.invalidate_cache("weights", "users", "groups", "challenges")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic bench_* users, weights and challenges")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--entry-rate", type=float, default=0.7, help="share of days with a weight entry")
+    parser.add_argument("--challenge-rate", type=float, default=0.5, help="share of days with a completed challenge")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--group-size", type=int, default=BENCH_GROUP_SIZE, help="users per bench group")
+    parser.add_argument("--clear", action="store_true", help="only remove the bench_* data")
+    args = parser.parse_args()
+
+    if args.clear:
+        with db.get_conn() as conn:
+            with conn.cursor() as cur:
+                removed = clear(cur)
+            conn.commit()
+        db.invalidate_cache("weights", "users", "groups", "challenges")
+        print(f"removed {removed} bench users")
+        return
+
+    start = time.perf_counter()
+    counts = seed(args.users, args.years, args.entry_rate, args.challenge_rate, args.seed, group_size=args.group_size)
+    print(
+        f"seeded {counts['users']} users in {counts['groups']} groups, {counts['weight_entries']} weight entries, "
+        f"{counts['challenge_log']} challenge completions in {time.perf_counter() - start:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
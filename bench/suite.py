@@ -0,0 +1,249 @@
+import argparse
+import datetime
+import inspect
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+import db
+import page_data
+from page_load import render_pages
+from check_plans import dataset_params
+from seed import bench_username, clear, seed
+
+# Scale benchmark: for each scale (USERSxYEARS) seed synthetic data, time the db.py functions
+# and page_data datasets (cold = query without the shared cache, cached = cache hit) and render every page headless
+# logged in as a bench user. Writes a JSON report and can compare it against a previous one.
+#
+#   python bench/suite.py --scales 10x1 100x1 500x3 --json report.json
+#   python bench/suite.py --scales 500x3 --baseline report.json    # exit code 1 on regressions
+
+DEFAULT_SCALES = ["10x1", "100x1", "500x3"]
+
+
+def _cold(func):
+    # Cached readers expose the undecorated query as .uncached
+    return getattr(func, "uncached", func)
+
+
+def _with_conn(func):
+    def call(*args):
+        with db.get_conn() as conn:
+            return func(conn, *args)
+    return call
+
+
+def _import_year(ctx):
+    start = ctx["today"] - datetime.timedelta(days=364)
+    lines = ["date,weight"] + [f"{start + datetime.timedelta(days=i)},{80 + i % 7 * 0.3:.1f}" for i in range(365)]
+    return db.import_weights_csv(io.StringIO("\n".join(lines) + "\n"), user_id=ctx["user_id"])
+
+
+def _export_all(ctx):
+    return sum(len(rows) for rows in db.stream_export("weight_entries"))
+
+
+# name -> function(ctx); ctx has user_id, username, group_id, today, month_ago, first_day
+CASES = {
+    "get_all_weights_for_all_users": lambda c: _cold(db.get_all_weights_for_all_users)(),
+    "get_weights_filtered[30d]": lambda c: _cold(db.get_weights_filtered)(c["month_ago"], c["today"]),
+    "get_weights_filtered[user]": lambda c: _cold(db.get_weights_filtered)(usernames=[c["username"]]),
+    "get_weight_date_range": lambda c: _cold(db.get_weight_date_range)(),
+    "get_usernames_with_entries": lambda c: _cold(db.get_usernames_with_entries)(),
+    "get_daily_weights[30d]": lambda c: _cold(db.get_daily_weights)(c["month_ago"], c["today"]),
+    "get_daily_weights[all]": lambda c: _cold(db.get_daily_weights)(c["first_day"], c["today"]),
+    "get_weight_loss_ranking[abs]": lambda c: _cold(db.get_weight_loss_ranking)(3, "abs"),
+    "get_weight_loss_ranking[rel]": lambda c: _cold(db.get_weight_loss_ranking)(3, "rel"),
+    "get_challenge_status_all_users": lambda c: _cold(db.get_challenge_status_all_users)(c["today"]),
+    "has_completed_challenge": lambda c: _cold(db.has_completed_challenge)(c["user_id"], c["today"]),
+    "get_daily_weights[group]": lambda c: _cold(db.get_daily_weights)(c["first_day"], c["today"], group_id=c["group_id"]),
+    "get_weight_loss_ranking[group]": lambda c: _cold(db.get_weight_loss_ranking)(3, "abs", c["group_id"]),
+    "get_challenge_status_all_users[group]": lambda c: _cold(db.get_challenge_status_all_users)(c["today"], c["group_id"]),
+    "get_challenge_streaks[group]": lambda c: _cold(db.get_challenge_streaks)(c["today"], c["group_id"]),
+    "get_challenge_completion_rates[group]": lambda c: _cold(db.get_challenge_completion_rates)(c["today"], group_id=c["group_id"]),
+    "get_challenge_calendar[group]": lambda c: _cold(db.get_challenge_calendar)(c["user_id"], c["first_day"], c["today"], c["group_id"]),
+    "get_trend_versions[group]": lambda c: _cold(db.get_trend_versions)(c["group_id"]),
+    "get_weight_series[group]": lambda c: db.get_weight_series(
+        [row[0] for row in db.get_trend_versions.uncached(c["group_id"])]
+    ),
+    "get_user_groups": lambda c: _cold(db.get_user_groups)(c["user_id"]),
+    "get_weights_for_user": lambda c: db.get_weights_for_user(c["user_id"]),
+    "get_latest_weight_entry": lambda c: _cold(db.get_latest_weight_entry)(c["user_id"]),
+    "get_weight_entries": lambda c: _with_conn(db.get_weight_entries)(c["user_id"]),
+    "user_exists": lambda c: db.user_exists(c["username"]),
+    "get_user_id": lambda c: db.get_user_id(c["username"]),
+    "get_user_color": lambda c: db.get_user_color(c["user_id"]),
+    "get_all_user_colors": lambda c: _cold(db.get_all_user_colors)(),
+    "insert_weight": lambda c: db.insert_weight(c["user_id"], c["today"], 80.0),
+    "log_challenge_completion": lambda c: db.log_challenge_completion(c["user_id"], c["today"]),
+    "set_user_color": lambda c: db.set_user_color(c["user_id"], "#123456"),
+    "get_goal_weight": lambda c: db.get_goal_weight(c["user_id"]),
+    "set_goal_weight": lambda c: db.set_goal_weight(c["user_id"], 75.0),
+    "import_weights_csv[365]": _import_year,
+    "stream_export[all]": _export_all,
+    "authenticate_user": lambda c: db.authenticate_user(c["username"], "bench123"),
+}
+
+def _dataset(name, grouped):
+    # One page_data dataset, fetched without cache or memo
+    def run(ctx):
+        return page_data._fetch((name,), dataset_params(ctx, ctx["group_id"] if grouped else None))
+    return run
+
+
+for _name in page_data.DATASETS:
+    CASES[f"page_data:{_name}"] = _dataset(_name, False)
+    CASES[f"page_data:{_name}[group]"] = _dataset(_name, True)
+
+# Cache hits of the readers the pages go through
+CACHED_CASES = {
+    "get_daily_weights[30d]": lambda c: db.get_daily_weights(c["month_ago"], c["today"]),
+    "get_weight_loss_ranking[abs]": lambda c: db.get_weight_loss_ranking(3, "abs"),
+    "get_all_user_colors": lambda c: db.get_all_user_colors(),
+}
+
+# Public db functions that are deliberately not timed (setup, destructive or pool internals)
+NOT_TIMED = {
+    "get_pool", "get_pool_stats", "get_conn", "cached_query", "invalidate_cache", "cache_generation", "get_cache_stats",
+    "get_password_hasher", "hash_password", "verify_password", "register_user", "register_test_users", "is_admin",
+    "delete_weight_entry", "add_weight_entry", "change_password",
+    "ensure_partitions", "list_partitions", "archive_partitions", "create_group", "join_group", "leave_group",
+}
+
+
+def untimed_functions():
+    # Public functions of db.py that neither CASES nor NOT_TIMED cover, so new queries get noticed
+    covered = {name.split("[")[0] for name in CASES} | NOT_TIMED
+    return sorted(
+        name for name, obj in vars(db).items()
+        if inspect.isfunction(obj) and obj.__module__ == "db" and not name.startswith("_") and name not in covered
+    )
+
+
+def time_case(func, ctx, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(ctx)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(int(len(timings) * 0.95), len(timings) - 1)], 3),
+    }
+
+
+def parse_scale(spec):
+    users, years = spec.lower().split("x")
+    return int(users), float(years)
+
+
+def run_scale(spec, repeat, pages):
+    users, years = parse_scale(spec)
+    start = time.perf_counter()
+    counts = seed(users, years)
+    seed_s = time.perf_counter() - start
+
+    today = datetime.date.today()
+    username = bench_username(1)
+    ctx = {
+        "user_id": db.get_user_id(username),
+        "username": username,
+        "today": today,
+        "month_ago": today - datetime.timedelta(days=30),
+        "first_day": today - datetime.timedelta(days=int(365 * years)),
+    }
+    ctx["group_id"] = db.get_user_groups.uncached(ctx["user_id"])[0][0]
+
+    result = {"scale": spec, "rows": counts, "seed_s": round(seed_s, 2), "db": {}, "db_cached": {}, "pages": []}
+    for name, func in CASES.items():
+        result["db"][name] = time_case(func, ctx, repeat)
+        print(f"  {name:<34} median {result['db'][name]['median_ms']:9.2f} ms  p95 {result['db'][name]['p95_ms']:9.2f} ms")
+    for name, func in CACHED_CASES.items():
+        func(ctx)  # warm
+        result["db_cached"][name] = time_case(func, ctx, repeat)
+    if pages:
+        for page in render_pages(ctx["user_id"], username):
+            result["pages"].append(page)
+            print(
+                f"  {page['page']:<34} first {page['first_render_s'] * 1000:8.1f} ms  warm {page['warm_rerun_s'] * 1000:8.1f} ms"
+                + (f"  EXCEPTION: {page['exceptions'][0]}" if page["exceptions"] else "")
+            )
+    return result
+
+
+def compare(report, baseline, tolerance, min_ms):
+    # Regressions: median (db) or render time (pages) slower than tolerance x baseline
+    old_scales = {s["scale"]: s for s in baseline["scales"]}
+    regressions = []
+    for scale in report["scales"]:
+        old = old_scales.get(scale["scale"])
+        if old is None:
+            continue
+        pairs = [
+            (f"db {name}", timing["median_ms"], old["db"].get(name, {}).get("median_ms"))
+            for name, timing in scale["db"].items()
+        ]
+        old_pages = {p["page"]: p for p in old.get("pages", [])}
+        for page in scale["pages"]:
+            for key in ("first_render_s", "warm_rerun_s"):
+                previous = old_pages.get(page["page"], {}).get(key)
+                pairs.append((f"page {page['page']} {key}", page[key] * 1000, previous and previous * 1000))
+        for name, now, before in pairs:
+            if before and now > min_ms and now > before * tolerance:
+                regressions.append(f"{scale['scale']:<8} {name}: {before:.2f} ms -> {now:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="db.py and page render benchmarks at several data scales")
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, help="USERSxYEARS, e.g. 500x3")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per function")
+    parser.add_argument("--no-pages", action="store_true", help="skip the headless page renders")
+    parser.add_argument("--keep", action="store_true", help="keep the bench_* data of the last scale")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor vs. the baseline")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="ignore regressions of timings below this")
+    args = parser.parse_args()
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "untimed_functions": untimed_functions(),
+        "scales": [],
+    }
+    if report["untimed_functions"]:
+        print("not timed: " + ", ".join(report["untimed_functions"]))
+    try:
+        for spec in args.scales:
+            print(f"scale {spec}")
+            report["scales"].append(run_scale(spec, args.repeat, not args.no_pages))
+    finally:
+        if not args.keep:
+            with db.get_conn() as conn:
+                with conn.cursor() as cur:
+                    clear(cur)
+                conn.commit()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_ms)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+-- Initial schema for a fresh database volume.
+-- Later schema changes live in app/migrations/ and are applied by app/migrate.py.
+
 -- Users table
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
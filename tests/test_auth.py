@@ -0,0 +1,56 @@
+import hashlib
+import threading
+import pytest
+import db
+
+
+@pytest.fixture
+def scrypt(monkeypatch):
+    # Cheap parameters keep the tests fast; the format is the same as in production
+    hasher = db.ScryptHasher(n=16, r=1, p=1)
+    monkeypatch.setattr(db, "_password_hasher", hasher)
+    return hasher
+
+
+def test_legacy_sha256_hash_is_upgraded_to_scrypt(scrypt):
+    legacy = hashlib.sha256(b"geheim").hexdigest()
+    assert db.verify_password("geheim", legacy) == (True, True)
+    assert db.verify_password("falsch", legacy) == (False, False)
+    upgraded = db.hash_password("geheim")
+    assert upgraded.startswith("scrypt$16$1$1$")
+    assert db.verify_password("geheim", upgraded) == (True, False)
+
+
+def test_scrypt_hash_with_other_parameters_needs_rehash(scrypt):
+    old = db.ScryptHasher(n=32, r=1, p=1).hash("geheim")
+    assert scrypt.needs_rehash(old)
+    assert db.verify_password("geheim", old) == (True, True)
+    assert db.verify_password("falsch", old) == (False, False)
+    assert not scrypt.needs_rehash(scrypt.hash("geheim"))
+
+
+def test_unknown_hash_format_is_rejected(scrypt):
+    with pytest.raises(ValueError):
+        db.verify_password("geheim", "md5$abc")
+
+
+def test_auth_pool_times_out_when_busy():
+    pool = db.AuthWorkerPool(1, 1, 0.05)
+    release = threading.Event()
+    try:
+        # The only worker is busy past the deadline ...
+        with pytest.raises(TimeoutError):
+            pool.run(release.wait)
+        # ... and keeps its slot, so the next login gives up waiting for one
+        with pytest.raises(TimeoutError):
+            pool.run(str, "x")
+    finally:
+        release.set()
+    pool._executor.shutdown(wait=True)
+
+
+def test_auth_pool_runs_jobs_when_free():
+    pool = db.AuthWorkerPool(1, 1, 1.0)
+    assert pool.run(str.upper, "geheim") == "GEHEIM"
+    assert pool.run(str.upper, "zwei") == "ZWEI"
+    pool._executor.shutdown(wait=True)
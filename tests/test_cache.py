@@ -0,0 +1,133 @@
+import threading
+import pytest
+import db
+
+
+class FakeLoader:
+
+    def __init__(self, value="rows"):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [self.value, self.calls]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = db.QueryCache(60, 100)
+    monkeypatch.setattr(db, "_cache", cache)
+    return cache
+
+
+def test_second_read_is_a_hit(cache):
+    loader = FakeLoader()
+    assert cache.get_or_load("a", ("weights",), loader) == ["rows", 1]
+    assert cache.get_or_load("a", ("weights",), loader) == ["rows", 1]
+    assert loader.calls == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_invalidation_only_drops_tagged_entries(cache):
+    weights, users = FakeLoader(), FakeLoader()
+    cache.get_or_load("weights", ("weights",), weights)
+    cache.get_or_load("both", ("weights", "users"), weights)
+    cache.get_or_load("users", ("users",), users)
+    cache.invalidate("weights")
+    assert cache.stats()["entries"] == 1
+    assert cache.get_or_load("weights", ("weights",), weights) == ["rows", 3]
+    assert cache.get_or_load("users", ("users",), users) == ["rows", 1]
+
+
+def test_result_read_before_a_concurrent_write_is_not_stored(cache):
+    def loader():
+        # A write commits and invalidates while this read is still running
+        cache.invalidate("weights")
+        return "stale"
+
+    assert cache.get_or_load("a", ("weights",), loader) == "stale"
+    assert cache.stats()["entries"] == 0
+    assert cache.get_or_load("a", ("weights",), lambda: "fresh") == "fresh"
+    assert cache.get_or_load("a", ("weights",), lambda: "unused") == "fresh"
+
+
+def test_write_to_another_tag_does_not_discard_the_result(cache):
+    def loader():
+        cache.invalidate("users")
+        return "rows"
+
+    cache.get_or_load("a", ("weights",), loader)
+    assert cache.get_or_load("a", ("weights",), lambda: "unused") == "rows"
+
+
+def test_concurrent_viewers_share_one_load(cache):
+    started, release = threading.Event(), threading.Event()
+    loader = FakeLoader()
+
+    def slow_loader():
+        started.set()
+        release.wait()
+        return loader()
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get_or_load("a", (), slow_loader)))
+    first.start()
+    started.wait()
+    second = threading.Thread(target=lambda: results.append(cache.get_or_load("a", (), loader)))
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+    assert results == [["rows", 1], ["rows", 1]]
+    assert loader.calls == 1
+
+
+def test_failed_load_lets_the_next_reader_retry(cache):
+    def failing():
+        raise RuntimeError("connection lost")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("a", (), failing)
+    assert cache.get_or_load("a", (), lambda: "rows") == "rows"
+
+
+def test_expired_and_evicted_entries_are_reloaded(cache):
+    loader = FakeLoader()
+    cache.get_or_load("a", (), loader, ttl=0)
+    assert cache.get_or_load("a", (), loader) == ["rows", 2]
+    cache.max_entries = 1
+    cache.get_or_load("b", (), loader)
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_or_load("a", (), loader) == ["rows", 4]
+
+
+def test_cached_query_keys_on_arguments_and_returns_copies(cache):
+    calls = []
+
+    @db.cached_query("weights")
+    def read(usernames, group_id=None):
+        calls.append((usernames, group_id))
+        return [group_id, *usernames]
+
+    rows = read(["bob", "dave"], group_id=1)
+    rows.append("mutated")
+    assert read(["bob", "dave"], group_id=1) == [1, "bob", "dave"]
+    assert read(["bob"], group_id=1) == [1, "bob"]
+    assert len(calls) == 2
+    assert read.uncached(["bob"]) == [None, "bob"]
+
+
+def test_invalidate_cache_bumps_the_generation(cache):
+    loader = FakeLoader()
+
+    @db.cached_query("weights")
+    def read():
+        return loader()
+
+    before = db.cache_generation("weights", "users")
+    assert read() == read() == ["rows", 1]
+    db.invalidate_cache("weights")
+    assert db.cache_generation("weights", "users") != before
+    assert db.cache_generation("users") == before[1:]
+    assert read() == ["rows", 2]
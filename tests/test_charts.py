@@ -0,0 +1,71 @@
+import datetime
+import numpy as np
+import pytest
+import charts
+from charts import lttb_indices, point_budget
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=float), rng.normal(size=n).cumsum()
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 60), (100, 3), (50, 49)])
+def test_lttb_keeps_endpoints_and_budget(n, n_out):
+    x, y = _series(n)
+    selected = lttb_indices(x, y, n_out)
+    assert len(selected) == n_out
+    assert selected[0] == 0 and selected[-1] == n - 1
+    assert (np.diff(selected) > 0).all()
+
+
+def test_lttb_keeps_extremes():
+    x = np.arange(200, dtype=float)
+    y = np.zeros(200)
+    y[70], y[140] = 5.0, -5.0
+    assert {70, 140} <= set(lttb_indices(x, y, 10))
+
+
+@pytest.mark.parametrize("n_out", [10, 11, 500])
+def test_lttb_passes_short_series_through(n_out):
+    x, y = _series(10)
+    assert list(lttb_indices(x, y, n_out)) == list(range(10))
+
+
+@pytest.mark.parametrize("n_out, expected", [(2, [0, 9]), (1, [0]), (0, [0])])
+def test_lttb_budget_below_three(n_out, expected):
+    x, y = _series(10)
+    assert list(lttb_indices(x, y, n_out)) == expected
+
+
+def test_lttb_skips_missing_values_next_to_real_points():
+    x = np.arange(20, dtype=float)
+    y = np.arange(20, dtype=float)
+    y[5:9] = np.nan
+    selected = lttb_indices(x, y, 6)
+    assert selected[0] == 0 and selected[-1] == 19
+    assert not np.isnan(y[selected]).any()
+
+
+def test_lttb_keeps_a_gap_without_real_points():
+    x = np.arange(20, dtype=float)
+    y = np.arange(20, dtype=float)
+    y[4:12] = np.nan
+    selected = lttb_indices(x, y, 6)
+    assert len(selected) == 6
+    # The bucket inside the gap keeps a missing point, the one after it recovers
+    assert np.isnan(y[selected]).sum() == 1
+    assert selected[0] == 0 and selected[-1] == 19
+
+
+def test_point_budget_is_exact_for_short_ranges():
+    start = datetime.date(2024, 1, 1)
+    assert point_budget(start, start + datetime.timedelta(days=99), 1) == 100
+
+
+def test_point_budget_splits_the_chart_budget():
+    start, end = datetime.date(2015, 1, 1), datetime.date(2024, 12, 31)
+    assert point_budget(start, end, 1) == charts.CHART_MAX_POINTS_PER_USER
+    assert point_budget(start, end, 10) == charts.CHART_MAX_POINTS // 10
+    assert point_budget(start, end, 1000) == charts.CHART_MIN_POINTS_PER_USER
+    assert point_budget(start, start, 1) == charts.CHART_MIN_POINTS_PER_USER
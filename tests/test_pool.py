@@ -0,0 +1,90 @@
+import threading
+import time
+import psycopg2.extensions
+import pytest
+import db
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    pool = db.ConnectionPool(1, 1, 1.0, 1800, 300, 30)
+    pool._connect = FakeConnection
+    yield pool
+    pool.close()
+
+
+def _queue(pool, count, order):
+    # Start count threads that borrow in turn (each waits until the previous one is queued)
+    threads = []
+    for i in range(count):
+        def borrow(i=i):
+            conn = pool.getconn()
+            order.append(i)
+            pool.putconn(conn)
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        while pool.stats()["waiting"] < i + 1:
+            time.sleep(0.001)
+        threads.append(thread)
+    return threads
+
+
+def test_returned_connection_goes_to_the_oldest_waiter(pool):
+    conn = pool.getconn()
+    order = []
+    threads = _queue(pool, 3, order)
+    pool.putconn(conn)
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2]
+    assert pool.stats()["in_use"] == 0
+
+
+def test_returning_thread_does_not_overtake_a_waiter(pool):
+    conn = pool.getconn()
+    order = []
+    threads = _queue(pool, 1, order)
+    pool.putconn(conn)
+    # The connection is already handed over: borrowing again has to queue behind the waiter
+    conn = pool.getconn()
+    order.append("again")
+    pool.putconn(conn)
+    threads[0].join()
+    assert order == [0, "again"]
+
+
+def test_waiter_times_out(pool):
+    pool.timeout = 0.05
+    conn = pool.getconn()
+    with pytest.raises(db.PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["waiting"] == 0
+    assert pool.stats()["timeouts"] == 1
+    pool.putconn(conn)
+    assert pool.stats()["idle"] == 1
+
+
+def test_closed_connection_frees_its_slot_for_a_waiter(pool):
+    conn = pool.getconn()
+    order = []
+    threads = _queue(pool, 1, order)
+    conn.close()
+    pool.putconn(conn)
+    threads[0].join()
+    assert order == [0]
+    assert pool.stats()["size"] == 1
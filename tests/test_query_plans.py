@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+# bench/check_plans.py as a test: every hot query and page_data dataset has to be served by an
+# index. Needs the database (POSTGRES_DB etc., all migrations applied) and replaces its bench_*
+# data; skipped without it.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "bench")))
+import check_plans
+
+needs_db = pytest.mark.skipif(not os.getenv("POSTGRES_DB"), reason="needs the database (POSTGRES_DB)")
+
+
+@pytest.fixture(scope="module")
+def plan_results():
+    from seed import clear, seed
+    seed(1000, 1.0)  # check_plans' default size: enough groups for member lookups to beat a users scan
+    try:
+        results = check_plans.check(check_plans.bench_context())
+    finally:
+        with check_plans.db.get_conn() as conn:
+            with conn.cursor() as cur:
+                clear(cur)
+            conn.commit()
+    return {result["query"]: result for result in results}
+
+
+def test_every_dataset_is_checked():
+    assert check_plans.unchecked_datasets() == []
+
+
+@needs_db
+@pytest.mark.parametrize("name", list(check_plans.HOT_QUERIES))
+def test_query_uses_an_index(plan_results, name):
+    result = plan_results[name]
+    assert result["statements"] > 0
+    assert result["failures"] == []
@@ -0,0 +1,59 @@
+import pytest
+from recipe_render import sanitize_html
+
+
+@pytest.mark.parametrize("href", [
+    "javascript:alert(1)",
+    " JaVaScRiPt:alert(1)",
+    "&#106;avascript:alert(1)",
+    "&#x6A;&#x61;&#x76;&#x61;&#x73;&#x63;&#x72;&#x69;&#x70;&#x74;&#x3A;alert(1)",
+    "javascript&colon;alert(1)",
+    "java&#x09;script:alert(1)",
+    "vbscript:msgbox(1)",
+    "data:text/html,<script>alert(1)</script>",
+])
+def test_unsafe_url_schemes_are_dropped(href):
+    assert sanitize_html(f'<a href="{href}">x</a>') == "<a>x</a>"
+    assert sanitize_html(f'<img src="{href}">') == "<img>"
+
+
+@pytest.mark.parametrize("url", ["https://example.org/a?b=1", "http://example.org", "mailto:a@b.de", "/rezepte/a:b", "#zutaten"])
+def test_safe_urls_are_kept(url):
+    assert sanitize_html(f'<a href="{url}">x</a>') == f'<a href="{url}">x</a>'
+
+
+@pytest.mark.parametrize("fragment, expected", [
+    ("<img src=x onerror=alert(1)>", '<img src="x">'),
+    ('<p onclick="alert(1)">x</p>', "<p>x</p>"),
+    ('<a href="/" onmouseover="alert(1)">x</a>', '<a href="/">x</a>'),
+    ("<td align=left onfocus=alert(1)>x</td>", '<td align="left">x</td>'),
+])
+def test_event_handlers_are_dropped(fragment, expected):
+    assert sanitize_html(fragment) == expected
+
+
+@pytest.mark.parametrize("fragment", [
+    "<script>alert(1)</script>",
+    "<SCRIPT>alert(1)</SCRIPT>",
+    "<style>body { display: none }</style>",
+    "<svg onload=alert(1)><script>alert(1)</script><a href='javascript:x'>y</a></svg>",
+    "<math><mtext><img src=x onerror=alert(1)></mtext></math>",
+    "<textarea><img src=x onerror=alert(1)></textarea>",
+    "<noscript><p title='</noscript><img src=x onerror=alert(1)>'></noscript>",
+    "<iframe src='https://example.org'></iframe>",
+])
+def test_dangerous_elements_are_removed_with_content(fragment):
+    assert sanitize_html(fragment + "ok") == "ok"
+
+
+def test_unclosed_dropped_element_swallows_the_rest():
+    assert sanitize_html("<svg/onload=alert(1)><p>ok</p>") == ""
+
+
+def test_attribute_values_and_text_are_escaped():
+    assert sanitize_html("<a title='x\" onmouseover=\"y'>z</a>") == '<a title="x&quot; onmouseover=&quot;y">z</a>'
+    assert "<" not in sanitize_html("<scr<script>ipt>alert(1)</script>").replace("&lt;", "")
+
+
+def test_unknown_tags_are_stripped_and_open_tags_closed():
+    assert sanitize_html("<div><p>a<b>b</div>") == "<p>a<b>b</b></p>"
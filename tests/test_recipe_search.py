@@ -0,0 +1,76 @@
+import pytest
+from recipe_search import RecipeSearchIndex, normalize, stem, tokenize
+
+RECIPES = [
+    {"filename": "kartoffelsuppe.md", "title": "Kartoffelsuppe", "tags": ["suppe", "vegetarisch"],
+     "content": "Kartoffeln schälen, mit Möhren und Zwiebeln kochen."},
+    {"filename": "bratkartoffeln.md", "title": "Bratkartoffeln", "tags": ["beilage"],
+     "content": "Gekochte Kartoffeln in Scheiben braten."},
+    {"filename": "linsensuppe.md", "title": "Linsensuppe", "tags": ["suppe"],
+     "content": "Linsen mit Möhren und Speck kochen."},
+    {"filename": "creme-brulee.md", "title": "Crème brûlée", "tags": ["dessert"],
+     "content": "Sahne, Eier und Zucker stocken lassen."},
+]
+
+
+@pytest.fixture
+def index():
+    index = RecipeSearchIndex()
+    index.update(RECIPES)
+    return index
+
+
+def test_normalization_and_stemming():
+    assert normalize("Möhren Größe Crème") == "moehren groesse creme"
+    assert tokenize("Bratkartoffeln, 2 Eier!") == ["bratkartoffeln", "2", "eier"]
+    assert stem("kartoffeln") == "kartoffeln"
+    assert stem("zwiebeln") == "zwiebeln"
+    assert stem("moehren") == "moehr"
+    assert stem("suppe") == "supp"
+    assert stem("eier") == "eier"  # too short to strip
+
+
+def test_stemmed_forms_match(index):
+    assert index.search("Möhre") == index.search("moehren")
+    assert set(index.search("Möhre")) == {"kartoffelsuppe.md", "linsensuppe.md"}
+    assert index.search("creme brulee") == ["creme-brulee.md"]
+
+
+def test_prefix_matching(index):
+    assert set(index.search("kartoff")) == {"kartoffelsuppe.md", "bratkartoffeln.md"}
+    assert set(index.search("lins")) == {"linsensuppe.md"}
+    assert index.search("k") == []  # shorter than MIN_PREFIX_LENGTH, no exact term
+
+
+def test_every_query_word_has_to_match(index):
+    assert index.search("suppe speck") == ["linsensuppe.md"]
+    assert index.search("suppe dessert") == []
+    assert index.search("") == []
+
+
+def test_bm25_ranking():
+    index = RecipeSearchIndex()
+    index.update([
+        {"filename": "title.md", "title": "Salat", "content": "Mit Essig und Öl anmachen."},
+        {"filename": "short.md", "title": "Beilage", "content": "Salat waschen."},
+        {"filename": "long.md", "title": "Beilage", "content": "Salat waschen, trocknen, zupfen und mit Essig, Öl und Senf anmachen."},
+        {"filename": "prefix.md", "title": "Beilage", "content": "Salatgurke waschen."},
+        {"filename": "other.md", "title": "Brot", "content": "Mehl, Wasser und Salz kneten."},
+    ])
+    ranked = index.search("salat")
+    assert set(ranked) == {"title.md", "short.md", "long.md", "prefix.md"}
+    # Title matches outweigh body matches ...
+    assert ranked[:2] == ["title.md", "short.md"]
+    # ... short bodies long ones, and an exact match a (rarer) prefix match in the same body
+    assert ranked.index("short.md") < ranked.index("long.md")
+    assert ranked.index("short.md") < ranked.index("prefix.md")
+    assert index.search("salat", limit=2) == ["title.md", "short.md"]
+
+
+def test_update_and_remove(index):
+    index.update([{**RECIPES[2], "content": "Linsen mit Tomaten."}])
+    assert index.search("speck") == []
+    assert index.search("tomate") == ["linsensuppe.md"]
+    index.update([], removed=["linsensuppe.md"])
+    assert index.search("linsen") == []
+    assert set(index.search("suppe")) == {"kartoffelsuppe.md"}
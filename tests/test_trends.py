@@ -0,0 +1,78 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import trends
+
+START = datetime.date(2024, 1, 1)
+
+
+def _run(entries, goals=None):
+    # entries: user_id -> [(day offset, weight)]; goals: user_id -> goal weight
+    goals = goals or {}
+    rows = [
+        (user_id, START + datetime.timedelta(days=day), weight)
+        for user_id, points in entries.items() for day, weight in points
+    ]
+    versions = {user_id: (user_id, f"user{user_id}", None, None, goals.get(user_id)) for user_id in entries}
+    return trends._compute(pd.DataFrame(rows, columns=["user_id", "date", "weight"]), versions)
+
+
+def _ema(days, weights, halflife=trends.TREND_HALFLIFE_DAYS):
+    # Time-aware EMA at the last point: weights halve every halflife days back
+    days, weights = np.asarray(days, dtype=float), np.asarray(weights, dtype=float)
+    decay = 0.5 ** ((days[-1] - days) / halflife)
+    return (decay * weights).sum() / decay.sum()
+
+
+def test_smoothed_weight_and_weekly_rate():
+    points = [(day, 90 - 0.1 * day) for day in range(0, 28)]
+    trend = _run({1: points}, {1: 80.0})[1]
+    assert trend.username == "user1"
+    assert trend.latest_date == START + datetime.timedelta(days=27)
+    assert trend.weekly_rate == pytest.approx(-0.7)
+    assert trend.smoothed == pytest.approx(_ema(*zip(*points)))
+    days = int(np.ceil((80.0 - trend.smoothed) / -0.1))
+    assert trend.goal_date == trend.latest_date + datetime.timedelta(days=days)
+    assert len(trend.dates) == len(trend.values) == 28
+
+
+def test_irregular_entries_are_weighted_by_time():
+    points = [(0, 90.0), (1, 89.0), (10, 88.0), (11, 87.5)]
+    trend = _run({1: points})[1]
+    assert trend.smoothed == pytest.approx(_ema(*zip(*points)))
+    assert trend.goal_weight is None and trend.goal_date is None
+
+
+def test_users_are_computed_independently():
+    result = _run({
+        1: [(day, 90 - 0.1 * day) for day in range(14)],
+        2: [(day, 60 + 0.2 * day) for day in range(0, 14, 2)],
+    })
+    assert result[1].weekly_rate == pytest.approx(-0.7)
+    assert result[2].weekly_rate == pytest.approx(1.4)
+
+
+@pytest.mark.parametrize("slope", [0.0, 0.1])
+def test_no_projection_when_flat_or_moving_away(slope):
+    trend = _run({1: [(day, 80 + slope * day) for day in range(20)]}, {1: 75.0})[1]
+    assert trend.goal_weight == 75.0
+    assert trend.goal_date is None
+
+
+def test_no_projection_beyond_the_horizon():
+    trend = _run({1: [(day, 100 - 0.001 * day) for day in range(20)]}, {1: 60.0})[1]
+    assert trend.goal_date is None
+
+
+def test_goal_already_reached():
+    trend = _run({1: [(day, 75.0) for day in range(10)]}, {1: 75.05})[1]
+    assert trend.goal_date == trend.latest_date
+
+
+def test_single_entry():
+    trend = _run({1: [(3, 82.5)]}, {1: 80.0})[1]
+    assert trend.smoothed == 82.5
+    assert trend.weekly_rate is None
+    assert trend.goal_date is None
+    assert trend.latest_date == START + datetime.timedelta(days=3)